@@ -0,0 +1,144 @@
+import asyncio, json, sys, time, urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+Prepare = Callable[[Dict[str, Any]], Tuple[List[Dict[str, str]], Dict[str, Any]]]
+
+class AnswerServer:
+    '''Small asyncio HTTP/1.1 server: `POST /ask` streams an answer as server-sent events,
+    `GET /health` reports liveness.
+
+    prepare(payload) -> (messages, stats) does retrieval and prompt building; it runs on a
+    thread pool so several callers retrieve at once. Generation streams from one shared
+    ollama.AsyncClient with the model pinned by keep_alive; at most `parallel` run at once.
+    Events: `context` (retrieval stats), unnamed `{"t": token}` chunks, then `done` or `error`.'''
+
+    def __init__(self, prepare: Prepare, model: str, ollama_host: str, options: Optional[Dict] = None,
+                 keep_alive: str = "30m", workers: int = 4, parallel: int = 1,
+                 warm: Sequence[Callable[[], Any]] = ()):
+        import ollama  # server side only; stream_remote() callers stay on the stdlib
+        self.prepare, self.model, self.options, self.keep_alive = prepare, model, options or {}, keep_alive
+        self.ollama = ollama.AsyncClient(host=ollama_host)
+        self.pool = ThreadPoolExecutor(workers, thread_name_prefix="retrieve")
+        self.parallel, self.warm = parallel, warm
+        self.active = 0
+
+    async def _warm_up(self):
+        loop = asyncio.get_running_loop()
+        t = time.perf_counter()
+        # an empty prompt loads the model without generating anything
+        jobs = [self.ollama.generate(model=self.model, prompt="", keep_alive=self.keep_alive)]
+        jobs += [loop.run_in_executor(self.pool, fn) for fn in self.warm]
+        for r in await asyncio.gather(*jobs, return_exceptions=True):
+            if isinstance(r, Exception):
+                print(f"warm-up: {type(r).__name__}: {r}", file=sys.stderr)
+        print(f"warm in {time.perf_counter() - t:.1f}s", file=sys.stderr)
+
+    async def _event(self, writer: asyncio.StreamWriter, name: Optional[str], data: Dict):
+        head = f"event: {name}\n" if name else ""
+        writer.write(f"{head}data: {json.dumps(data, default=str)}\n\n".encode("utf-8"))
+        await writer.drain()
+
+    async def _send_json(self, writer: asyncio.StreamWriter, status: int, data: Dict):
+        body = json.dumps(data).encode("utf-8")
+        writer.write(f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\nContent-Type: application/json\r\n"
+                     f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body)
+        await writer.drain()
+
+    async def _ask(self, writer: asyncio.StreamWriter, payload: Dict):
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+                     b"Connection: close\r\n\r\n")
+        t0 = time.perf_counter()
+        try:
+            messages, stats = await asyncio.get_running_loop().run_in_executor(self.pool, self.prepare, payload)
+        except Exception as e:
+            await self._event(writer, "error", {"error": f"{type(e).__name__}: {e}"})
+            return
+        stats["prepare_ms"] = (time.perf_counter() - t0) * 1000
+        await self._event(writer, "context", stats)
+        async with self.slots:
+            t, first = time.perf_counter(), None
+            try:
+                stream = await self.ollama.chat(model=self.model, messages=messages, stream=True,
+                                                options=self.options, keep_alive=self.keep_alive)
+                try:
+                    async for part in stream:
+                        delta = part["message"]["content"]
+                        if delta:
+                            first = first or time.perf_counter()
+                            await self._event(writer, None, {"t": delta})
+                finally:
+                    await stream.aclose()  # also when the caller hung up: stop generating
+            except ConnectionError:
+                raise
+            except Exception as e:
+                await self._event(writer, "error", {"error": f"{type(e).__name__}: {e}"})
+                return
+        stats.update(first_token_ms=((first or time.perf_counter()) - t) * 1000,
+                     generate_ms=(time.perf_counter() - t) * 1000)
+        await self._event(writer, "done", stats)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.active += 1
+        try:
+            method, path, _ = (await reader.readline()).decode("latin-1").split(" ", 2)
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                k, _, v = line.decode("latin-1").partition(":")
+                headers[k.strip().lower()] = v.strip()
+            body = await reader.readexactly(int(headers.get("content-length") or 0))
+            if method == "GET" and path == "/health":
+                await self._send_json(writer, 200, {"ok": True, "model": self.model, "active": self.active - 1})
+            elif method == "POST" and path == "/ask":
+                try:
+                    payload = json.loads(body or b"{}")
+                    if not isinstance(payload, dict):
+                        raise ValueError(f"expected a JSON object, got {type(payload).__name__}")
+                except ValueError as e:  # also bad UTF-8
+                    await self._send_json(writer, 400, {"error": f"bad request body: {e}"})
+                    return
+                await self._ask(writer, payload)
+            else:
+                await self._send_json(writer, 404, {"error": f"no route {method} {path}"})
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        except Exception as e:
+            print(f"request failed: {type(e).__name__}: {e}", file=sys.stderr)
+        finally:
+            self.active -= 1
+            writer.close()
+
+    async def serve(self, host: str, port: int):
+        self.slots = asyncio.Semaphore(self.parallel)
+        await self._warm_up()
+        server = await asyncio.start_server(self._handle, host, port)
+        print(f"Serving on http://{host}:{port} (model {self.model}, keep_alive {self.keep_alive})", file=sys.stderr)
+        async with server:
+            await server.serve_forever()
+
+    def run(self, host: str, port: int):
+        try:
+            asyncio.run(self.serve(host, port))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.pool.shutdown(wait=False)
+
+def stream_remote(url: str, payload: Dict, timeout: float = 600) -> Iterator[Tuple[str, Dict]]:
+    '''Client side of POST /ask: yields (event, data) as they arrive. Raises OSError
+    (e.g. connection refused) before yielding anything if no server is listening.'''
+    req = urllib.request.Request(url.rstrip("/") + "/ask", data=json.dumps(payload).encode("utf-8"),
+                                 headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        event = "message"
+        for raw in resp:
+            line = raw.decode("utf-8").rstrip("\r\n")
+            if line.startswith("event:"):
+                event = line[6:].strip()
+            elif line.startswith("data:"):
+                yield event, json.loads(line[5:])
+            elif not line:
+                event = "message"
@@ -1,24 +1,164 @@
-import json, time, os, sqlite3
-DB="conversations.db"
-os.makedirs("chats", exist_ok=True)
-
-def init():
-    con=sqlite3.connect(DB); cur=con.cursor()
-    cur.execute('''CREATE TABLE IF NOT EXISTS chat (
-        id TEXT PRIMARY KEY, name TEXT, path TEXT, ts REAL)''')
-    con.commit(); con.close()
-
-def save_chat(name, messages):
-    init(); cid=str(int(time.time()*1000))
-    path=f"chats/{cid}.json"
-    json.dump(messages, open(path,"w"), indent=2)
-    con=sqlite3.connect(DB); cur=con.cursor()
-    cur.execute("INSERT INTO chat VALUES (?,?,?,?)", (cid, name, path, time.time()))
-    con.commit(); con.close()
-    return cid, path
-
-def load_chat(cid):
-    con=sqlite3.connect(DB); cur=con.cursor()
-    row=cur.execute("SELECT path FROM chat WHERE id=?",(cid,)).fetchone()
-    con.close()
-    return json.load(open(row[0])) if row else None
+import json, os, sqlite3, threading, time, uuid, zlib
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+DB = os.environ.get("CHAT_DB", "conversations.db")
+
+class ChatStore:
+    '''Saved chats in one SQLite file: a chat row per conversation and a row per message
+    (zlib-compressed JSON), searchable through a contentless FTS5 index.
+
+    Keeps a single WAL connection for the life of the store; every public call is one
+    transaction unless grouped with `with store.batch():`. Chats saved by the old
+    JSON-file version are imported on first load_chat() or by migrate().'''
+
+    def __init__(self, path: str = DB):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.lock = threading.RLock()
+        self.con = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.con.execute("PRAGMA journal_mode=WAL")
+        self.con.execute("PRAGMA synchronous=NORMAL")
+        self.con.executescript('''
+            CREATE TABLE IF NOT EXISTS chat (id TEXT PRIMARY KEY, name TEXT, path TEXT, ts REAL);
+            CREATE TABLE IF NOT EXISTS message (
+                id INTEGER PRIMARY KEY, chat_id TEXT, seq INTEGER, role TEXT, body BLOB);
+            CREATE UNIQUE INDEX IF NOT EXISTS message_chat_seq ON message(chat_id, seq);
+            CREATE VIRTUAL TABLE IF NOT EXISTS message_fts USING fts5(text, content='', tokenize='unicode61');
+        ''')
+        self._depth = 0
+
+    @contextmanager
+    def batch(self):
+        '''Group several saves into one transaction (one fsync); nests.'''
+        with self.lock:
+            if self._depth == 0:
+                self.con.execute("BEGIN IMMEDIATE")
+            self._depth += 1
+            try:
+                yield self
+            except BaseException:
+                self._depth -= 1
+                if self._depth == 0:
+                    self.con.execute("ROLLBACK")
+                raise
+            self._depth -= 1
+            if self._depth == 0:
+                self.con.execute("COMMIT")
+
+    def _put_messages(self, cid: str, messages: List[Dict]):
+        old = {seq: (rid, body) for rid, seq, body in
+               self.con.execute("SELECT id, seq, body FROM message WHERE chat_id=?", (cid,))}
+        for seq, m in enumerate(messages):
+            body = zlib.compress(json.dumps(m, ensure_ascii=False).encode())
+            prev = old.pop(seq, None)
+            if prev and prev[1] == body:
+                continue  # unchanged: re-saving a growing chat only writes the new turns
+            if prev:
+                self._unindex(*prev)
+                self.con.execute("UPDATE message SET role=?, body=? WHERE id=?", (m.get("role") or m.get("name"), body, prev[0]))
+                rid = prev[0]
+            else:
+                rid = self.con.execute("INSERT INTO message (chat_id, seq, role, body) VALUES (?,?,?,?)",
+                                       (cid, seq, m.get("role") or m.get("name"), body)).lastrowid
+            self.con.execute("INSERT INTO message_fts (rowid, text) VALUES (?,?)", (rid, m.get("content") or ""))
+        for rid, body in old.values():  # the chat got shorter
+            self._unindex(rid, body)
+            self.con.execute("DELETE FROM message WHERE id=?", (rid,))
+
+    def _unindex(self, rid: int, body: bytes):
+        # contentless FTS5 forgets a row only when given the text it indexed
+        text = json.loads(zlib.decompress(body)).get("content") or ""
+        self.con.execute("INSERT INTO message_fts (message_fts, rowid, text) VALUES ('delete', ?, ?)", (rid, text))
+
+    def save_chat(self, name: str, messages: List[Dict], cid: Optional[str] = None) -> str:
+        '''Store (or, with cid, update) a chat; returns its id, a uuid4 hex string.'''
+        cid = cid or uuid.uuid4().hex
+        with self.batch():
+            self.con.execute('''INSERT INTO chat (id, name, ts) VALUES (?,?,?)
+                                ON CONFLICT(id) DO UPDATE SET name=excluded.name, ts=excluded.ts''',
+                             (cid, name, time.time()))
+            self._put_messages(cid, messages)
+        return cid
+
+    def _import_legacy(self, cid: str, path: str) -> Optional[List[Dict]]:
+        try:
+            with open(path) as f:
+                messages = json.load(f)
+        except (OSError, ValueError):
+            return None
+        with self.batch():
+            self._put_messages(cid, messages)
+            self.con.execute("UPDATE chat SET path=NULL WHERE id=?", (cid,))
+        return messages
+
+    def load_chat(self, cid: str) -> Optional[List[Dict]]:
+        with self.lock:
+            row = self.con.execute("SELECT path FROM chat WHERE id=?", (cid,)).fetchone()
+            if row is None:
+                return None
+            if row[0]:
+                return self._import_legacy(cid, row[0])
+            return [json.loads(zlib.decompress(b)) for (b,) in
+                    self.con.execute("SELECT body FROM message WHERE chat_id=? ORDER BY seq", (cid,))]
+
+    def delete_chat(self, cid: str):
+        with self.batch():
+            for rid, body in self.con.execute("SELECT id, body FROM message WHERE chat_id=?", (cid,)).fetchall():
+                self._unindex(rid, body)
+            self.con.execute("DELETE FROM message WHERE chat_id=?", (cid,))
+            self.con.execute("DELETE FROM chat WHERE id=?", (cid,))
+
+    def list_chats(self, limit: int = 50) -> List[Tuple[str, str, float, int]]:
+        '''Newest first: (id, name, ts, messages).'''
+        with self.lock:
+            return self.con.execute('''SELECT c.id, c.name, c.ts, COUNT(m.id) FROM chat c
+                                       LEFT JOIN message m ON m.chat_id = c.id
+                                       GROUP BY c.id ORDER BY c.ts DESC LIMIT ?''', (limit,)).fetchall()
+
+    def search(self, query: str, limit: int = 20) -> List[Dict]:
+        '''Best-matching messages (FTS5 query syntax, bm25 order) with their chat and position.
+        Only the matching rows are decompressed.'''
+        with self.lock:
+            rows = self.con.execute('''SELECT m.chat_id, c.name, m.seq, m.role, m.body FROM message_fts f
+                                       JOIN message m ON m.id = f.rowid JOIN chat c ON c.id = m.chat_id
+                                       WHERE message_fts MATCH ? ORDER BY f.rank LIMIT ?''', (query, limit)).fetchall()
+        return [{"chat_id": cid, "name": name, "seq": seq, "role": role,
+                 "content": json.loads(zlib.decompress(body)).get("content", "")}
+                for cid, name, seq, role, body in rows]
+
+    def migrate(self) -> int:
+        '''Import every chat still stored as a JSON file; returns how many.'''
+        with self.lock:
+            legacy = self.con.execute("SELECT id, path FROM chat WHERE path IS NOT NULL").fetchall()
+        return sum(self._import_legacy(cid, path) is not None for cid, path in legacy)
+
+    def close(self):
+        with self.lock:
+            self.con.close()
+
+_store: Optional[ChatStore] = None
+_store_lock = threading.Lock()
+
+def get_store() -> ChatStore:
+    '''The process-wide store for CHAT_DB.'''
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ChatStore(DB)
+        return _store
+
+def save_chat(name: str, messages: List[Dict], cid: Optional[str] = None) -> Tuple[str, str]:
+    '''Returns (chat id, database path); messages now live in the database, not chats/*.json.'''
+    return get_store().save_chat(name, messages, cid), DB
+
+def save_chats(chats: Iterable[Tuple[str, List[Dict]]]) -> List[str]:
+    store = get_store()
+    with store.batch():
+        return [store.save_chat(name, messages) for name, messages in chats]
+
+def load_chat(cid: str) -> Optional[List[Dict]]:
+    return get_store().load_chat(cid)
+
+def search(query: str, limit: int = 20) -> List[Dict]:
+    return get_store().search(query, limit)
@@ -0,0 +1,51 @@
+'''Import-time regression check (make check-imports).
+
+Imports each entry module in a fresh `python -X importtime` and fails if it loads a
+dependency that should only be imported on first use, or if the import takes longer
+than IMPORT_BUDGET_MS.'''
+import os, re, sys, argparse, subprocess
+from typing import Dict
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BUDGET_MS = float(os.environ.get("IMPORT_BUDGET_MS", "500"))
+
+# module -> packages it must not pull in at import time
+CHECKS = {
+    "rag_query": ["unstructured", "weaviate", "ollama", "sentence_transformers", "torch", "tokenizers"],
+    "jupyter_chat_md": ["weaviate", "unstructured", "docker"],
+    "ingest": ["unstructured", "weaviate", "ollama", "nbformat"],
+    "answer_server": ["ollama"],
+}
+
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)")
+
+def import_times(module: str, python: str = sys.executable) -> Dict[str, float]:
+    '''{module name: cumulative import ms} for everything `import module` loads.'''
+    r = subprocess.run([python, "-X", "importtime", "-c", f"import {module}"], cwd=HERE,
+                       env=dict(os.environ, PYTHONPATH=HERE), capture_output=True, text=True)
+    if r.returncode:
+        raise RuntimeError(f"import {module} failed:\n{r.stderr[-2000:]}")
+    return {m[4]: int(m[2]) / 1000 for m in map(_LINE.match, r.stderr.splitlines()) if m}
+
+def check(module: str, forbidden, budget_ms: float, python: str = sys.executable) -> bool:
+    times = import_times(module, python)
+    total = times.get(module, 0.0)
+    loaded = [p for p in forbidden if any(n == p or n.startswith(p + ".") for n in times)]
+    heavy = sorted(((ms, n) for n, ms in times.items() if n != module and "." not in n), reverse=True)[:5]
+    ok = not loaded and total <= budget_ms
+    print(f"{'ok  ' if ok else 'FAIL'} {module:<16} {total:7.1f} ms  "
+          + ", ".join(f"{n} {ms:.0f}" for ms, n in heavy))
+    if loaded:
+        print(f"     imports {', '.join(loaded)} eagerly; move the import to first use")
+    if total > budget_ms:
+        print(f"     over the {budget_ms:.0f} ms budget")
+    return ok
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("modules", nargs="*", default=list(CHECKS))
+    ap.add_argument("--budget-ms", type=float, default=BUDGET_MS)
+    ap.add_argument("--python", default=sys.executable, help="interpreter to measure (default: this one)")
+    args = ap.parse_args()
+    results = [check(m, CHECKS.get(m, []), args.budget_ms, args.python) for m in args.modules]
+    sys.exit(0 if all(results) else 1)
@@ -0,0 +1,54 @@
+import array, hashlib, os, sqlite3
+from typing import Callable, Dict, Iterable, List, Sequence
+
+def text_key(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class EmbedCache:
+    '''On-disk vectors keyed by (model, sha256(text)); float32 blobs in SQLite.'''
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.con = sqlite3.connect(path)
+        self.con.execute("PRAGMA journal_mode=WAL")
+        self.con.execute('''CREATE TABLE IF NOT EXISTS vec (
+            model TEXT, sha256 TEXT, v BLOB, PRIMARY KEY (model, sha256)) WITHOUT ROWID''')
+        self.con.commit()
+
+    def get_many(self, model: str, keys: Iterable[str]) -> Dict[str, List[float]]:
+        keys, out = list(keys), {}
+        for i in range(0, len(keys), 500):
+            part = keys[i:i+500]
+            q = f"SELECT sha256, v FROM vec WHERE model=? AND sha256 IN ({','.join('?'*len(part))})"
+            for k, blob in self.con.execute(q, (model, *part)):
+                out[k] = array.array("f", blob).tolist()
+        return out
+
+    def put_many(self, model: str, vecs: Dict[str, Sequence[float]]):
+        self.con.executemany("INSERT OR REPLACE INTO vec VALUES (?,?,?)",
+                             [(model, k, array.array("f", v).tobytes()) for k, v in vecs.items()])
+        self.con.commit()
+
+    def close(self):
+        self.con.close()
+
+class Embedder:
+    '''Embeds texts in batches of `batch`, only sending text the cache has not seen.'''
+
+    def __init__(self, model: str, cache: EmbedCache, embed_fn: Callable[[List[str]], List[List[float]]],
+                 batch: int = 128):
+        self.model, self.cache, self.embed_fn, self.batch = model, cache, embed_fn, batch
+        self.hits = self.misses = 0
+
+    def __call__(self, texts: Sequence[str]) -> List[List[float]]:
+        keys = [text_key(t) for t in texts]
+        have = self.cache.get_many(self.model, set(keys))
+        missing = list({k: t for k, t in zip(keys, texts) if k not in have}.items())
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+        for i in range(0, len(missing), self.batch):
+            part = missing[i:i+self.batch]
+            fresh = dict(zip((k for k, _ in part), self.embed_fn([t for _, t in part])))
+            self.cache.put_many(self.model, fresh)
+            have.update(fresh)
+        return [have[k] for k in keys]
@@ -0,0 +1,87 @@
+import fnmatch, os, time
+from typing import Iterable, Iterator, Optional, Sequence, Tuple
+from tqdm import tqdm
+
+SKIP_DIRS = frozenset({".git", "node_modules", ".venv", "venv", "__pycache__", ".ipynb_checkpoints"})
+
+def parse_size(s: Optional[str]) -> Optional[int]:
+    '''"500K" / "50M" / "2G" / "123" -> bytes; empty -> None.'''
+    if not s:
+        return None
+    s = s.strip().upper().rstrip("B")
+    mult = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}.get(s[-1:], 1)
+    return int(float(s[:-1] if mult > 1 else s) * mult)
+
+def _matches(rel: str, name: str, patterns: Sequence[str]) -> bool:
+    # patterns with a slash match the root-relative path, others just the name
+    return any(fnmatch.fnmatch(rel if "/" in pat else name, pat) for pat in patterns)
+
+def wanted(root: str, path: str, include: Sequence[str] = (), exclude: Sequence[str] = (),
+           skip_dirs: Iterable[str] = SKIP_DIRS, is_dir: bool = False) -> bool:
+    '''Would walk_files(root, ...) visit `path`? For checking single paths from fs events.'''
+    rel = os.path.relpath(os.path.abspath(path), os.path.abspath(root)).replace(os.sep, "/")
+    if rel == ".." or rel.startswith("../"):
+        return False
+    parts = rel.split("/")
+    dirs = parts if is_dir else parts[:-1]
+    for i, name in enumerate(dirs):
+        if name in skip_dirs or _matches("/".join(parts[:i+1]), name, exclude):
+            return False
+    if is_dir:
+        return True
+    return not _matches(rel, parts[-1], exclude) and (not include or _matches(rel, parts[-1], include))
+
+def walk_files(root: str, include: Sequence[str] = (), exclude: Sequence[str] = (),
+               max_size: Optional[int] = None, skip_dirs: Iterable[str] = SKIP_DIRS
+               ) -> Iterator[Tuple[str, os.stat_result]]:
+    '''Lazily yield (path, stat) for files under root, one directory listing at a time.
+
+    Directories are not followed through symlinks; each directory is listed in name
+    order so runs over an unchanged tree yield the same sequence.'''
+    root = os.path.abspath(root)
+    skip_dirs = frozenset(skip_dirs)
+    stack = [root]
+    while stack:
+        d = stack.pop()
+        try:
+            with os.scandir(d) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError:
+            continue
+        subdirs = []
+        for e in entries:
+            rel = os.path.relpath(e.path, root).replace(os.sep, "/")
+            try:
+                if e.is_dir(follow_symlinks=False):
+                    if e.name not in skip_dirs and not _matches(rel, e.name, exclude):
+                        subdirs.append(e.path)
+                    continue
+                if not e.is_file():
+                    continue
+                if exclude and _matches(rel, e.name, exclude):
+                    continue
+                if include and not _matches(rel, e.name, include):
+                    continue
+                st = e.stat()
+            except OSError:
+                continue
+            if max_size is not None and st.st_size > max_size:
+                continue
+            yield e.path, st
+        stack.extend(reversed(subdirs))
+
+def with_progress(files: Iterable[Tuple[str, os.stat_result]], desc: str) -> Iterator[Tuple[str, os.stat_result]]:
+    '''Pass-through that reports files/sec and bytes/sec; there is no upfront total.'''
+    bar = tqdm(desc=desc, unit=" files")
+    t0, nbytes = time.monotonic(), 0
+    try:
+        for path, st in files:
+            yield path, st
+            nbytes += st.st_size
+            bar.update()
+            if bar.n % 32 == 0:
+                rate = nbytes / max(time.monotonic() - t0, 1e-9)
+                bar.set_postfix_str(f"{tqdm.format_sizeof(rate, 'B', 1024)}/s, {tqdm.format_sizeof(nbytes, 'B', 1024)}",
+                                    refresh=False)
+    finally:
+        bar.close()
@@ -1,13 +1,19 @@
-import os, sys, hashlib, time, pathlib
+import os, sys, hashlib, time, pathlib, argparse
 from typing import Iterable, Dict, Any
-import weaviate
-from weaviate.classes.config import Configure
-from unstructured.partition.auto import partition
-from unstructured.chunking.title import chunk_by_title
 from tqdm import tqdm
-import ollama
 
-from utils_ipynb_nb import extract_ipynb_text, try_export_mathematica_nb_to_md
+# weaviate, ollama, Unstructured and nbformat are imported where they are used: parse workers
+# never load the Weaviate client, and `--help` or an all-unchanged run never load Unstructured.
+from manifest import Manifest
+from parse_pool import parse_stream
+from summary_stage import SummaryStage
+from embed_cache import EmbedCache, Embedder
+from file_walker import walk_files, with_progress, parse_size
+from neardup import NearDupIndex
+from watcher import watch
+from query_cache import bump_generation
+from wv_client import get_client
+import vector_store
 
 WEAVIATE_HOST = os.environ.get("WEAVIATE_HOST", "http://localhost:8080")
 OLLAMA_ENDPOINT = os.environ.get("OLLAMA_ENDPOINT", "http://localhost:11434")
@@ -15,9 +21,26 @@ COLLECTION = os.environ.get("WEAVIATE_COLLECTION", "Docs")
 EMBED_MODEL = os.environ.get("EMBED_MODEL", "bge-m3")
 SUMMARY_MODEL = os.environ.get("SUMMARY_MODEL", "qwen3:14b")
 ROOT = os.environ.get("INGEST_DIR", ".")
+MANIFEST_DB = os.environ.get("INGEST_MANIFEST",
+                             os.path.expanduser(f"~/.cache/local-llm-rag/{COLLECTION}.manifest.db"))
+BATCH = 256
+WORKERS = int(os.environ.get("INGEST_WORKERS", "0"))
+PARSE_TIMEOUT = float(os.environ.get("PARSE_TIMEOUT", "300"))
+SUMMARY_MODE = os.environ.get("SUMMARY_MODE", "async")  # async | defer
+SUMMARY_PARALLEL = int(os.environ.get("SUMMARY_PARALLEL", os.environ.get("OLLAMA_NUM_PARALLEL", "1")))
+EMBED_MODE = os.environ.get("EMBED_MODE", "server")  # server: Weaviate vectorizes | client: batched here
+EMBED_BATCH = int(os.environ.get("EMBED_BATCH", "128"))
+INCLUDE = [g for g in os.environ.get("INGEST_INCLUDE", "").split(",") if g]
+EXCLUDE = [g for g in os.environ.get("INGEST_EXCLUDE", "").split(",") if g]
+MAX_SIZE = os.environ.get("INGEST_MAX_SIZE", "")
+EMBED_CACHE = os.environ.get("EMBED_CACHE", os.path.expanduser("~/.cache/local-llm-rag/embeddings.db"))
+INSERT_RETRIES = int(os.environ.get("INSERT_RETRIES", "5"))
+NEARDUP_THRESHOLD = float(os.environ.get("NEARDUP_THRESHOLD", "0.8"))  # 0 disables the near-dup index
+QUERY_CACHE = os.environ.get("QUERY_CACHE", os.path.expanduser(f"~/.cache/local-llm-rag/{COLLECTION}.query.db"))
+VECTOR_BACKEND = vector_store.VECTOR_BACKEND  # weaviate | local
 
 def _connect():
-    return weaviate.connect_to_local(grpc_port=50051, http_host="localhost", http_port=8080)
+    return get_client(WEAVIATE_HOST)
 
 def sha256_file(path: str) -> str:
     h = hashlib.sha256()
@@ -30,22 +53,26 @@ def summarize_text(text: str, fname: str) -> str:
     prompt = (f"Summarize this file for an index. Include title guess, topics, "
               f"notable functions/classes if code, and 1-2 tags.\n\n"
               f"FILE: {fname}\n\nCONTENT:\n{text[:8000]}")
+    import ollama
     r = ollama.chat(model=SUMMARY_MODEL, messages=[{"role":"user","content":prompt}],
                     options={"temperature":0.2})
     return r["message"]["content"].strip()
 
+def embed_batch(texts):
+    import ollama
+    return ollama.Client(host=OLLAMA_ENDPOINT).embed(model=EMBED_MODEL, input=texts)["embeddings"]
+
 def chunks_from_path(p: pathlib.Path) -> Iterable[Dict[str, Any]]:
     # Jupyter notebooks
     if p.suffix.lower() == ".ipynb":
-        ipy = extract_ipynb_text(str(p))
-        CH = 1200; OL = 150
-        blocks = [ipy[i:i+CH] for i in range(0, len(ipy), CH-OL)]
-        for b in blocks:
-            yield {"text": b, "source": str(p), "section": "notebook", "page": None}
+        from utils_ipynb_nb import notebook_chunks
+        for ch in notebook_chunks(str(p), max_chars=1200, overlap=150):
+            yield dict(ch, source=str(p), section="notebook", page=None)
         return
 
     # Mathematica notebooks
     if p.suffix.lower() == ".nb":
+        from utils_ipynb_nb import try_export_mathematica_nb_to_md
         md = try_export_mathematica_nb_to_md(str(p))
         if md and os.path.exists(md):
             for c in chunks_from_path(pathlib.Path(md)):
@@ -56,6 +83,8 @@ def chunks_from_path(p: pathlib.Path) -> Iterable[Dict[str, Any]]:
             return
 
     # Parse with Unstructured
+    from unstructured.partition.auto import partition
+    from unstructured.chunking.title import chunk_by_title
     try:
         elements = partition(filename=str(p), strategy="auto")
         chunks = chunk_by_title(elements, max_characters=1200, new_after_n_chars=900, overlap=150)
@@ -71,74 +100,404 @@ def chunks_from_path(p: pathlib.Path) -> Iterable[Dict[str, Any]]:
         pass
 
     # Fallback for unsupported/binary
+    yield stub_chunk(p)
+
+def stub_chunk(p: pathlib.Path, why: str = "BINARY or unsupported") -> Dict[str, Any]:
     st = p.stat()
-    desc = (f"[BINARY or unsupported] name={p.name} ext={p.suffix} size={st.st_size} "
+    desc = (f"[{why}] name={p.name} ext={p.suffix} size={st.st_size} "
             f"mtime={int(st.st_mtime)} path={p}")
-    yield {"text": desc, "source": str(p), "section": "binary", "page": None}
+    return {"text": desc, "source": str(p), "section": "binary", "page": None}
 
 def ensure_collection(client):
-    try:
+    '''COLLECTION, created with a typed schema (filterable source/dirs/ext/section/mtime, only
+    `text` vectorized) and HNSW settings from HNSW_* / VECTOR_COMPRESSION if it does not exist.
+    An existing collection is used as is; drop it and re-ingest to pick up schema changes.'''
+    from weaviate.classes.config import Configure
+    if client.collections.exists(COLLECTION):
         return client.collections.get(COLLECTION)
-    except Exception:
-        return client.collections.create(
-            name=COLLECTION,
-            vectorizer_config=Configure.Vectorizer.text2vec_ollama(
-                api_endpoint=OLLAMA_ENDPOINT, model=EMBED_MODEL
-            ),
-            generative_config=Configure.Generative.ollama(
-                api_endpoint=OLLAMA_ENDPOINT, model="llama3.1:8b"
-            ),
-        )
-
-def ingest_dir(root: str):
-    client = _connect()
-    coll = ensure_collection(client)
-    to_insert = []
-    seen = {}
-
-    files = list(pathlib.Path(root).rglob("*"))
-    for p in tqdm(files, desc="Ingest"):
-        if not p.is_file(): 
-            continue
-        try:
-            filehash = sha256_file(str(p))
-        except Exception:
+    return client.collections.create(
+        name=COLLECTION,
+        properties=vector_store.weaviate_properties(),
+        vector_index_config=vector_store.weaviate_vector_index(),
+        vectorizer_config=Configure.Vectorizer.text2vec_ollama(
+            api_endpoint=OLLAMA_ENDPOINT, model=EMBED_MODEL, vectorize_collection_name=False
+        ),
+        generative_config=Configure.Generative.ollama(
+            api_endpoint=OLLAMA_ENDPOINT, model="llama3.1:8b"
+        ),
+    )
+
+def open_backend(backend: str = VECTOR_BACKEND) -> vector_store.VectorStore:
+    if backend == "local":
+        return vector_store.open_store(COLLECTION, "local")
+    return vector_store.open_store(COLLECTION, backend, ensure_collection(_connect()))
+
+def object_uuid(source: str, part: Any, filehash: str) -> str:
+    '''Deterministic id from (source, chunk index or kind, file hash): re-inserting is an upsert.'''
+    from weaviate.util import generate_uuid5
+    return generate_uuid5(f"{source}|{part}|{filehash}")
+
+class BatchWriter:
+    '''Buffers objects and commits them to the store and the manifest together, BATCH at a time.
+    Failed objects are retried with exponential backoff; if they still fail the error is
+    raised and the staged manifest rows are never committed.'''
+
+    def __init__(self, store: vector_store.VectorStore, manifest: Manifest, size: int = BATCH,
+                 embedder: Embedder = None, neardup: NearDupIndex = None, run: int = 0,
+                 retries: int = INSERT_RETRIES):
+        self.store, self.manifest, self.size = store, manifest, size
+        self.embedder, self.neardup = embedder, neardup
+        self.run, self.retries, self.seq = run, retries, 0
+        self.buf: Dict[str, Dict[str, Any]] = {}
+        self.retag: Dict[str, str] = {}
+        self.dirty = False
+
+    def add(self, obj: Dict[str, Any], part: Any):
+        uid = object_uuid(obj["source"], part, obj.get("hash") or "")
+        self.buf[uid] = obj
+        if self.neardup and obj.get("section") not in ("binary", "duplicate", "summary"):
+            self.neardup.add(uid, obj, self._tag)
+        if len(self.buf) >= self.size:
+            self.flush()
+
+    def _tag(self, uid: str, cluster: str):
+        if uid in self.buf:
+            self.buf[uid]["dup_cluster"] = cluster
+        else:
+            self.retag[uid] = cluster
+
+    def delete_source(self, source: str):
+        self.store.delete_source(source)
+        self.dirty = True
+        if self.neardup:
+            self.neardup.remove_source(source)
+
+    def _insert(self, objs) -> int:
+        pending, delay = objs, 1.0
+        for attempt in range(1, self.retries + 2):
+            try:
+                errors = self.store.upsert(pending)
+                if not errors:
+                    return attempt
+                pending = [pending[i] for i in sorted(errors)]
+                why = next(iter(errors.values()))
+            except Exception as e:  # Weaviate restarting, gRPC deadline, ...
+                why = f"{type(e).__name__}: {e}"
+            if attempt <= self.retries:
+                tqdm.write(f"upsert: {len(pending)} objects failed ({why}); retry in {delay:g}s")
+                time.sleep(delay); delay = min(delay * 2, 60)
+        raise RuntimeError(f"upsert: {len(pending)} objects still failing after {self.retries} retries: {why}")
+
+    def flush(self):
+        # Manifest rows staged since the last flush become durable only once their objects are in.
+        if self.buf:
+            vecs = [None] * len(self.buf)
+            if self.embedder:
+                # bring-your-own vectors: Weaviate skips its vectorizer for these
+                vecs = self.embedder([o["text"] for o in self.buf.values()])
+            attempts = self._insert([(uid, o, v) for (uid, o), v in zip(self.buf.items(), vecs)])
+            self.seq += 1
+            self.manifest.log_batch(self.run, self.seq, len(self.buf), attempts)
+            self.buf.clear()
+            self.dirty = True
+        for uid, cluster in self.retag.items():
+            try:
+                self.store.update(uid, {"dup_cluster": cluster})
+            except Exception as e:
+                tqdm.write(f"could not tag {uid} with near-dup cluster: {e}")
+        self.retag.clear()
+        self.manifest.commit()
+        self.store.flush()
+        if self.dirty:
+            # cached rag_query hit lists no longer describe the collection
+            bump_generation(QUERY_CACHE)
+            self.dirty = False
+
+def write_summaries(results, writer: BatchWriter, manifest: Manifest):
+    for (path, filehash), meta, err in results:
+        if err:
+            tqdm.write(f"summary failed (left queued): {path}: {err}")
             continue
+        writer.add({"text": meta, "source": path, "section": "summary", "page": None, "hash": filehash,
+                    **vector_store.file_props(path)}, "summary")
+        manifest.dequeue_summary(path)
 
-        if filehash in seen:
-            to_insert.append({
-                "text": f"[DUPLICATE of {seen[filehash]}] {p.name}",
-                "source": str(p), "section": "duplicate", "page": None, "hash": filehash
-            })
-            if len(to_insert) >= 256:
-                coll.data.insert_many(to_insert); to_insert.clear()
+def summarize_pending(store: vector_store.VectorStore, manifest: Manifest, writer: BatchWriter, stage: SummaryStage):
+    '''Summarize every queued file from its chunks already stored in the collection.'''
+    pending = manifest.pending_summaries()
+    for path, filehash in tqdm(pending, desc="Summaries"):
+        if (path, filehash) in stage.inflight:
             continue
-        seen[filehash] = str(p)
+        texts = [p.get("text") or "" for p in store.fetch_source(path, 8)]
+        if not texts:
+            manifest.dequeue_summary(path)
+            continue
+        stage.submit((path, filehash), "\n\n".join(texts), path)
+        write_summaries(stage.completed(), writer, manifest)
+    write_summaries(stage.drain(), writer, manifest)
+    writer.flush()
+
+def _embedder(embed: str, store: vector_store.VectorStore):
+    if store.needs_vectors:
+        embed = "client"  # the local index has no vectorizer of its own
+    if embed != "client":
+        return None
+    return Embedder(EMBED_MODEL, EmbedCache(EMBED_CACHE), embed_batch, EMBED_BATCH)
+
+class Ingest:
+    '''One ingest run over `root`: vector store, manifest, writer and summary stage.
+
+    Use as a context manager; the run is journaled as done, interrupted (buffer flushed)
+    or failed (staged manifest rows rolled back). summaries="async" generates them on a
+    side pool while chunks keep flowing; "defer" only queues them for `--summaries-only`.
+    embed="client" computes vectors here in batches through the embedding cache (always, for
+    the local backend).'''
+
+    def __init__(self, root: str, workers: int = WORKERS, timeout: float = PARSE_TIMEOUT,
+                 summaries: str = SUMMARY_MODE, summary_parallel: int = SUMMARY_PARALLEL,
+                 embed: str = EMBED_MODE, backend: str = VECTOR_BACKEND):
+        self.root = os.path.abspath(root)
+        self.workers, self.timeout, self.backend = workers, timeout, backend
+        self.store = open_backend(backend)
+        self.manifest = Manifest(MANIFEST_DB)
+        self.embedder = _embedder(embed, self.store)
+        neardup = NearDupIndex(self.manifest.con, NEARDUP_THRESHOLD) if NEARDUP_THRESHOLD > 0 else None
+        self.run, resumed = self.manifest.start_run(self.root)
+        if resumed:
+            print(f"Resuming after unfinished run #{resumed[0]} ({resumed[1]} batches, {resumed[2]} objects committed)")
+        self.writer = BatchWriter(self.store, self.manifest, embedder=self.embedder, neardup=neardup, run=self.run)
+        self.stage = SummaryStage(summarize_text, summary_parallel) if summaries == "async" else None
+        self.stats = {"new": 0, "changed": 0, "unchanged": 0, "deleted": 0}
 
-        all_text = []
-        for ch in chunks_from_path(p):
-            all_text.append(ch["text"])
-            to_insert.append(ch)
-            if len(to_insert) >= 256:
-                coll.data.insert_many(to_insert); to_insert.clear()
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        status = "done" if exc_type is None else "failed"
+        try:
+            if exc_type is KeyboardInterrupt:
+                # keep the work already parsed; the partial marks tell the next run what to redo
+                status = "interrupted"
+                try:
+                    self.writer.flush()
+                except Exception:
+                    self.manifest.rollback()
+            elif exc_type is not None:
+                self.manifest.rollback()
+            self.manifest.finish_run(self.run, status)
+        finally:
+            self.manifest.close()
+            if self.stage:
+                self.stage.close()
+            if self.embedder:
+                self.embedder.cache.close()
+                self.stats.update(embed_cache_hits=self.embedder.hits, embedded=self.embedder.misses)
+        return False
+
+    def _orphans(self, path: str, sha256: str) -> Dict[str, os.stat_result]:
+        '''Files that may be stored only as "[DUPLICATE of path]" stubs. Once `path` changes or
+        goes, they are forgotten so that the next pass parses the first and re-points the rest.
+        (If `path` was the stub, its original is parsed again too: rare, and still correct.)'''
+        out = {}
+        for dup in self.manifest.paths_for_hash(sha256, exclude=path):
+            self.writer.delete_source(dup)
+            self.manifest.remove(dup)
+            try:
+                out[dup] = os.stat(dup)
+            except OSError:
+                self.stats["deleted"] += 1
+        return out
 
-        if all_text:
+    def _plan(self, files: Iterable, seen: Dict[str, str]):
+        # Yields ((path, stat, hash, dup_of), path_to_parse); duplicates pass through unparsed.
+        manifest, stats = self.manifest, self.stats
+        orphans: Dict[str, os.stat_result] = {}
+        def stream():
+            for path, st in files:
+                orphans.pop(path, None)  # orphaned earlier in this pass: handled here instead
+                yield path, st
+            while orphans:
+                yield orphans.popitem()
+        for path, st in stream():
+            p = pathlib.Path(path)
+            rec = manifest.get(path)
+            if rec and rec[0] == st.st_size and rec[1] == st.st_mtime_ns:
+                stats["unchanged"] += 1
+                continue
             try:
-                meta = summarize_text("\n\n".join(all_text[:8]), str(p))
-                to_insert.append({
-                    "text": meta, "source": str(p), "section": "summary", "page": None, "hash": filehash
-                })
+                filehash = sha256_file(path)
             except Exception:
-                pass
+                continue
+            if rec and rec[2] == filehash:
+                # touched but identical: refresh stat so the next run skips it without reading
+                manifest.put(path, st.st_size, st.st_mtime_ns, filehash)
+                stats["unchanged"] += 1
+                continue
+            if rec:
+                orphans.update(self._orphans(path, rec[2]))
+                manifest.remove(path)  # so the orphans cannot name it as their original
+            if rec or manifest.is_partial(path):
+                self.writer.delete_source(path)
+                manifest.dequeue_summary(path)
+            stats["changed" if rec else "new"] += 1
 
-        if len(to_insert) >= 256:
-            coll.data.insert_many(to_insert); to_insert.clear()
+            orig = seen.get(filehash) or manifest.path_for_hash(filehash, exclude=path)
+            if orig == path:  # an orphan that was this hash's first file earlier in the pass
+                orig = None
+            if not orig:
+                seen[filehash] = path
+            yield (p, st, filehash, orig), (None if orig else p)
 
-    if to_insert:
-        coll.data.insert_many(to_insert)
-    client.close()
+    def ingest(self, files: Iterable):
+        '''Ingest (path, stat) pairs that are new or changed according to the manifest.'''
+        writer, manifest, stage = self.writer, self.manifest, self.stage
+        seen: Dict[str, str] = {}
+        for (p, st, filehash, orig), chunks, err in parse_stream(self._plan(files, seen), chunks_from_path,
+                                                                 self.workers, self.timeout):
+            path = str(p)
+            fprops = vector_store.file_props(path, st)
+            if orig:
+                writer.add({
+                    "text": f"[DUPLICATE of {orig}] {p.name}",
+                    "source": path, "section": "duplicate", "page": None, "hash": filehash, **fprops
+                }, "duplicate")
+                manifest.put(path, st.st_size, st.st_mtime_ns, filehash)
+                continue
+            if err:
+                tqdm.write(f"parse failed: {path}: {err}")
+                try:
+                    chunks = [stub_chunk(p, f"PARSE FAILED: {err}")]
+                except OSError:
+                    continue
+
+            all_text = []
+            manifest.mark_partial(path)
+            for i, ch in enumerate(chunks):
+                all_text.append(ch["text"])
+                ch.update(fprops, chunk=i, hash=filehash)
+                writer.add(ch, i)
+
+            if all_text:
+                # queued first: if the stage is saturated the end-of-run pass picks it up
+                manifest.queue_summary(path, filehash)
+                if stage:
+                    stage.submit((path, filehash), "\n\n".join(all_text[:8]), path, block=False)
+            manifest.put(path, st.st_size, st.st_mtime_ns, filehash)
+            if stage:
+                write_summaries(stage.completed(), writer, manifest)
+
+    def purge(self, paths: Iterable[str]):
+        '''Remove the objects of deleted files; a path that is not a known file is treated as a folder.
+        Files that were stored as duplicates of a deleted one are parsed again.'''
+        orphans: Dict[str, os.stat_result] = {}
+        for path in paths:
+            for gone in ([path] if self.manifest.get(path) else self.manifest.paths_under(path)):
+                rec = self.manifest.get(gone)
+                if rec:
+                    orphans.update(self._orphans(gone, rec[2]))
+                self.writer.delete_source(gone)
+                self.manifest.remove(gone)
+                orphans.pop(gone, None)
+                self.stats["deleted"] += 1
+        if orphans:
+            self.ingest(orphans.items())
+
+    def commit(self):
+        self.writer.flush()
+        if self.stage:
+            summarize_pending(self.store, self.manifest, self.writer, self.stage)
+
+def ingest_dir(root: str, workers: int = WORKERS, timeout: float = PARSE_TIMEOUT,
+               summaries: str = SUMMARY_MODE, summary_parallel: int = SUMMARY_PARALLEL,
+               embed: str = EMBED_MODE, include=INCLUDE, exclude=EXCLUDE, max_size: str = MAX_SIZE,
+               backend: str = VECTOR_BACKEND):
+    with Ingest(root, workers, timeout, summaries, summary_parallel, embed, backend) as ing:
+        present = set()
+        def visit(files):
+            for path, st in files:
+                present.add(path)
+                yield path, st
+        ing.ingest(visit(with_progress(walk_files(ing.root, include, exclude, parse_size(max_size)), "Ingest")))
+        # not visited is not gone: --include/--exclude/--max-size and unreadable folders skip files too
+        ing.purge(p for p in ing.manifest.paths_under(ing.root) if p not in present and not os.path.exists(p))
+        ing.commit()
+    print(", ".join(f"{k}={v}" for k, v in ing.stats.items()))
+
+def watch_dir(root: str, debounce: float = 2.0, poll: float = 0, include=INCLUDE, exclude=EXCLUDE,
+              max_size: str = MAX_SIZE, **kw):
+    '''Catch up with one full pass, then keep the collection in step with filesystem events.'''
+    ingest_dir(root, include=include, exclude=exclude, max_size=max_size, **kw)
+    with Ingest(root, **kw) as ing:
+        def on_batch(files, deleted):
+            # the pooled client may have reconnected since the last batch
+            ing.store = ing.writer.store = open_backend(ing.backend)
+            before = dict(ing.stats)
+            try:
+                ing.purge(deleted)
+                ing.ingest(files)
+                ing.commit()
+            except Exception as e:
+                # stay up: the files are left unrecorded (or marked partial) and redone on their next change
+                ing.manifest.rollback()
+                ing.writer.buf.clear()
+                tqdm.write(f"batch failed: {type(e).__name__}: {e}")
+                return
+            delta = {k: v - before.get(k, 0) for k, v in ing.stats.items() if v != before.get(k, 0)}
+            tqdm.write(time.strftime("%H:%M:%S ") + (", ".join(f"{k}={v}" for k, v in delta.items()) or "no changes"))
+        watch(ing.root, on_batch, debounce=debounce, poll=poll or None,
+              include=include, exclude=exclude, max_size=parse_size(max_size))
+
+def summaries_only(summary_parallel: int = SUMMARY_PARALLEL, embed: str = EMBED_MODE,
+                   backend: str = VECTOR_BACKEND):
+    store = open_backend(backend)
+    manifest = Manifest(MANIFEST_DB)
+    embedder = _embedder(embed, store)
+    stage = SummaryStage(summarize_text, summary_parallel)
+    try:
+        summarize_pending(store, manifest, BatchWriter(store, manifest, embedder=embedder), stage)
+    finally:
+        stage.close()
+        manifest.close()
+        if embedder:
+            embedder.cache.close()
 
 if __name__ == "__main__":
-    root = os.environ.get("INGEST_DIR", ".")
-    print(f"Ingesting: {root}")
-    ingest_dir(root)
+    ap = argparse.ArgumentParser(description="Index a folder into Weaviate or the local vector index.")
+    ap.add_argument("root", nargs="?", default=ROOT)
+    ap.add_argument("--workers", type=int, default=WORKERS,
+                    help="parser processes; 0 parses in-process (env INGEST_WORKERS)")
+    ap.add_argument("--timeout", type=float, default=PARSE_TIMEOUT,
+                    help="per-file parse timeout in seconds when --workers > 0 (env PARSE_TIMEOUT)")
+    ap.add_argument("--summaries", choices=["async", "defer"], default=SUMMARY_MODE,
+                    help="async: summarize alongside ingest; defer: only queue them (env SUMMARY_MODE)")
+    ap.add_argument("--summary-parallel", type=int, default=SUMMARY_PARALLEL,
+                    help="summary requests in flight; match OLLAMA_NUM_PARALLEL (env SUMMARY_PARALLEL)")
+    ap.add_argument("--embed", choices=["server", "client"], default=EMBED_MODE,
+                    help="client: batch-embed here with an on-disk cache and upload vectors (env EMBED_MODE)")
+    ap.add_argument("--backend", choices=["weaviate", "local"], default=VECTOR_BACKEND,
+                    help="local: embedded index under VECTOR_DIR, no Weaviate needed (env VECTOR_BACKEND)")
+    ap.add_argument("--include", action="append", default=None, metavar="GLOB",
+                    help="only ingest matching files, e.g. '*.pdf' or 'docs/*' (env INGEST_INCLUDE, comma-separated)")
+    ap.add_argument("--exclude", action="append", default=None, metavar="GLOB",
+                    help="skip matching files and directories (env INGEST_EXCLUDE, comma-separated)")
+    ap.add_argument("--max-size", default=MAX_SIZE, help="skip files larger than this, e.g. 200M (env INGEST_MAX_SIZE)")
+    ap.add_argument("--summaries-only", action="store_true",
+                    help="skip discovery and work off the queue of deferred summaries")
+    ap.add_argument("--watch", action="store_true",
+                    help="after a catch-up pass, keep running and re-ingest files as they change")
+    ap.add_argument("--debounce", type=float, default=2.0, help="--watch: seconds a file must be quiet")
+    ap.add_argument("--poll", type=float, default=0,
+                    help="--watch: rescan every N seconds instead of using filesystem events")
+    args = ap.parse_args()
+    # flags replace the env globs; a list default would be appended to (and mutate the global)
+    args.include = INCLUDE if args.include is None else args.include
+    args.exclude = EXCLUDE if args.exclude is None else args.exclude
+    kw = dict(workers=args.workers, timeout=args.timeout, summaries=args.summaries,
+              summary_parallel=args.summary_parallel, embed=args.embed, backend=args.backend)
+    if args.summaries_only:
+        summaries_only(args.summary_parallel, embed=args.embed, backend=args.backend)
+    elif args.watch:
+        watch_dir(args.root, args.debounce, args.poll, args.include, args.exclude, args.max_size, **kw)
+    else:
+        print(f"Ingesting: {args.root}")
+        ingest_dir(args.root, include=args.include, exclude=args.exclude, max_size=args.max_size, **kw)
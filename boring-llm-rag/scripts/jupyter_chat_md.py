@@ -1,19 +1,21 @@
 from __future__ import annotations
-import os, json, time, uuid, pathlib
-from typing import List, Dict, Optional
+import atexit, os, json, sys, threading, time, uuid, pathlib
+from importlib.util import find_spec
+from typing import List, Dict, Optional, Tuple
 import ollama
 
 try:
-    from IPython.display import display, Markdown
-    _HAS_IPY = True
-except Exception:
-    _HAS_IPY = False
+    from . import md_stream, chat_window, context_pack
+except ImportError:
+    import md_stream, chat_window, context_pack
 
-try:
-    import weaviate
-    _HAS_WV = True
-except Exception:
-    _HAS_WV = False
+ANSWER_TOKENS = int(os.environ.get("ANSWER_TOKENS", "1024"))  # reserved for the reply when fitting history
+CONTEXT_TOKENIZER = os.environ.get("CONTEXT_TOKENIZER", "")
+KEEP_ALIVE = os.environ.get("OLLAMA_KEEP_ALIVE", "30m")  # an unloaded model loses its KV cache
+LOG_BATCH = int(os.environ.get("CHAT_LOG_BATCH", "100"))  # objects per insert_many when logging chats
+
+# weaviate is only needed by log_to_weaviate(); plain chat should not pay for importing it
+_HAS_WV = find_spec("weaviate") is not None
 
 def _now_ms() -> int:
     return int(time.time() * 1000)
@@ -73,6 +75,10 @@ class ChatMD:
         self.seed = seed
         self.id = str(uuid.uuid4())
         self.messages: List[Dict[str, str]] = [{"role": "system", "content": self.system_prompt}]
+        self._transcript = md_stream.Transcript(self._msg_md)
+        self.window = chat_window.ChatWindow(self._summarize, context_pack.token_counter(CONTEXT_TOKENIZER))
+        self.autolog: Optional[str] = None  # collection to log to in the background after every ask()
+        self._logged, self._logged_last = 0, ()
 
     def save_json(self, path: str) -> str:
         data = {
@@ -85,6 +91,8 @@ class ChatMD:
                 "seed": self.seed
             },
             "messages": self.messages,
+            "window": self.window.state(),
+            "logged": self._logged,
             "saved_at": _now_ms()
         }
         pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
@@ -105,6 +113,10 @@ class ChatMD:
         )
         sess.id = data.get("id", str(uuid.uuid4()))
         sess.messages = data.get("messages", sess.messages)
+        sess.window.restore(data.get("window"))
+        if data.get("logged"):
+            sess._logged = min(int(data["logged"]), len(sess.messages))
+            sess._logged_last = tuple(sess.messages[sess._logged - 1].items())
         return sess
 
     def save_markdown(self, path: str) -> str:
@@ -115,36 +127,32 @@ class ChatMD:
         return path
 
     def to_markdown(self) -> str:
-        lines = [f"# Chat — {self.model}\n"]
-        for msg in self.messages:
-            role = msg["role"]
-            content = msg["content"].rstrip()
-            if role == "system":
-                lines.append(f"> **system**\n>\n> {content}\n")
-            elif role == "user":
-                lines.append(f"**You:**\n\n{content}\n")
-            else:
-                lines.append(f"**Assistant:**\n\n{content}\n")
-        return "\n".join(lines).strip() + "\n"
-
-    def _display_markdown(self, md_text: str, display_handle=None):
-        if not _HAS_IPY:
-            print(md_text)
-            return display_handle
-        if display_handle is None:
-            return display(Markdown(md_text), display_id=True)
-        else:
-            display_handle.update(Markdown(md_text))
-            return display_handle
-
-    def _msgs_to_md(self, msgs: List[Dict[str, str]]) -> str:
-        lines = [f"# Chat — {self.model}\n"]
-        for m in msgs:
-            r, c = m["role"], m["content"].rstrip()
-            if r == "system": lines += [f"> **system**\n>\n> {c}\n"]
-            elif r == "user": lines += [f"**You:**\n\n{c}\n"]
-            else: lines += [f"**Assistant:**\n\n{c}\n"]
-        return "\n".join(lines)
+        parts = self._transcript.parts(self.messages)
+        return "\n".join([f"# Chat — {self.model}\n", *parts]).strip() + "\n"
+
+    @staticmethod
+    def _msg_md(msg: Dict[str, str]) -> str:
+        role, content = msg["role"], msg["content"].rstrip()
+        if role == "system":
+            return f"> **system**\n>\n> {content}\n"
+        if role == "user":
+            return f"**You:**\n\n{content}\n"
+        return f"**Assistant:**\n\n{content}\n"
+
+    def _summarize(self, prompt: str) -> str:
+        res = ollama.chat(model=self.model, messages=[{"role": "user", "content": prompt}], keep_alive=KEEP_ALIVE,
+                          options={"temperature": 0.2, "num_ctx": self.num_ctx, "num_predict": chat_window.SUMMARY_TOKENS})
+        return res["message"]["content"]
+
+    def request_messages(self) -> List[Dict[str, str]]:
+        '''What ask() sends: the system prompt (plus the rolling summary of folded turns), then
+        the recent turns verbatim, fitted into num_ctx minus ANSWER_TOKENS.'''
+        system = self.messages[0]
+        budget = self.num_ctx - ANSWER_TOKENS - self.window.tokens(system)
+        summary, recent = self.window.window(self.messages[1:], budget)
+        if summary:
+            system = {"role": "system", "content": f"{system['content']}\n\nSummary of the earlier conversation:\n{summary}"}
+        return [system, *recent]
 
     def ask(self, prompt: str, stream: bool = True) -> str:
         self.messages.append({"role": "user", "content": prompt})
@@ -157,59 +165,147 @@ class ChatMD:
         if self.seed is not None:
             opts["seed"] = self.seed
 
+        msgs = self.request_messages()
         reply = ""
-        if _HAS_IPY:
-            tmp_msgs = self.messages + [{"role": "assistant", "content": ""}]
-            handle = self._display_markdown(self._msgs_to_md(tmp_msgs))
-        else:
-            handle = None
-
+        view = md_stream.MarkdownStream(self.to_markdown(), "**Assistant:**\n\n")
         if stream:
-            for part in ollama.chat(model=self.model, messages=self.messages, stream=True, options=opts):
-                delta = part.get("message", {}).get("content", "")
-                reply += delta
-                if _HAS_IPY:
-                    tmp_msgs[-1]["content"] = reply
-                    handle = self._display_markdown(self._msgs_to_md(tmp_msgs), display_handle=handle)
+            for part in ollama.chat(model=self.model, messages=msgs, stream=True, options=opts, keep_alive=KEEP_ALIVE):
+                reply += part.get("message", {}).get("content", "")
+                view.update(reply)
         else:
-            res = ollama.chat(model=self.model, messages=self.messages, options=opts)
+            res = ollama.chat(model=self.model, messages=msgs, options=opts, keep_alive=KEEP_ALIVE)
             reply = res["message"]["content"]
 
         self.messages.append({"role": "assistant", "content": reply})
-        self._display_markdown(self.to_markdown(), display_handle=handle)
+        view.close(reply)
+        if self.autolog and _HAS_WV:
+            self.log_to_weaviate(self.autolog, background=True)
         return reply
 
+    def _log_objects(self) -> Dict[str, Dict]:
+        '''Messages not logged yet, keyed by their uuid5(chat id, turn); advances the mark.'''
+        from weaviate.util import generate_uuid5
+        n = self._logged
+        if n > len(self.messages) or (n and tuple(self.messages[n - 1].items()) != self._logged_last):
+            n = 1  # history was replaced or edited: resend it all, the ids make that an upsert
+        objs, ts = {}, _now_ms()
+        for i in range(max(n, 1), len(self.messages)):
+            m = self.messages[i]
+            objs[generate_uuid5(f"{self.id}|{i}")] = {"chat_id": self.id, "turn": i, "role": m["role"],
+                                                      "content": m["content"], "ts": ts, "model": self.model}
+        self._logged = len(self.messages)
+        self._logged_last = tuple(self.messages[-1].items())
+        return objs
+
     def log_to_weaviate(self,
                          collection: str = "Conversations",
-                         weaviate_host: str = "http://localhost:8080") -> None:
+                         weaviate_host: Optional[str] = None,
+                         background: bool = False) -> int:
+        '''Send the messages added since the last call; returns how many.
+
+        Objects have deterministic ids, so logging twice (or after reloading a saved chat)
+        overwrites instead of duplicating. With background=True the objects are queued for a
+        writer thread that batches them, and the call returns at once; failed batches are
+        retried there. Set `autolog` to a collection name to do this after every ask().'''
         if not _HAS_WV:
             raise RuntimeError("weaviate-client not installed")
-        client = weaviate.connect_to_local(grpc_port=50051, http_host="localhost", http_port=8080)
+        objs = self._log_objects()
+        if objs:
+            key = (weaviate_host or "", collection)
+            if background:
+                _log_writer.put(key, objs)
+            else:
+                failed, why = _write_log(key, objs)
+                if failed:
+                    self._logged = 1  # next call resends everything
+                    raise RuntimeError(f"log_to_weaviate: {len(failed)} of {len(objs)} messages failed: {why}")
+        return len(objs)
+
+_log_collections = set()
+
+def _log_collection(host: str, name: str):
+    try:
+        from . import wv_client
+    except ImportError:
+        import wv_client
+    client = wv_client.get_client(host or None)  # pooled (default WEAVIATE_HOST); stays open
+    if (host, name) not in _log_collections:
+        if not client.collections.exists(name):
+            from weaviate.classes.config import Configure
+            client.collections.create(
+                name=name,
+                vectorizer_config=Configure.Vectorizer.text2vec_ollama(
+                    api_endpoint="http://localhost:11434", model="bge-m3"
+                ),
+            )
+        _log_collections.add((host, name))
+    return client.collections.get(name)
+
+def _write_log(key: Tuple[str, str], objs: Dict[str, Dict]) -> Tuple[Dict[str, Dict], str]:
+    '''insert_many in LOG_BATCH chunks; returns the objects that did not make it and why.'''
+    from weaviate.classes.data import DataObject
+    items, failed, why = list(objs.items()), {}, ""
+    try:
+        coll = _log_collection(*key)
+    except Exception as e:
+        return objs, f"{type(e).__name__}: {e}"
+    for i in range(0, len(items), LOG_BATCH):
+        chunk = items[i:i + LOG_BATCH]
         try:
-            try:
-                coll = client.collections.get(collection)
-            except:
-                from weaviate.classes.config import Configure
-                coll = client.collections.create(
-                    name=collection,
-                    vectorizer_config=Configure.Vectorizer.text2vec_ollama(
-                        api_endpoint="http://localhost:11434", model="bge-m3"
-                    ),
-                )
-            objs = []
-            for i, m in enumerate(self.messages):
-                if m["role"] == "system": 
-                    continue
-                objs.append({
-                    "chat_id": self.id,
-                    "turn": i,
-                    "role": m["role"],
-                    "content": m["content"],
-                    "ts": _now_ms(),
-                    "model": self.model,
-                })
-                if len(objs) >= 200:
-                    coll.data.insert_many(objs); objs.clear()
-            if objs: coll.data.insert_many(objs)
-        finally:
-            client.close()
+            res = coll.data.insert_many([DataObject(properties=p, uuid=u) for u, p in chunk])
+            failed.update(chunk[j] for j in res.errors)
+            why = why or next((e.message for e in res.errors.values()), "")
+        except Exception as e:  # Weaviate restarting, gRPC deadline, ...
+            failed.update(chunk)
+            why = f"{type(e).__name__}: {e}"
+    return failed, why
+
+class _LogWriter:
+    '''One daemon thread shipping logged messages. Whatever is queued while a batch is in
+    flight goes out together in the next one; failures are re-queued (unless a newer copy
+    of the object already is) and retried with backoff. flush() runs at exit.'''
+    def __init__(self):
+        self.cv = threading.Condition()
+        self.pending: Dict[Tuple[str, str], Dict[str, Dict]] = {}
+        self.busy = False
+        self.thread: Optional[threading.Thread] = None
+
+    def put(self, key: Tuple[str, str], objs: Dict[str, Dict]):
+        with self.cv:
+            self.pending.setdefault(key, {}).update(objs)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="chat-log", daemon=True)
+                self.thread.start()
+                atexit.register(self.flush)
+            self.cv.notify_all()
+
+    def _run(self):
+        delay = 1.0
+        while True:
+            with self.cv:
+                self.busy = False
+                self.cv.notify_all()
+                self.cv.wait_for(lambda: self.pending)
+                self.busy = True
+                key = next(iter(self.pending))
+                objs = self.pending.pop(key)
+            failed, why = _write_log(key, objs)
+            if not failed:
+                delay = 1.0
+                continue
+            with self.cv:
+                newer = self.pending.setdefault(key, {})
+                self.pending[key] = {**failed, **newer}
+            print(f"log_to_weaviate: {len(failed)} messages failed ({why}); retry in {delay:g}s", file=sys.stderr)
+            time.sleep(delay)
+            delay = min(delay * 2, 60)
+
+    def flush(self, timeout: float = 30.0) -> bool:
+        '''Wait until everything queued so far is written; False on timeout.'''
+        with self.cv:
+            return self.cv.wait_for(lambda: not self.pending and not self.busy, timeout)
+
+_log_writer = _LogWriter()
+
+def flush_logs(timeout: float = 30.0) -> bool:
+    return _log_writer.flush(timeout)
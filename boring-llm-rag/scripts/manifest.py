@@ -0,0 +1,92 @@
+import os, sqlite3, time
+from typing import List, Optional, Tuple
+
+class Manifest:
+    '''Persistent record of ingested files: path -> (size, mtime_ns, sha256).
+    Writes are only made durable by commit(), which ingest calls after the matching
+    objects reached Weaviate, so a crashed run never marks a file as done.
+
+    Also journals runs and committed batches, and which files were only partly
+    written when a run stopped, so the next run can clear them before re-ingesting.'''
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.con = sqlite3.connect(path)
+        self.con.execute("PRAGMA journal_mode=WAL")
+        self.con.execute('''CREATE TABLE IF NOT EXISTS files (
+            path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, sha256 TEXT, ingested_at REAL)''')
+        self.con.execute("CREATE INDEX IF NOT EXISTS files_sha256 ON files(sha256)")
+        self.con.execute('''CREATE TABLE IF NOT EXISTS summary_queue (
+            path TEXT PRIMARY KEY, sha256 TEXT, queued_at REAL)''')
+        self.con.execute("CREATE TABLE IF NOT EXISTS partial (path TEXT PRIMARY KEY)")
+        self.con.execute('''CREATE TABLE IF NOT EXISTS runs (
+            id INTEGER PRIMARY KEY, root TEXT, started REAL, finished REAL, status TEXT)''')
+        self.con.execute('''CREATE TABLE IF NOT EXISTS batches (
+            run INTEGER, seq INTEGER, objects INTEGER, attempts INTEGER, committed_at REAL)''')
+        self.con.commit()
+
+    def get(self, path: str) -> Optional[Tuple[int, int, str]]:
+        return self.con.execute("SELECT size, mtime_ns, sha256 FROM files WHERE path=?", (path,)).fetchone()
+
+    def path_for_hash(self, sha256: str, exclude: str = "") -> Optional[str]:
+        row = self.con.execute("SELECT path FROM files WHERE sha256=? AND path<>? LIMIT 1",
+                               (sha256, exclude)).fetchone()
+        return row[0] if row else None
+
+    def paths_for_hash(self, sha256: str, exclude: str = "") -> List[str]:
+        return [r[0] for r in self.con.execute("SELECT path FROM files WHERE sha256=? AND path<>?", (sha256, exclude))]
+
+    def put(self, path: str, size: int, mtime_ns: int, sha256: str):
+        self.con.execute("INSERT OR REPLACE INTO files VALUES (?,?,?,?,?)",
+                         (path, size, mtime_ns, sha256, time.time()))
+        self.con.execute("DELETE FROM partial WHERE path=?", (path,))
+
+    def mark_partial(self, path: str):
+        '''Staged before a file's first object; put() clears it once the file is complete.'''
+        self.con.execute("INSERT OR IGNORE INTO partial VALUES (?)", (path,))
+
+    def is_partial(self, path: str) -> bool:
+        return self.con.execute("SELECT 1 FROM partial WHERE path=?", (path,)).fetchone() is not None
+
+    def remove(self, path: str):
+        self.con.execute("DELETE FROM files WHERE path=?", (path,))
+        self.dequeue_summary(path)
+
+    def queue_summary(self, path: str, sha256: str):
+        self.con.execute("INSERT OR REPLACE INTO summary_queue VALUES (?,?,?)", (path, sha256, time.time()))
+
+    def dequeue_summary(self, path: str):
+        self.con.execute("DELETE FROM summary_queue WHERE path=?", (path,))
+
+    def pending_summaries(self) -> List[Tuple[str, str]]:
+        return self.con.execute("SELECT path, sha256 FROM summary_queue ORDER BY queued_at").fetchall()
+
+    def paths_under(self, root: str) -> List[str]:
+        lo = root.rstrip(os.sep) + os.sep
+        hi = lo[:-1] + chr(ord(os.sep) + 1)
+        return [r[0] for r in self.con.execute("SELECT path FROM files WHERE path>=? AND path<?", (lo, hi))]
+
+    def start_run(self, root: str) -> Tuple[int, Optional[Tuple[int, int, int]]]:
+        '''Open a run; also returns (id, batches, objects) of the last run over root if it never finished.'''
+        last = self.con.execute('''SELECT r.id, r.status, COUNT(b.seq), COALESCE(SUM(b.objects), 0)
+                                   FROM runs r LEFT JOIN batches b ON b.run = r.id
+                                   WHERE r.root=? GROUP BY r.id ORDER BY r.id DESC LIMIT 1''', (root,)).fetchone()
+        cur = self.con.execute("INSERT INTO runs (root, started, status) VALUES (?,?,'running')", (root, time.time()))
+        self.con.commit()
+        return cur.lastrowid, ((last[0], last[2], last[3]) if last and last[1] != "done" else None)
+
+    def log_batch(self, run: int, seq: int, objects: int, attempts: int):
+        self.con.execute("INSERT INTO batches VALUES (?,?,?,?,?)", (run, seq, objects, attempts, time.time()))
+
+    def finish_run(self, run: int, status: str):
+        self.con.execute("UPDATE runs SET finished=?, status=? WHERE id=?", (time.time(), status, run))
+        self.con.commit()
+
+    def rollback(self):
+        self.con.rollback()
+
+    def commit(self):
+        self.con.commit()
+
+    def close(self):
+        self.con.close()
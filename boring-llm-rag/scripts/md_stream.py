@@ -0,0 +1,61 @@
+import os, time
+from typing import Callable, Dict, List, Sequence
+
+try:
+    from IPython.display import display, Markdown
+    _HAS_IPY = True
+except Exception:
+    _HAS_IPY = False
+
+RENDER_HZ = float(os.environ.get("RENDER_HZ", "10"))  # live-message redraws per second; 0 = every token
+
+class Transcript:
+    '''Per-message Markdown, rendered once and cached; parts(msgs) re-renders only
+    messages that are new or changed since the last call.'''
+    def __init__(self, render: Callable[[Dict], str]):
+        self.render = render
+        self._keys: List[tuple] = []
+        self._parts: List[str] = []
+
+    def parts(self, msgs: Sequence[Dict]) -> List[str]:
+        keys = [tuple(m.items()) for m in msgs]
+        n = 0
+        while n < min(len(keys), len(self._keys)) and keys[n] == self._keys[n]:
+            n += 1
+        self._parts[n:] = [self.render(m) for m in msgs[n:]]
+        self._keys = keys
+        return self._parts
+
+class MarkdownStream:
+    '''Shows one streaming message under an already-rendered transcript.
+
+    The transcript goes out once as its own output (none if empty) and is never touched
+    again; update() redraws only the live message, at most `hz` times a second, so a token
+    costs the same on turn 2 as on turn 200. `footer` closes the message, e.g. a code fence.
+    Without IPython nothing is drawn until close() prints it all.'''
+    def __init__(self, history_md: str, header: str, hz: float = RENDER_HZ, cursor: str = " ▌", footer: str = ""):
+        self.history_md, self.header, self.cursor, self.footer = history_md, header, cursor, footer
+        self.interval = 1.0 / hz if hz > 0 else 0.0
+        self.frames = 0
+        self._last = 0.0
+        self._handle = None
+        if _HAS_IPY:
+            if history_md:
+                display(Markdown(history_md))
+            self._handle = display(Markdown(header + cursor.lstrip() + footer), display_id=True)
+
+    def _draw(self, md: str):
+        self._handle.update(Markdown(md))
+        self._last = time.monotonic()
+        self.frames += 1
+
+    def update(self, text: str):
+        # tokens that land inside the frame interval are coalesced into the next redraw
+        if self._handle is not None and time.monotonic() - self._last >= self.interval:
+            self._draw(self.header + text + self.cursor + self.footer)
+
+    def close(self, text: str):
+        if self._handle is not None:
+            self._draw(self.header + text + self.footer)
+        else:
+            print("\n\n".join(filter(None, [self.history_md.rstrip(), self.header + text + self.footer])))
@@ -0,0 +1,110 @@
+import fnmatch, hashlib, re, sqlite3, zlib
+from typing import Callable, Dict, List, Optional
+import numpy as np
+
+NUM_PERM, BANDS = 128, 16          # 16 bands x 8 rows: candidate pairs from ~0.7 Jaccard up
+SHINGLE = 5                        # words per shingle
+MIN_TOKENS = 20                    # shorter chunks are too generic to call near-duplicates
+_P = (1 << 61) - 1
+_rng = np.random.default_rng(0x5EED)
+_A = _rng.integers(1, 1 << 32, NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, 1 << 32, NUM_PERM, dtype=np.uint64)
+
+def signature(text: str) -> Optional[np.ndarray]:
+    '''MinHash of the word 5-shingles of text, or None if the text is too short.'''
+    toks = re.findall(r"\w+", text.lower())
+    if len(toks) < MIN_TOKENS:
+        return None
+    sh = {zlib.crc32(" ".join(toks[i:i+SHINGLE]).encode()) for i in range(len(toks) - SHINGLE + 1)}
+    x = np.fromiter(sh, dtype=np.uint64, count=len(sh))
+    # a, x < 2**32 so a*x + b stays inside uint64 before the reduction mod 2**61-1
+    return ((np.outer(_A, x) + _B[:, None]) % _P).min(axis=1).astype(np.uint32)
+
+def _buckets(sig: np.ndarray) -> List[int]:
+    rows = NUM_PERM // BANDS
+    return [int.from_bytes(hashlib.blake2b(sig[b*rows:(b+1)*rows].tobytes(), digest_size=8).digest(),
+                           "little", signed=True) for b in range(BANDS)]
+
+class NearDupIndex:
+    '''Persistent MinHash/LSH index of chunk shingles with near-duplicate groups.
+
+    Shares the manifest's SQLite connection so index rows commit together with the
+    objects they describe. A chunk that matches an indexed chunk of another file at
+    or above `threshold` joins (or opens) that chunk's cluster; `tag(uuid, cluster)`
+    is called for every object whose cluster id changes.'''
+
+    def __init__(self, con: sqlite3.Connection, threshold: float = 0.8):
+        self.con, self.threshold = con, threshold
+        con.executescript('''
+            CREATE TABLE IF NOT EXISTS nd_chunk (
+                uuid TEXT PRIMARY KEY, source TEXT, section TEXT, snippet TEXT, sig BLOB);
+            CREATE INDEX IF NOT EXISTS nd_chunk_source ON nd_chunk(source);
+            CREATE TABLE IF NOT EXISTS nd_lsh (band INTEGER, bucket INTEGER, uuid TEXT);
+            CREATE INDEX IF NOT EXISTS nd_lsh_bucket ON nd_lsh(band, bucket);
+            CREATE INDEX IF NOT EXISTS nd_lsh_uuid ON nd_lsh(uuid);
+            CREATE TABLE IF NOT EXISTS nd_group (uuid TEXT PRIMARY KEY, cluster TEXT, similarity REAL);
+            CREATE INDEX IF NOT EXISTS nd_group_cluster ON nd_group(cluster);
+        ''')
+
+    def add(self, uid: str, obj: Dict, tag: Callable[[str, str], None]) -> Optional[str]:
+        sig = signature(obj.get("text") or "")
+        if sig is None:
+            return None
+        source, buckets = obj.get("source"), _buckets(sig)
+        best, best_sim = None, 0.0
+        seen = set()
+        for band, bucket in enumerate(buckets):
+            for (cand,) in self.con.execute("SELECT uuid FROM nd_lsh WHERE band=? AND bucket=? LIMIT 64",
+                                          (band, bucket)):
+                if cand in seen:
+                    continue
+                seen.add(cand)
+                row = self.con.execute("SELECT source, sig FROM nd_chunk WHERE uuid=?", (cand,)).fetchone()
+                if not row or row[0] == source:
+                    continue
+                sim = float(np.mean(np.frombuffer(row[1], dtype=np.uint32) == sig))
+                if sim > best_sim:
+                    best, best_sim = cand, sim
+
+        self.con.execute("INSERT OR REPLACE INTO nd_chunk VALUES (?,?,?,?,?)",
+                         (uid, source, obj.get("section"), (obj.get("text") or "")[:240], sig.tobytes()))
+        self.con.execute("DELETE FROM nd_lsh WHERE uuid=?", (uid,))  # re-ingest of the same object id
+        self.con.executemany("INSERT INTO nd_lsh VALUES (?,?,?)", [(b, k, uid) for b, k in enumerate(buckets)])
+        if best is None or best_sim < self.threshold:
+            return None
+        row = self.con.execute("SELECT cluster FROM nd_group WHERE uuid=?", (best,)).fetchone()
+        cluster = row[0] if row else best
+        if not row:
+            self.con.execute("INSERT INTO nd_group VALUES (?,?,1.0)", (best, cluster))
+            tag(best, cluster)
+        self.con.execute("INSERT OR REPLACE INTO nd_group VALUES (?,?,?)", (uid, cluster, best_sim))
+        tag(uid, cluster)
+        return cluster
+
+    def remove_source(self, source: str):
+        uids = [r[0] for r in self.con.execute("SELECT uuid FROM nd_chunk WHERE source=?", (source,))]
+        for i in range(0, len(uids), 500):
+            part = uids[i:i+500]
+            marks = ",".join("?" * len(part))
+            for table in ("nd_lsh", "nd_group", "nd_chunk"):
+                self.con.execute(f"DELETE FROM {table} WHERE uuid IN ({marks})", part)
+
+def groups(con: sqlite3.Connection, match: str = "", min_size: int = 2) -> List[Dict]:
+    '''Near-duplicate groups, largest first; `match` keeps groups with a member whose
+    path (or file name) matches the glob.'''
+    rows = con.execute('''SELECT g.cluster, g.uuid, g.similarity, c.source, c.section, c.snippet
+                          FROM nd_group g JOIN nd_chunk c ON c.uuid = g.uuid
+                          ORDER BY g.cluster, g.similarity DESC''').fetchall()
+    by_cluster: Dict[str, List[Dict]] = {}
+    for cluster, uid, sim, source, section, snippet in rows:
+        by_cluster.setdefault(cluster, []).append(
+            {"uuid": uid, "similarity": sim, "source": source, "section": section, "snippet": snippet})
+    out = []
+    for cluster, members in by_cluster.items():
+        if len(members) < min_size:
+            continue
+        if match and not any(fnmatch.fnmatch(m["source"] or "", match) or
+                             fnmatch.fnmatch((m["source"] or "").rsplit("/", 1)[-1], match) for m in members):
+            continue
+        out.append({"cluster": cluster, "members": members})
+    return sorted(out, key=lambda g: -len(g["members"]))
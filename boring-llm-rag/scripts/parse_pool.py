@@ -0,0 +1,124 @@
+import time, multiprocessing as mp
+from collections import deque
+from multiprocessing.connection import wait
+from typing import Any, Callable, Iterable, Iterator, Optional, Tuple
+
+# (tag, chunks, error): chunks is None when the item was passed through or failed.
+Result = Tuple[Any, Optional[list], Optional[str]]
+
+def _serve(conn, fn):
+    while True:
+        arg = conn.recv()
+        if arg is None:
+            return
+        try:
+            conn.send((list(fn(arg)), None))
+        except Exception as e:
+            conn.send((None, f"{type(e).__name__}: {e}"))
+
+class _Job:
+    __slots__ = ("tag", "arg", "result", "error", "sent", "done")
+    def __init__(self, tag, arg):
+        self.tag, self.arg = tag, arg
+        self.result = self.error = None
+        self.sent = False
+        self.done = arg is None
+
+class _Worker:
+    def __init__(self, ctx, fn):
+        self.ctx, self.fn = ctx, fn
+        self.conn, child = ctx.Pipe()
+        self.proc = ctx.Process(target=_serve, args=(child, fn), daemon=True)
+        self.proc.start(); child.close()
+        self.job, self.deadline = None, None
+
+    def start(self, job: _Job, timeout: Optional[float]):
+        self.conn.send(job.arg)
+        job.sent = True
+        self.job, self.deadline = job, (time.monotonic() + timeout if timeout else None)
+
+    def finish(self, result, error) -> "_Worker":
+        self.job.result, self.job.error, self.job.done = result, error, True
+        self.job, self.deadline = None, None
+        return self
+
+    def kill(self, error: str) -> "_Worker":
+        '''Fail the current job and return a fresh worker to take this one's place.'''
+        self.proc.kill(); self.proc.join()
+        self.conn.close()
+        self.finish(None, error)
+        return _Worker(self.ctx, self.fn)
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.proc.join(1)
+        if self.proc.is_alive():
+            self.proc.kill(); self.proc.join()
+        self.conn.close()
+
+def parse_stream(items: Iterable[Tuple[Any, Any]], fn: Callable[[Any], Iterable],
+                 workers: int = 0, timeout: Optional[float] = None, window: int = 0) -> Iterator[Result]:
+    '''Apply `fn` to each (tag, arg) and yield (tag, list(fn(arg)), error) in input order.
+
+    Items with arg=None pass straight through. workers=0 runs in-process (no timeout);
+    otherwise `workers` spawned processes parse ahead of the consumer, with at most
+    `window` items (default 4*workers) buffered, and a worker that exceeds `timeout`
+    seconds on one item is killed and replaced.'''
+    if workers <= 0:
+        for tag, arg in items:
+            if arg is None:
+                yield tag, None, None
+                continue
+            try:
+                yield tag, list(fn(arg)), None
+            except Exception as e:
+                yield tag, None, f"{type(e).__name__}: {e}"
+        return
+
+    ctx = mp.get_context("spawn")  # forking a process that holds a gRPC channel is unsafe
+    pool = [_Worker(ctx, fn) for _ in range(workers)]
+    window = window or 4 * workers
+    queue, it, exhausted = deque(), iter(items), False
+    try:
+        while True:
+            while not exhausted and len(queue) < window:
+                try:
+                    queue.append(_Job(*next(it)))
+                except StopIteration:
+                    exhausted = True
+            todo = (j for j in queue if not j.done and not j.sent)
+            for w in pool:
+                if w.job is None:
+                    job = next(todo, None)
+                    if job is None:
+                        break
+                    w.start(job, timeout)
+            while queue and queue[0].done:
+                j = queue.popleft()
+                yield j.tag, j.result, j.error
+            if not queue:
+                if exhausted:
+                    return
+                continue
+
+            busy = [w for w in pool if w.job is not None]
+            deadlines = [w.deadline for w in busy if w.deadline is not None]
+            wait_for = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+            ready = wait([w.conn for w in busy], timeout=wait_for)
+            for i, w in enumerate(pool):
+                if w.job is None:
+                    continue
+                if w.conn in ready:
+                    try:
+                        w.finish(*w.conn.recv())
+                    except (EOFError, OSError):
+                        w.proc.join(1)
+                        pool[i] = w.kill(f"parser process died (exit code {w.proc.exitcode})")
+                elif w.deadline is not None and time.monotonic() >= w.deadline:
+                    pool[i] = w.kill(f"timed out after {timeout:g}s")
+    finally:
+        for w in pool:
+            w.stop()
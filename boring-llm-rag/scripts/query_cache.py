@@ -0,0 +1,83 @@
+import array, hashlib, json, os, sqlite3, time
+from collections import OrderedDict
+from typing import Any, Callable, List, Sequence
+
+def _open(path: str) -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    con = sqlite3.connect(path, timeout=30)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.executescript('''
+        CREATE TABLE IF NOT EXISTS meta (k TEXT PRIMARY KEY, v INTEGER);
+        CREATE TABLE IF NOT EXISTS qvec (model TEXT, sha256 TEXT, v BLOB, PRIMARY KEY (model, sha256)) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS hits (key TEXT PRIMARY KEY, generation INTEGER, created REAL, payload TEXT);
+    ''')
+    return con
+
+def bump_generation(path: str) -> int:
+    '''Called by ingest after it changed the collection: every cached hit list goes stale.'''
+    con = _open(path)
+    try:
+        with con:
+            con.execute("INSERT INTO meta VALUES ('generation', 1) ON CONFLICT(k) DO UPDATE SET v = v + 1")
+            con.execute("DELETE FROM hits")
+        return con.execute("SELECT v FROM meta WHERE k='generation'").fetchone()[0]
+    finally:
+        con.close()
+
+class QueryCache:
+    '''Query embeddings (in-process LRU over SQLite) and top-k hit lists with a TTL.
+
+    Hit lists are tagged with the ingest generation and ignored once it moves on.
+    Embeddings are keyed by (model, sha256(query)), so a re-ingest with the same model
+    keeps them and a model switch misses naturally.'''
+
+    def __init__(self, path: str, model: str, embed_fn: Callable[[str], Sequence[float]],
+                 lru: int = 256, ttl: float = 600.0):
+        self.con = _open(path)
+        self.model, self.embed_fn, self.lru, self.ttl = model, embed_fn, lru, ttl
+        self.vecs: "OrderedDict[str, List[float]]" = OrderedDict()
+        self.stats = {"vec_hits": 0, "vec_misses": 0, "hit_hits": 0, "hit_misses": 0}
+
+    def generation(self) -> int:
+        row = self.con.execute("SELECT v FROM meta WHERE k='generation'").fetchone()
+        return row[0] if row else 0
+
+    def embed(self, text: str) -> List[float]:
+        k = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        v = self.vecs.get(k)
+        if v is None:
+            row = self.con.execute("SELECT v FROM qvec WHERE model=? AND sha256=?", (self.model, k)).fetchone()
+            if row:
+                v = array.array("f", row[0]).tolist()
+        if v is None:
+            self.stats["vec_misses"] += 1
+            v = list(self.embed_fn(text))
+            with self.con:
+                self.con.execute("INSERT OR REPLACE INTO qvec VALUES (?,?,?)",
+                                 (self.model, k, array.array("f", v).tobytes()))
+        else:
+            self.stats["vec_hits"] += 1
+        self.vecs[k] = v
+        self.vecs.move_to_end(k)
+        while len(self.vecs) > self.lru:
+            self.vecs.popitem(last=False)
+        return v
+
+    def hits(self, key: Sequence[Any], fetch: Callable[[], List[dict]]) -> List[dict]:
+        '''Return the cached result for `key` (collection, query, k, ...) or call fetch() and keep it.'''
+        k = hashlib.sha256(json.dumps(list(key), default=str).encode("utf-8")).hexdigest()
+        gen, now = self.generation(), time.time()
+        row = self.con.execute("SELECT generation, created, payload FROM hits WHERE key=?", (k,)).fetchone()
+        if row and row[0] == gen and now - row[1] < self.ttl:
+            self.stats["hit_hits"] += 1
+            return json.loads(row[2])
+        self.stats["hit_misses"] += 1
+        result = fetch()
+        with self.con:
+            self.con.execute("INSERT OR REPLACE INTO hits VALUES (?,?,?,?)",
+                             (k, gen, now, json.dumps(result, default=str)))
+            self.con.execute("DELETE FROM hits WHERE created < ? OR generation != ?", (now - self.ttl, gen))
+        return result
+
+    def close(self):
+        self.con.close()
@@ -1,35 +1,165 @@
-import os, sys, textwrap, weaviate, ollama
+import os, sys, time, textwrap, sqlite3, argparse, urllib.error
+from datetime import datetime
+import vector_store
+from query_cache import QueryCache
+import retrieval
+from retrieval import FETCH_K, HYBRID_ALPHA
+from context_pack import pack, context_budget, token_counter
+from answer_server import stream_remote
 
 WEAVIATE_HOST = os.environ.get("WEAVIATE_HOST","http://localhost:8080")
 COLLECTION = os.environ.get("WEAVIATE_COLLECTION","Docs")
 GEN_MODEL = os.environ.get("GEN_MODEL","qwen3:14b")
 TOPK = int(os.environ.get("TOPK","8"))
+MANIFEST_DB = os.environ.get("INGEST_MANIFEST",
+                             os.path.expanduser(f"~/.cache/local-llm-rag/{COLLECTION}.manifest.db"))
+OLLAMA_ENDPOINT = os.environ.get("OLLAMA_ENDPOINT", "http://localhost:11434")
+EMBED_MODEL = os.environ.get("EMBED_MODEL", "bge-m3")
+QUERY_CACHE = os.environ.get("QUERY_CACHE",
+                             os.path.expanduser(f"~/.cache/local-llm-rag/{COLLECTION}.query.db"))
+QUERY_CACHE_TTL = float(os.environ.get("QUERY_CACHE_TTL", "600"))  # 0 disables the hit-list cache
+NUM_CTX = int(os.environ.get("NUM_CTX", "8192"))
+ANSWER_TOKENS = int(os.environ.get("ANSWER_TOKENS", "1024"))  # reserved out of NUM_CTX for the reply
+CONTEXT_TOKENIZER = os.environ.get("CONTEXT_TOKENIZER", "")  # HF tokenizer id; empty = fast estimate
+KEEP_ALIVE = os.environ.get("OLLAMA_KEEP_ALIVE", "30m")
+RAG_SERVER = os.environ.get("RAG_SERVER", "http://127.0.0.1:8765")  # `scripts/serve.py`; empty = always local
 
-def main():
-    q = sys.argv[1] if len(sys.argv)>1 else "Summarize this corpus and propose a clean folder/tags organization."
-
-    client = weaviate.connect_to_local(grpc_port=50051, http_host="localhost", http_port=8080)
-    try:
-        docs = client.collections.get(COLLECTION)
-        hits = docs.query.near_text(query=q, limit=TOPK).objects
-        context = "\n\n---\n\n".join([h.properties["text"] for h in hits])
-
-        prompt = f\"\"\"You are an assistant helping to organize a local drive.
+PROMPT = """You are an assistant helping to organize a local drive.
 Use the context to answer the user query. If asked, propose a folder tree, dedup/merge plan,
 and tagging scheme. If asked to dedup, list exact dup groups and near-dup candidates.
 
 # Query
 {q}
 
-# Context (top-{TOPK} chunks)
+# Context ({what})
 {context}
-\"\"\"
+"""
 
-        resp = ollama.chat(model=GEN_MODEL, messages=[{"role":"user","content":prompt}], options={"temperature":0.2})
-        print(textwrap.fill(resp["message"]["content"], width=100))
+def near_dup_context(match: str, limit: int = 20) -> str:
+    from neardup import groups
+    try:
+        con = sqlite3.connect(f"file:{MANIFEST_DB}?mode=ro", uri=True)
+        try:
+            found = groups(con, match)[:limit]
+        finally:
+            con.close()
+    except sqlite3.OperationalError as e:  # no manifest yet, or one from before the near-dup index
+        raise SystemExit(f"No near-duplicate index in {MANIFEST_DB} ({e}); run ingest first (make ingest).")
+    blocks = []
+    for g in found:
+        lines = [f"## cluster {g['cluster'][:8]} ({len(g['members'])} chunks)"]
+        for m in g["members"]:
+            snippet = " ".join((m["snippet"] or "").split())[:160]
+            lines.append(f"- {m['source']} [{m['section']}] similarity={m['similarity']:.2f}: {snippet}")
+        blocks.append("\n".join(lines))
+    return "\n\n".join(blocks)
+
+def open_cache(keep_alive=None) -> QueryCache:
+    import ollama
+    ol = ollama.Client(host=OLLAMA_ENDPOINT)
+    embed = lambda t: ol.embed(model=EMBED_MODEL, input=t, keep_alive=keep_alive)["embeddings"][0]
+    return QueryCache(QUERY_CACHE, EMBED_MODEL, embed, ttl=QUERY_CACHE_TTL)
 
+def retrieve(q: str, k: int = TOPK, fetch_k: int = FETCH_K, alpha: float = HYBRID_ALPHA,
+             use_rerank: bool = True, cache: QueryCache = None, where=None):
+    '''Top-k chunk properties for q plus per-stage stats. The query is embedded here with
+    EMBED_MODEL (the collection's vectorizer model) so the vector and the hits can be cached.
+    `where` is a vector_store.scope(); None means the default one, which skips stub objects.'''
+    where = vector_store.scope() if where is None else where
+    own = cache is None
+    cache = cache or open_cache()
+    stats = {"cached": True}
+    def fetch():
+        store = lambda: vector_store.open_store(COLLECTION, host=WEAVIATE_HOST)
+        hits, st = retrieval.retrieve(q, cache.embed, store, k, fetch_k, alpha, use_rerank, where)
+        stats.update(st, cached=False)
+        return hits
+    try:
+        rr = retrieval.RERANK_MODEL if use_rerank and retrieval._HAS_CE else None
+        key = (COLLECTION, vector_store.VECTOR_BACKEND, "hybrid", q, k, fetch_k, alpha, rr, where)
+        return cache.hits(key, fetch), stats
     finally:
-        client.close()
+        if own:
+            cache.close()
+
+def build_prompt(q: str, hits, stats) -> str:
+    # fill a fixed share of num_ctx instead of letting Ollama cut the prompt silently
+    count = token_counter(CONTEXT_TOKENIZER)
+    what = f"top-{len(hits)} chunks"
+    budget = context_budget(NUM_CTX, PROMPT.format(q=q, what=what, context=""), ANSWER_TOKENS, count)
+    context, packed = pack(hits, budget, count)
+    stats.update(context_tokens=packed["tokens"], budget=budget, kept=packed["kept"],
+                 dropped_dup=packed["dropped_dup"], merged=packed["merged"])
+    return PROMPT.format(q=q, what=what, context=context)
+
+def ask_server(payload) -> bool:
+    '''Stream the answer from a running serve.py; False if none is listening.'''
+    stats, out = {}, sys.stdout
+    try:
+        for event, data in stream_remote(RAG_SERVER, payload):
+            if event == "message":
+                out.write(data["t"]); out.flush()
+            elif event == "error":
+                raise RuntimeError(f"{RAG_SERVER}: {data['error']}")
+            else:
+                stats.update(data)
+    except (urllib.error.URLError, ConnectionError):
+        if stats:  # died mid-answer: don't silently start over
+            raise
+        return False
+    out.write("\n")
+    retrieval.report(stats)
+    return True
+
+def main():
+    ap = argparse.ArgumentParser(description=f"Ask a question against {COLLECTION}.")
+    ap.add_argument("query", nargs="?", default="Summarize this corpus and propose a clean folder/tags organization.")
+    ap.add_argument("--near-dups", nargs="?", const="*", metavar="GLOB",
+                    help="answer from the precomputed near-duplicate index instead of vector search; "
+                         "GLOB filters groups by member path or file name, e.g. 'README*'")
+    ap.add_argument("--list", action="store_true", help="with --near-dups: print the groups, skip the LLM")
+    ap.add_argument("--fetch-k", type=int, default=FETCH_K,
+                    help="hybrid candidates fetched for the reranker; TOPK of them reach the prompt (env FETCH_K)")
+    ap.add_argument("--alpha", type=float, default=HYBRID_ALPHA,
+                    help="hybrid weight: 0 = BM25 only, 1 = vector only (env HYBRID_ALPHA)")
+    ap.add_argument("--no-rerank", action="store_true", help="keep the search backend's fused order")
+    ap.add_argument("--under", metavar="PATH", help="only search files in this folder (or this file)")
+    ap.add_argument("--ext", action="append", default=[], help="only search these file types, e.g. --ext py --ext md")
+    ap.add_argument("--section", action="append", default=[],
+                    help="only search these sections, e.g. notebook, summary, NarrativeText")
+    ap.add_argument("--since", metavar="DATE", help="only search files modified on or after DATE (YYYY-MM-DD)")
+    ap.add_argument("--with-stubs", action="store_true",
+                    help="also search binary-file and duplicate stubs (env SEARCH_SKIP_SECTIONS)")
+    ap.add_argument("--local", action="store_true",
+                    help="answer in this process even if a query server is running (env RAG_SERVER)")
+    args = ap.parse_args()
+    q = args.query
+
+    if args.near_dups is not None:
+        context = near_dup_context(args.near_dups)
+        if args.list or not context:
+            print(context or f"No near-duplicate groups matching {args.near_dups!r}.")
+            return
+        prompt = PROMPT.format(q=q, what="near-duplicate groups from the ingest index", context=context)
+    else:
+        where = vector_store.scope(args.under and os.path.abspath(args.under), args.ext, args.section,
+                                   () if args.with_stubs else vector_store.SKIP_SECTIONS,
+                                   args.since and datetime.fromisoformat(args.since).timestamp())
+        payload = {"query": q, "top_k": TOPK, "fetch_k": args.fetch_k, "alpha": args.alpha,
+                   "rerank": not args.no_rerank, "where": where}
+        if RAG_SERVER and not args.local and ask_server(payload):
+            return
+        hits, stats = retrieve(q, TOPK, args.fetch_k, args.alpha, not args.no_rerank, where=where)
+        prompt = build_prompt(q, hits, stats)
+
+    import ollama  # not needed when a query server answered
+    t = time.perf_counter()
+    resp = ollama.chat(model=GEN_MODEL, messages=[{"role":"user","content":prompt}],
+                       options={"temperature":0.2, "num_ctx": NUM_CTX})
+    print(textwrap.fill(resp["message"]["content"], width=100))
+    if args.near_dups is None:
+        stats["generate_ms"] = (time.perf_counter() - t) * 1000
+        retrieval.report(stats)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,57 @@
+import os, sys, time
+from importlib.util import find_spec
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# sentence-transformers pulls in torch (seconds); check for it here, import it on first rerank
+_HAS_CE = find_spec("sentence_transformers") is not None
+
+RERANK_MODEL = os.environ.get("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+HYBRID_ALPHA = float(os.environ.get("HYBRID_ALPHA", "0.5"))  # 0 = BM25 only, 1 = vector only
+FETCH_K = int(os.environ.get("FETCH_K", "40"))  # candidates over-fetched for the reranker
+
+_ce = None
+
+def _cross_encoder():
+    global _ce
+    if _ce is None:
+        from sentence_transformers import CrossEncoder
+        _ce = CrossEncoder(RERANK_MODEL, device="cpu")
+    return _ce
+
+def rerank(query: str, hits: List[dict], top_n: int) -> List[dict]:
+    '''Order hits by cross-encoder relevance (on CPU); without sentence-transformers keep fused order.'''
+    if not _HAS_CE or len(hits) <= 1:
+        return hits[:top_n]
+    scores = _cross_encoder().predict([(query, h.get("text") or "") for h in hits], batch_size=32)
+    for h, s in zip(hits, scores):
+        h["_rerank"] = float(s)
+    return sorted(hits, key=lambda h: -h["_rerank"])[:top_n]
+
+def retrieve(query: str, embed: Callable[[str], Sequence[float]], store: Callable[[], object], top_n: int,
+             fetch_k: int = FETCH_K, alpha: float = HYBRID_ALPHA, use_rerank: bool = True,
+             where: Optional[Dict] = None) -> Tuple[List[dict], Dict]:
+    '''Over-fetch fetch_k hybrid candidates from store() (a vector_store backend), rerank,
+    keep top_n; `where` (vector_store.scope()) narrows the search first. Returns (hits, stats)
+    where stats has per-stage milliseconds and `promoted`: how many kept hits ranked below
+    top_n in the fused list, i.e. what the plain top-n would have missed.'''
+    stats: Dict = {"candidates": 0, "promoted": 0}
+    t = time.perf_counter()
+    vec = embed(query)
+    stats["embed_ms"] = (time.perf_counter() - t) * 1000
+    t = time.perf_counter()
+    hits = store().hybrid(query, vec, max(fetch_k, top_n), alpha, where)
+    stats["search_ms"] = (time.perf_counter() - t) * 1000
+    stats["candidates"] = len(hits)
+    if use_rerank:
+        t = time.perf_counter()
+        hits = rerank(query, hits, top_n)
+        stats["rerank_ms"] = (time.perf_counter() - t) * 1000
+    else:
+        hits = hits[:top_n]
+    stats["promoted"] = sum(h["_rank"] >= top_n for h in hits)
+    return hits, stats
+
+def report(stats: Dict, file=sys.stderr):
+    parts = [f"{k[:-3]}={v:.0f}ms" for k, v in stats.items() if k.endswith("_ms")]
+    parts += [f"{k}={v}" for k, v in stats.items() if not k.endswith("_ms")]
+    print("retrieval: " + " ".join(parts), file=file)
@@ -0,0 +1,44 @@
+import os, argparse, threading
+from urllib.parse import urlparse
+import ollama
+import rag_query as rq
+import retrieval, vector_store
+from answer_server import AnswerServer
+
+_url = urlparse(rq.RAG_SERVER or "http://127.0.0.1:8765")
+SERVE_HOST = os.environ.get("SERVE_HOST", _url.hostname or "127.0.0.1")
+SERVE_PORT = int(os.environ.get("SERVE_PORT", str(_url.port or 8765)))
+SERVE_WORKERS = int(os.environ.get("SERVE_WORKERS", "4"))  # concurrent retrievals
+SERVE_PARALLEL = int(os.environ.get("SERVE_PARALLEL", os.environ.get("OLLAMA_NUM_PARALLEL", "1")))
+
+_local = threading.local()
+
+def _cache():
+    # SQLite handles are per thread; each retrieval worker keeps its own warm LRU
+    if getattr(_local, "cache", None) is None:
+        _local.cache = rq.open_cache(rq.KEEP_ALIVE)
+    return _local.cache
+
+def prepare(payload):
+    q = payload["query"]
+    hits, stats = rq.retrieve(q, int(payload.get("top_k") or rq.TOPK), int(payload.get("fetch_k") or rq.FETCH_K),
+                              float(payload.get("alpha", rq.HYBRID_ALPHA)), bool(payload.get("rerank", True)),
+                              cache=_cache(), where=payload.get("where"))
+    return [{"role": "user", "content": rq.build_prompt(q, hits, stats)}], stats
+
+def _warm_embed():
+    ollama.Client(host=rq.OLLAMA_ENDPOINT).embed(model=rq.EMBED_MODEL, input="", keep_alive=rq.KEEP_ALIVE)
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=f"Answer questions about {rq.COLLECTION} over HTTP (SSE).")
+    ap.add_argument("--host", default=SERVE_HOST)
+    ap.add_argument("--port", type=int, default=SERVE_PORT)
+    ap.add_argument("--workers", type=int, default=SERVE_WORKERS, help="retrievals run concurrently")
+    ap.add_argument("--parallel", type=int, default=SERVE_PARALLEL,
+                    help="answers generated concurrently; match OLLAMA_NUM_PARALLEL")
+    args = ap.parse_args()
+    warm = [_warm_embed, lambda: vector_store.open_store(rq.COLLECTION, host=rq.WEAVIATE_HOST)]
+    if retrieval._HAS_CE:
+        warm.append(retrieval._cross_encoder)
+    AnswerServer(prepare, rq.GEN_MODEL, rq.OLLAMA_ENDPOINT, {"temperature": 0.2, "num_ctx": rq.NUM_CTX},
+                 rq.KEEP_ALIVE, args.workers, args.parallel, warm).run(args.host, args.port)
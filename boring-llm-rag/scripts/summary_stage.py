@@ -0,0 +1,51 @@
+import queue, threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Iterator, Optional, Tuple
+
+class SummaryStage:
+    '''Runs summarize(text, fname) on a thread pool with at most `parallel` requests in flight,
+    so the ingest loop never waits on the LLM. Finished summaries are collected from
+    completed() by the caller's thread, which owns the writer.'''
+
+    def __init__(self, summarize: Callable[[str, str], str], parallel: int = 1):
+        self.summarize = summarize
+        self.pool = ThreadPoolExecutor(max_workers=parallel, thread_name_prefix="summary")
+        self.slots = threading.BoundedSemaphore(parallel)
+        self.done: "queue.Queue[Tuple[Any, Optional[str], Optional[str]]]" = queue.Queue()
+        self.inflight = set()
+        self.futures = set()
+
+    def submit(self, key: Any, text: str, fname: str, block: bool = True) -> bool:
+        '''Queue a summary; with block=False return False instead of waiting for a free slot.'''
+        if not self.slots.acquire(blocking=block):
+            return False
+        self.inflight.add(key)
+        fut = self.pool.submit(self._run, key, text, fname)
+        self.futures.add(fut)
+        fut.add_done_callback(self.futures.discard)
+        return True
+
+    def _run(self, key, text, fname):
+        try:
+            self.done.put((key, self.summarize(text, fname), None))
+        except Exception as e:
+            self.done.put((key, None, f"{type(e).__name__}: {e}"))
+        finally:
+            self.slots.release()
+
+    def completed(self) -> Iterator[Tuple[Any, Optional[str], Optional[str]]]:
+        while True:
+            try:
+                item = self.done.get_nowait()
+            except queue.Empty:
+                return
+            self.inflight.discard(item[0])
+            yield item
+
+    def drain(self) -> Iterator[Tuple[Any, Optional[str], Optional[str]]]:
+        '''Wait for everything in flight, then yield what finished.'''
+        wait(list(self.futures))
+        yield from self.completed()
+
+    def close(self):
+        self.pool.shutdown(wait=True)
@@ -1,14 +1,218 @@
-import json, os, tempfile, subprocess, shutil, nbformat
+import json, os, re, tempfile, subprocess, shutil
+from typing import Dict, Iterator, List, Optional
+
+BLOCK = 1 << 16  # characters read at a time
+_WS = re.compile(r"\s*")
+_SIG = re.compile(r'["\[\]{}]')
+_SCALAR = re.compile(r"[^\s,\]}]*")
+
+class _Scanner:
+    '''Just enough JSON to walk a notebook: the caller asks for the value at the cursor,
+    and it is either decoded or skipped. Skipping only looks for quotes and brackets, so a
+    multi-MB base64 output costs a str.find per block and never more than a block of memory.'''
+    def __init__(self, f):
+        self.f, self.buf, self.pos = f, "", 0
+
+    def _more(self) -> bool:
+        data = self.f.read(BLOCK)
+        self.buf, self.pos = self.buf[self.pos:] + data, 0
+        return bool(data)
+
+    def peek(self) -> str:
+        while True:
+            self.pos = _WS.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._more():
+                raise ValueError("notebook JSON ends early")
+
+    def expect(self, ch: str):
+        if self.peek() != ch:
+            raise ValueError(f"notebook JSON: expected {ch!r}, got {self.buf[self.pos]!r}")
+        self.pos += 1
+
+    def _close_quote(self, i: int) -> int:
+        # str.find is memchr-fast on base64; a quote after an odd run of backslashes is escaped
+        buf = self.buf
+        j = buf.find('"', i)
+        while j >= 0:
+            k = j
+            while k > 0 and buf[k - 1] == "\\":
+                k -= 1
+            if (j - k) % 2 == 0:
+                return j
+            j = buf.find('"', j + 1)
+        return -1
+
+    def value(self, keep: bool = False):
+        '''Decode the value at the cursor, or with keep=False step over it without building it.'''
+        c = self.peek()
+        parts: List[str] = []
+        scalar, in_str, depth, i = c not in '{["', c == '"', 0, self.pos + (c == '"')
+        while True:
+            buf = self.buf
+            if in_str:
+                j = self._close_quote(i)
+                if j >= 0:
+                    i, in_str = j + 1, False
+                    if depth == 0:
+                        break
+                    continue
+                i = max(len(buf.rstrip("\\")), self.pos)  # never split a run of backslashes
+            elif scalar:
+                i = _SCALAR.match(buf, i).end()
+                if i < len(buf):
+                    break
+            else:
+                m = _SIG.search(buf, i)
+                if m:
+                    i = m.end()
+                    if m.group() == '"':
+                        in_str = True
+                    elif m.group() in "[{":
+                        depth += 1
+                    else:
+                        depth -= 1
+                        if depth == 0:
+                            break
+                    continue
+                i = len(buf)
+            if keep:  # out of buffer: keep what was read, drop it from the buffer, read on
+                parts.append(buf[self.pos:i])
+            self.pos = i
+            if not self._more():
+                if scalar:
+                    break
+                raise ValueError("notebook JSON ends early")
+            i = self.pos
+        if keep:
+            parts.append(self.buf[self.pos:i])
+        self.pos = i
+        return json.loads("".join(parts)) if keep else None
+
+    def members(self) -> Iterator[str]:
+        '''Keys of the object at the cursor; the caller reads or skips each value before the next.'''
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            if self.peek() != '"':
+                raise ValueError("notebook JSON: expected a key")
+            key = self.value(True)
+            self.expect(":")
+            yield key
+            c = self.peek()
+            self.pos += 1
+            if c == "}":
+                return
+            if c != ",":
+                raise ValueError(f"notebook JSON: expected ',' or '}}', got {c!r}")
+
+    def items(self) -> Iterator[int]:
+        '''Indices of the array at the cursor; the caller reads or skips each element.'''
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        n = 0
+        while True:
+            yield n
+            n += 1
+            c = self.peek()
+            self.pos += 1
+            if c == "]":
+                return
+            if c != ",":
+                raise ValueError(f"notebook JSON: expected ',' or ']', got {c!r}")
+
+def _cell(s: _Scanner, index: int) -> Dict:
+    cell, level = {"index": index, "cell_type": None, "source": ""}, 0
+    for key in s.members():
+        if key == "cell_type":
+            cell["cell_type"] = s.value(True)
+        elif key in ("source", "input"):  # "input": code cells before nbformat 4
+            src = s.value(True)
+            cell["source"] = src if isinstance(src, str) else "".join(src)
+        elif key == "level":
+            level = s.value(True)
+        else:  # outputs, attachments, metadata, ...
+            s.value()
+    if cell["cell_type"] == "heading":  # nbformat 3
+        cell["cell_type"], cell["source"] = "markdown", "#" * (level or 1) + " " + cell["source"]
+    return cell
+
+def iter_cells(path: str) -> Iterator[Dict]:
+    '''{"index", "cell_type", "source"} per cell, streamed from the file without nbformat or
+    validation. Outputs and attachments are skipped undecoded, so memory stays at one read
+    block plus the current cell however large the notebook is. Raises ValueError on bad JSON.'''
+    with open(path, encoding="utf-8") as f:
+        s, n = _Scanner(f), 0
+        for key in s.members():
+            if key == "cells":
+                for _ in s.items():
+                    yield _cell(s, n)
+                    n += 1
+            elif key == "worksheets":  # nbformat 3
+                for _ in s.items():
+                    for k in s.members():
+                        if k != "cells":
+                            s.value()
+                            continue
+                        for _ in s.items():
+                            yield _cell(s, n)
+                            n += 1
+            else:
+                s.value()
+
+def cell_text(cell: Dict) -> Optional[str]:
+    '''Markdown as is, code fenced; None for raw and unknown cells.'''
+    if cell["cell_type"] == "markdown":
+        return cell["source"]
+    if cell["cell_type"] == "code":
+        return "```code\n" + cell["source"] + "\n```"
+    return None
 
 def extract_ipynb_text(path: str) -> str:
-    nb = nbformat.read(path, as_version=4)
-    out = []
-    for cell in nb.cells:
-        if cell.cell_type == "markdown":
-            out.append(cell.source or "")
-        elif cell.cell_type == "code":
-            out.append("```code\n" + (cell.source or "") + "\n```")
-    return "\n\n".join(out).strip()
+    return "\n\n".join(t for t in map(cell_text, iter_cells(path)) if t is not None).strip()
+
+def _windows(text: str, size: int, overlap: int) -> Iterator[str]:
+    # fixed windows, each cut back to a line break when one is in its second half
+    start = 0
+    while True:
+        end = min(start + size, len(text))
+        if end < len(text):
+            nl = text.rfind("\n", start + size // 2, end)
+            end = nl + 1 if nl >= 0 else end
+        yield text[start:end]
+        if end >= len(text):
+            return
+        start = max(end - overlap, start + 1)
+
+def notebook_chunks(path: str, max_chars: int = 1200, overlap: int = 150) -> Iterator[Dict]:
+    '''Chunks that follow cell boundaries: consecutive cells are packed up to max_chars and a
+    cell is only split when it is longer than that (code pieces are fenced again, with
+    `overlap` characters repeated). Each chunk is {"text", "cells": [first, last]}.'''
+    texts: List[str] = []
+    first = last = size = 0
+    for cell in iter_cells(path):
+        text = cell_text(cell)
+        if text is None or not cell["source"].strip():
+            continue
+        if texts and size + 2 + len(text) > max_chars:
+            yield {"text": "\n\n".join(texts), "cells": [first, last]}
+            texts = []
+        if len(text) > max_chars:
+            code = cell["cell_type"] == "code"
+            for piece in _windows(cell["source"], max_chars - 12 * code, overlap):
+                yield {"text": "```code\n" + piece + "\n```" if code else piece, "cells": [cell["index"]] * 2}
+            continue
+        if not texts:
+            first, size = cell["index"], -2
+        texts.append(text)
+        last, size = cell["index"], size + 2 + len(text)
+    if texts:
+        yield {"text": "\n\n".join(texts), "cells": [first, last]}
 
 def try_export_mathematica_nb_to_md(path: str) -> str | None:
     '''Uses wolframscript if available to export .nb to Markdown; returns md path or None.'''
@@ -0,0 +1,64 @@
+import atexit, os, threading, time
+from typing import TYPE_CHECKING, Dict, Optional
+from urllib.parse import urlparse
+
+if TYPE_CHECKING:
+    import weaviate
+
+WEAVIATE_HOST = os.environ.get("WEAVIATE_HOST", "http://localhost:8080")
+WEAVIATE_GRPC_PORT = int(os.environ.get("WEAVIATE_GRPC_PORT", "50051"))
+HEALTH_INTERVAL = float(os.environ.get("WEAVIATE_HEALTH_INTERVAL", "30"))  # seconds between readiness checks
+
+_lock = threading.Lock()
+_clients: Dict[str, "weaviate.WeaviateClient"] = {}
+_checked: Dict[str, float] = {}
+
+def _open(host: str) -> "weaviate.WeaviateClient":
+    import weaviate  # ~1s of imports; only once something actually talks to Weaviate
+    u = urlparse(host if "://" in host else f"http://{host}")
+    secure = u.scheme == "https"
+    return weaviate.connect_to_custom(
+        http_host=u.hostname or "localhost", http_port=u.port or (443 if secure else 80), http_secure=secure,
+        grpc_host=u.hostname or "localhost", grpc_port=WEAVIATE_GRPC_PORT, grpc_secure=secure)
+
+def _healthy(client) -> bool:
+    try:
+        return client.is_connected() and client.is_ready()
+    except Exception:
+        return False
+
+def get_client(host: Optional[str] = None) -> "weaviate.WeaviateClient":
+    '''The process-wide client for `host` (default WEAVIATE_HOST), connected on first use.
+
+    A cached client is re-checked at most every HEALTH_INTERVAL seconds and replaced if
+    Weaviate went away. Callers must not close it; close_all() runs at exit.'''
+    host = host or WEAVIATE_HOST
+    with _lock:
+        client, now = _clients.get(host), time.monotonic()
+        if client is not None and now - _checked.get(host, 0) >= HEALTH_INTERVAL:
+            if not _healthy(client):
+                try:
+                    client.close()
+                except Exception:
+                    pass
+                client = None
+            _checked[host] = now
+        if client is None:
+            client = _clients[host] = _open(host)
+            _checked[host] = now
+        return client
+
+def collection(name: str, host: Optional[str] = None):
+    return get_client(host).collections.get(name)
+
+def close_all():
+    with _lock:
+        for client in _clients.values():
+            try:
+                client.close()
+            except Exception:
+                pass
+        _clients.clear()
+        _checked.clear()
+
+atexit.register(close_all)
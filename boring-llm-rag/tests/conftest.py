@@ -0,0 +1,4 @@
+import os, sys
+
+# the scripts import each other flat (`import wv_client`), as when run as `uv run scripts/x.py`
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
@@ -0,0 +1,80 @@
+import io, json
+
+import pytest
+
+import utils_ipynb_nb
+from utils_ipynb_nb import _Scanner, iter_cells
+
+TRICKY = ['say "hi"\n', "C:\\temp\\", '\\"', "\\\\\\", "caf\u00e9 \u2014 \U0001f600", "{[not json]}", "", "\\u0041 \t"]
+
+def notebook():
+    cells = [{"cell_type": "markdown", "metadata": {}, "source": TRICKY}]
+    for i in range(4):
+        cells.append({
+            "cell_type": "code", "execution_count": i or None, "metadata": {"tags": ["a\\", "]"], "n": [[1, 2.5e-3], {}]},
+            "source": f"print({i!r}, '\\\\', \"\\\"\")\n" + TRICKY[i],
+            "outputs": [
+                {"output_type": "stream", "name": "stdout", "text": ["\\", '"]}', "\n"]},
+                {"output_type": "display_data", "metadata": {"image/png": {"width": 10}},
+                 "data": {"image/png": "iVBORw0KGgo" * 500 + "\\", "text/plain": ["<Figure \"x\">"],
+                          "application/json": {"deep": [[[{"k": [True, False, None, -1]}]]]}}},
+                {"output_type": "error", "ename": "E", "evalue": "}", "traceback": []},
+            ]})
+    cells.append({"cell_type": "raw", "metadata": {}, "source": ""})
+    cells.append({"cell_type": "markdown", "metadata": {}, "attachments": {"a.png": {"image/png": "AAAA"}},
+                  "source": ["\\"]})
+    return {"metadata": {"kernelspec": {"name": "python3"}, "empty": {}, "list": []},
+            "nbformat": 4, "nbformat_minor": 5, "cells": cells}
+
+def reference(path):
+    with open(path, encoding="utf-8") as f:
+        nb = json.load(f)
+    return [{"index": i, "cell_type": c["cell_type"],
+             "source": c["source"] if isinstance(c["source"], str) else "".join(c["source"])}
+            for i, c in enumerate(nb["cells"])]
+
+DUMPS = {
+    "compact": dict(separators=(",", ":")),
+    "indented": dict(indent=1, ensure_ascii=False),  # as Jupyter writes them
+    "spaced": dict(indent="\t\n"),
+}
+
+@pytest.mark.parametrize("block", [1, 2, 3, 7, 64, utils_ipynb_nb.BLOCK])
+@pytest.mark.parametrize("style", DUMPS)
+def test_iter_cells_matches_json_load(tmp_path, monkeypatch, block, style):
+    path = tmp_path / "nb.ipynb"
+    path.write_text(json.dumps(notebook(), **DUMPS[style]), encoding="utf-8")
+    monkeypatch.setattr(utils_ipynb_nb, "BLOCK", block)  # reads end inside strings, escapes and brackets
+    assert list(iter_cells(str(path))) == reference(path)
+
+@pytest.mark.parametrize("block", [1, 2, 5, 4096])
+def test_value_matches_json_loads(monkeypatch, block):
+    monkeypatch.setattr(utils_ipynb_nb, "BLOCK", block)
+    for v in [notebook(), TRICKY, "\\" * 9, {"": {"": []}}, [[], {}, [[]]], -1.5e10, True, None, 0]:
+        text = json.dumps(v)
+        s = _Scanner(io.StringIO(f" {text} "))
+        assert s.value(True) == v
+        s = _Scanner(io.StringIO(f"[{text}, {text}, 7]"))
+        got = []
+        for n in s.items():
+            if n == 1:
+                got.append(s.value(True))
+            else:
+                s.value()
+        assert got == [v]
+
+def test_nbformat3_worksheets(tmp_path):
+    path = tmp_path / "v3.ipynb"
+    path.write_text(json.dumps({"nbformat": 3, "worksheets": [{"metadata": {}, "cells": [
+        {"cell_type": "heading", "level": 2, "source": ["Title"]},
+        {"cell_type": "code", "input": ["x = 1\n", "x"], "outputs": [{"text": ["1"]}]}]}]}))
+    assert list(iter_cells(str(path))) == [{"index": 0, "cell_type": "markdown", "source": "## Title"},
+                                           {"index": 1, "cell_type": "code", "source": "x = 1\nx"}]
+
+@pytest.mark.parametrize("cut", [1, 40, 200, -3, -1])
+def test_truncated_notebook_raises(tmp_path, monkeypatch, cut):
+    monkeypatch.setattr(utils_ipynb_nb, "BLOCK", 16)
+    path = tmp_path / "cut.ipynb"
+    path.write_text(json.dumps(notebook())[:cut], encoding="utf-8")
+    with pytest.raises(ValueError):
+        list(iter_cells(str(path)))
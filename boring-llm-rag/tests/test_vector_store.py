@@ -0,0 +1,123 @@
+import numpy as np
+import pytest
+
+import vector_store
+from vector_store import LocalStore
+
+DIM = 16
+
+def vec(i: int):
+    return np.random.default_rng(i).standard_normal(DIM).tolist()
+
+def obj(i: int, source: str, **props):
+    return (f"u{i}", dict({"text": f"chunk {i} of {source}", "source": source, "chunk": i % 3,
+                           "section": "NarrativeText", "ext": ".py", "mtime": 1000 + i}, **props), vec(i))
+
+@pytest.fixture
+def store(tmp_path):
+    s = LocalStore(str(tmp_path / "idx"))
+    yield s
+    s.close()
+
+def sources(hits):
+    return sorted({h["source"] for h in hits})
+
+def test_upsert_replaces_by_uuid(store):
+    assert store.upsert([obj(i, "/a/x.py") for i in range(3)]) == {}
+    assert store.upsert([obj(1, "/a/x.py", text="rewritten")]) == {}
+    assert store.count() == 3
+    assert [o["text"] for o in store.fetch_source("/a/x.py", 3)] == ["chunk 0 of /a/x.py", "rewritten",
+                                                                      "chunk 2 of /a/x.py"]
+    hit = store.hybrid("rewritten", vec(1), 1)[0]
+    assert (hit["text"], hit["_rank"]) == ("rewritten", 0)
+
+def test_upsert_without_vector_is_an_error(store):
+    errors = store.upsert([("u0", {"text": "no vector", "source": "/a"}, None), obj(1, "/a/x.py")])
+    assert list(errors) == [0]
+    assert store.count() == 1
+
+def test_upsert_rejects_other_dims(store):
+    store.upsert([obj(0, "/a/x.py")])
+    with pytest.raises(ValueError):
+        store.upsert([("u1", {"text": "short", "source": "/a/y.py"}, [1.0, 0.0])])
+    assert store.count() == 1
+
+def test_delete_source_subtree(store):
+    files = ["/a", "/a/x.py", "/a/b/y.py", "/ab/z.py", "/a-b/w.py"]
+    store.upsert([obj(i, f) for i, f in enumerate(files)])
+    store.delete_source("/a/x.py")
+    assert sources(store.hybrid("chunk", None, 10, alpha=0)) == ["/a", "/a-b/w.py", "/a/b/y.py", "/ab/z.py"]
+    store.delete_source("/a", subtree=True)
+    # siblings that only share the prefix stay
+    assert sources(store.hybrid("chunk", None, 10, alpha=0)) == ["/a-b/w.py", "/ab/z.py"]
+    assert store.count() == 2
+
+def test_filtered_search(store):
+    store.upsert([obj(0, "/src/api/retry.py"), obj(1, "/src/api/README.md", ext=".md"),
+                  obj(2, "/src/web/retry.py"), obj(3, "/src/api/old.py", mtime=10),
+                  obj(4, "/src/api/blob.py", section="binary")])
+    where = vector_store.scope("/src/api", ext=["py"], since=500)
+    assert sources(store.hybrid("chunk", vec(2), 10, where=where)) == ["/src/api/retry.py"]
+    # stubs only come back when their section is asked for
+    assert sources(store.hybrid("chunk", vec(4), 10, where=vector_store.scope("/src/api"))) == [
+        "/src/api/README.md", "/src/api/old.py", "/src/api/retry.py"]
+    assert sources(store.hybrid("chunk", vec(4), 10, where=vector_store.scope(section=["binary"]))) == [
+        "/src/api/blob.py"]
+    assert store.hybrid("chunk", vec(0), 10, where=vector_store.scope("/nowhere")) == []
+
+def test_filtered_search_sees_new_writes(store):
+    where = vector_store.scope("/a")
+    store.upsert([obj(0, "/a/x.py")])
+    assert sources(store.hybrid("chunk", vec(0), 10, where=where)) == ["/a/x.py"]
+    store.upsert([obj(1, "/a/y.py")])
+    assert sources(store.hybrid("chunk", vec(1), 10, where=where)) == ["/a/x.py", "/a/y.py"]
+
+def test_compaction_during_hybrid_search(store, tmp_path, monkeypatch):
+    store.upsert([obj(i, f"/f{i}.py") for i in range(10)])
+    store.upsert([obj(i, f"/f{i}.py", text=f"again {i}") for i in range(5)])  # slots 0-4 are now dead
+    expected = store.hybrid("", vec(7), 3, alpha=1)
+    assert expected[0]["source"] == "/f7.py"
+
+    # another writer (as if another process) compacts between the vector scan and the
+    # property lookup of the first attempt, moving /f7.py from slot 7 to slot 2
+    other = LocalStore(str(tmp_path / "idx"))
+    vector_hits = store._vector_hits
+    calls = []
+    def racing_vector_hits(*a, **kw):
+        hits = vector_hits(*a, **kw)
+        if not calls:
+            other.compact()
+        calls.append(hits)
+        return hits
+    monkeypatch.setattr(store, "_vector_hits", racing_vector_hits)
+    try:
+        hits = store.hybrid("", vec(7), 3, alpha=1)
+    finally:
+        other.close()
+    assert len(calls) == 2
+    assert calls[0][0][0] == 7 and calls[1][0][0] == 2
+    assert [h["source"] for h in hits] == [h["source"] for h in expected]
+    assert store._meta("rows") == "10"
+
+def test_hybrid_gives_up_when_always_compacted(store, monkeypatch):
+    store.upsert([obj(i, f"/f{i}.py") for i in range(3)])
+    hybrid = store._hybrid
+    def compacting_hybrid(*a, **kw):
+        hits = hybrid(*a, **kw)
+        store.compact()
+        return hits
+    monkeypatch.setattr(store, "_hybrid", compacting_hybrid)
+    with pytest.raises(RuntimeError):
+        store.hybrid("chunk", vec(0), 3)
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_ivf_search_matches_brute_force(tmp_path, monkeypatch, dtype):
+    s = LocalStore(str(tmp_path / dtype), dtype)
+    try:
+        s.upsert([obj(i, f"/f{i}.py") for i in range(400)])
+        brute = s.hybrid("", vec(123), 1, alpha=1)
+        monkeypatch.setattr(vector_store, "IVF_PROBE", 1000)  # every list: same rows as brute force
+        s.train()
+        assert s.hybrid("", vec(123), 1, alpha=1)[0]["source"] == brute[0]["source"] == "/f123.py"
+    finally:
+        s.close()
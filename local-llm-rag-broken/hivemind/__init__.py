@@ -1 +1,8 @@
-from .session import HiveMind
+# HiveMind is loaded on first access so the tools importing hivemind.resources skip ollama/IPython.
+def __getattr__(name):
+    if name == "HiveMind":
+        from .session import HiveMind
+        return HiveMind
+    raise AttributeError(f"module 'hivemind' has no attribute {name!r}")
+
+__all__ = ["HiveMind"]
@@ -0,0 +1,114 @@
+import hashlib, os, sys
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+HISTORY_HIGH = float(os.environ.get("HISTORY_HIGH", "0.75"))  # share of the budget that starts a fold
+HISTORY_LOW = float(os.environ.get("HISTORY_LOW", "0.4"))  # share left verbatim after it
+HISTORY_KEEP = int(os.environ.get("HISTORY_KEEP", "4"))  # newest messages that are never folded
+SUMMARY_TOKENS = int(os.environ.get("HISTORY_SUMMARY_TOKENS", "512"))
+
+SUMMARY_PROMPT = ("Update the running summary of this conversation with the new messages. Keep facts, "
+                  "decisions, names, numbers, code identifiers and open questions; drop pleasantries. "
+                  "Write at most {words} words of plain notes.\n\nSUMMARY SO FAR:\n{summary}\n\nNEW MESSAGES:\n{text}")
+
+class ChatWindow:
+    '''Fits a growing message list into a fixed token budget.
+
+    Messages are counted once (cached by content). window(items, budget) returns the
+    rolling summary plus the messages still sent verbatim: items[:folded] are covered by
+    the summary, the rest follow it unchanged. Past HISTORY_HIGH of the budget the oldest
+    verbatim messages (never the newest `keep`) are summarized on a background thread
+    down to HISTORY_LOW, and swapped in on a later call. Folding in big steps keeps the
+    prompt prefix identical between folds, so Ollama reuses its KV cache; callers only
+    block when the budget is actually exceeded before the summary is ready.
+
+    summarize(prompt) -> str does the LLM call; text(item) renders an item for counting
+    and summarizing; turn(item) marks where a turn starts, the only place a fold may end.'''
+
+    def __init__(self, summarize: Callable[[str], str], count: Callable[[str], int],
+                 text: Callable[[Dict], str] = lambda m: f"{m['role']}: {m['content']}",
+                 turn: Callable[[Dict], bool] = lambda m: m.get("role") == "user",
+                 keep: int = HISTORY_KEEP, high: float = HISTORY_HIGH, low: float = HISTORY_LOW):
+        self.summarize, self.count, self.text, self.turn = summarize, count, text, turn
+        self.keep, self.high, self.low = keep, high, low
+        self.summary, self.folded = "", 0
+        self.stats: Dict = {}
+        self._tokens: Dict[str, int] = {}
+        self._summaries: Dict[str, str] = {}  # fold key -> summary, so replays and reloads don't re-ask
+        self._job: Optional[Tuple[int, Future]] = None
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history")
+
+    def count_text(self, text: str) -> int:
+        n = self._tokens.get(text)
+        if n is None:
+            n = self._tokens[text] = self.count(text)
+        return n
+
+    def tokens(self, item: Dict) -> int:
+        return self.count_text(self.text(item))
+
+    def _key(self, items: Sequence[Dict], upto: int) -> str:
+        h = hashlib.sha1(self.summary.encode())
+        for m in items[self.folded:upto]:
+            h.update(b"\0" + self.text(m).encode())
+        return h.hexdigest()
+
+    def _fold(self, items: Sequence[Dict], upto: int, key: str) -> str:
+        text = "\n\n".join(self.text(m) for m in items[self.folded:upto])
+        prompt = SUMMARY_PROMPT.format(words=SUMMARY_TOKENS * 3 // 4, summary=self.summary or "(none)", text=text)
+        self._summaries[key] = self.summarize(prompt).strip()
+        return self._summaries[key]
+
+    def _collect(self, wait: bool):
+        upto, fut = self._job
+        if not (wait or fut.done()):
+            return
+        self._job = None
+        try:
+            self.summary, self.folded = fut.result(), upto
+        except Exception as e:
+            print(f"history: summary failed, sending full history ({type(e).__name__}: {e})", file=sys.stderr)
+
+    def window(self, items: Sequence[Dict], budget: int) -> Tuple[str, List[Dict]]:
+        '''(summary, verbatim items) for the next request; budget excludes the system prompt and reply.'''
+        if self.folded > len(items):  # history was replaced (load, undo): start over
+            self.reset()
+        if self._job:
+            self._collect(wait=False)
+        live = list(items[self.folded:])
+        sizes = [self.tokens(m) for m in live]
+        total = self.count_text(self.summary) + sum(sizes)
+        if total > self.high * budget and self._job is None:
+            # fold the oldest messages until what stays verbatim fits under the low-water mark
+            n, kept = 0, sum(sizes)
+            while n < len(live) - self.keep and kept > self.low * budget - SUMMARY_TOKENS:
+                kept -= sizes[n]
+                n += 1
+            while 0 < n < len(live) and not self.turn(live[n]):  # never leave a reply without its question
+                n -= 1
+            if n:
+                upto, key = self.folded + n, self._key(items, self.folded + n)
+                if key in self._summaries:
+                    fut = Future()
+                    fut.set_result(self._summaries[key])
+                else:
+                    fut = self._pool.submit(self._fold, list(items), upto, key)
+                self._job = (upto, fut)
+                self._collect(wait=total > budget)
+        elif total > budget and self._job:
+            self._collect(wait=True)
+        live = list(items[self.folded:])
+        self.stats = {"tokens": self.count_text(self.summary) + sum(self.tokens(m) for m in live),
+                      "budget": budget, "folded": self.folded, "verbatim": len(live),
+                      "pending": self._job is not None}
+        return self.summary, live
+
+    def reset(self):
+        self.summary, self.folded, self._job = "", 0, None
+
+    def state(self) -> Dict:
+        return {"summary": self.summary, "folded": self.folded}
+
+    def restore(self, state: Optional[Dict]):
+        if state:
+            self.summary, self.folded = state.get("summary", ""), int(state.get("folded", 0))
@@ -1,31 +1,193 @@
-import docker
-import os
-from typing import Tuple
+import atexit, collections, itertools, json, os, queue, select, struct, threading, time
+from typing import Callable, List, Optional, Tuple
 
 SANDBOX_CONTAINER_NAME = "llm-sandbox"
 WORKSPACE_DIR = "/workspace"
+SANDBOX_WORKERS = int(os.environ.get("SANDBOX_WORKERS", "2"))  # warm interpreters = blocks run at once
+SANDBOX_TIMEOUT = float(os.environ.get("SANDBOX_TIMEOUT", "60"))  # seconds per block
+SANDBOX_MAX_OUTPUT = int(os.environ.get("SANDBOX_MAX_OUTPUT", "20000"))  # characters of output kept per block
+SANDBOX_PRELOAD = os.environ.get("SANDBOX_PRELOAD", "pandas")  # imported once per worker, comma separated
 
-def get_sandbox_container():
+# Runs inside the container as `python -u -c`: one JSON request per stdin line; replies are JSON lines
+# on the original stdout: optional {"chunk"} messages while the block runs (streaming requests, at
+# most every 0.1s, each capped), then one {"exit", "out"}. Each block gets fresh globals in a warm
+# interpreter, starts in the workspace with the startup sys.path, and re-imports modules from the
+# workspace (they may have been edited since). print() and fd-level output (subprocesses, via a temp
+# file) are kept head + tail up to `cap` characters, so a runaway loop costs neither memory nor
+# context. SIGALRM enforces the timeout.
+_WORKER = r'''
+import collections, io, json, os, signal, sys, tempfile, threading, traceback
+proto, plock = os.fdopen(os.dup(1), "w"), threading.Lock()
+def send(msg):
+    with plock: proto.write(json.dumps(msg) + "\n"); proto.flush()
+class Timeout(BaseException): pass
+def _alarm(*_): raise Timeout()
+signal.signal(signal.SIGALRM, _alarm)
+class HeadTail:
+    def __init__(self, cap): self.hcap, self.tcap, self.head, self.tail, self.hn, self.tn, self.total = cap // 2, cap - cap // 2, [], collections.deque(), 0, 0, 0
+    def write(self, s):
+        self.total += len(s)
+        if self.hn < self.hcap: self.head.append(s[:self.hcap - self.hn]); self.hn += len(self.head[-1]); s = s[len(self.head[-1]):]
+        if s:
+            self.tail.append(s); self.tn += len(s)
+            while self.tn - len(self.tail[0]) >= self.tcap: self.tn -= len(self.tail.popleft())
+    def text(self):
+        head, tail = "".join(self.head), "".join(self.tail)[-self.tcap:] if self.tcap else ""
+        dropped = self.total - len(head) - len(tail)
+        return head + (f"\n[... {dropped} characters truncated ...]\n" if dropped else "") + tail
+class Out(io.TextIOBase):
+    def __init__(self, cap, stream): self.lock, self.all, self.stream, self.pending = threading.Lock(), HeadTail(cap), stream, HeadTail(8192)
+    def writable(self): return True
+    def write(self, s):
+        with self.lock:
+            self.all.write(s)
+            if self.stream: self.pending.write(s)
+        return len(s)
+    def take(self):
+        with self.lock:
+            if not self.pending.total: return ""
+            t, self.pending = self.pending.text(), HeadTail(8192)
+            return t
+for m in filter(None, os.environ.get("SANDBOX_PRELOAD", "").split(",")):
+    try: __import__(m.strip())
+    except Exception: pass
+home, path0 = os.getcwd(), list(sys.path)
+sys.dont_write_bytecode = True  # no __pycache__ in the wormhole, and no stale .pyc after a quick edit
+send({"pid": os.getpid()})
+for line in sys.stdin:
+    req = json.loads(line)
+    os.chdir(home); sys.path[:] = path0
+    for name, mod in list(sys.modules.items()):
+        if (getattr(mod, "__file__", None) or "").startswith(home + os.sep): del sys.modules[name]
+    out, raw, saved, code, done = Out(req["cap"], req.get("stream")), tempfile.TemporaryFile(), (os.dup(1), os.dup(2)), 0, threading.Event()
+    pos = [0]
+    def pump():
+        while True:
+            data = os.pread(raw.fileno(), 65536, pos[0])
+            if not data: break
+            pos[0] += len(data); out.write(data.decode("utf-8", "ignore"))
+        chunk = out.take()
+        if chunk: send({"id": req["id"], "chunk": chunk})
+    def flusher():
+        while not done.wait(0.1): pump()
+    os.dup2(raw.fileno(), 1); os.dup2(raw.fileno(), 2)
+    sys.stdout = sys.stderr = out; sys.stdin = io.StringIO()
+    t = threading.Thread(target=flusher, daemon=True); t.start()
     try:
-        client = docker.from_env()
-        containers = client.containers.list(filters={"name": SANDBOX_CONTAINER_NAME})
-        if not containers:
-            raise RuntimeError(f"Sandbox container '{SANDBOX_CONTAINER_NAME}' not found. Is it running?")
-        return containers[0]
-    except docker.errors.DockerException as e:
-        raise RuntimeError("Docker daemon not running or accessible. Please start Docker.") from e
-
-def run_in_sandbox(command: str, workdir: str = WORKSPACE_DIR) -> Tuple[int, str]:
-    container = get_sandbox_container()
-    exit_code, output = container.exec_run(command, workdir=workdir, demux=True)
-    if isinstance(output, tuple):
-        stdout, stderr = output
-        out = (stdout or b'').decode('utf-8', errors='ignore')
-        err = (stderr or b'').decode('utf-8', errors='ignore')
-        combined = (out + err).strip()
-    else:
-        combined = (output or b'').decode('utf-8', errors='ignore').strip()
-    return exit_code, combined
+        signal.setitimer(signal.ITIMER_REAL, req["timeout"])
+        exec(compile(req["code"], "<block>", "exec"), {"__name__": "__main__"})
+    except SystemExit as e:
+        code = e.code if isinstance(e.code, int) else int(e.code is not None)
+        if not isinstance(e.code, (int, type(None))): print(e.code, file=out)
+    except Timeout:
+        code = 124; print(f"TimeoutError: block ran longer than {req['timeout']}s", file=out)
+    except BaseException:
+        code = 1; t_, e, tb = sys.exc_info(); traceback.print_exception(t_, e, tb.tb_next, file=out)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        sys.stdout, sys.stderr, sys.stdin = sys.__stdout__, sys.__stderr__, sys.__stdin__
+        os.dup2(saved[0], 1); os.dup2(saved[1], 2); os.close(saved[0]); os.close(saved[1])
+    done.set(); t.join(); pump(); raw.close()
+    send({"id": req["id"], "exit": code, "out": out.all.text()})
+'''
+
+class HeadTail:
+    '''Keeps the first and last cap/2 characters written, with a marker for what was dropped.'''
+    def __init__(self, cap: int):
+        self.hcap, self.tcap = cap // 2, cap - cap // 2
+        self.head: List[str] = []
+        self.tail: "collections.deque[str]" = collections.deque()
+        self.hn = self.tn = self.total = 0
+
+    def write(self, s: str):
+        self.total += len(s)
+        if self.hn < self.hcap:
+            self.head.append(s[:self.hcap - self.hn])
+            self.hn += len(self.head[-1])
+            s = s[len(self.head[-1]):]
+        if s:
+            self.tail.append(s)
+            self.tn += len(s)
+            while self.tn - len(self.tail[0]) >= self.tcap:
+                self.tn -= len(self.tail.popleft())
+
+    def text(self) -> str:
+        head, tail = "".join(self.head), "".join(self.tail)[-self.tcap:] if self.tcap else ""
+        dropped = self.total - len(head) - len(tail)
+        return head + (f"\n[... {dropped} characters truncated ...]\n" if dropped else "") + tail
+
+_lock = threading.Lock()
+_client = None
+_container = None
+_pool: Optional["SandboxPool"] = None
+
+def _docker():
+    global _client
+    import docker  # only when code is actually executed; plain chat never needs it
+    if _client is None:
+        try:
+            _client = docker.from_env()
+        except docker.errors.DockerException as e:
+            raise RuntimeError("Docker daemon not running or accessible. Please start Docker.") from e
+    return _client
+
+def get_sandbox_container(refresh: bool = False):
+    '''The sandbox container; the client and handle are looked up once and reused.'''
+    global _container
+    import docker
+    with _lock:
+        if _container is None or refresh:
+            try:
+                containers = _docker().containers.list(filters={"name": SANDBOX_CONTAINER_NAME})
+            except docker.errors.DockerException as e:
+                raise RuntimeError("Docker daemon not running or accessible. Please start Docker.") from e
+            if not containers:
+                raise RuntimeError(f"Sandbox container '{SANDBOX_CONTAINER_NAME}' not found. Is it running?")
+            _container = containers[0]
+        return _container
+
+def _with_container(fn):
+    # a cached handle goes stale when the container is recreated; look it up again once
+    import docker
+    try:
+        return fn(get_sandbox_container())
+    except (docker.errors.NotFound, docker.errors.APIError):
+        return fn(get_sandbox_container(refresh=True))
+
+def run_in_sandbox(command: str, workdir: str = WORKSPACE_DIR, max_output: int = SANDBOX_MAX_OUTPUT,
+                   on_output: Optional[Callable[[str], None]] = None,
+                   timeout: Optional[float] = None) -> Tuple[int, str]:
+    '''Run a shell command in the sandbox; output is kept head + tail up to max_output characters
+    and, with on_output, passed on chunk by chunk as it arrives. After `timeout` seconds
+    (SANDBOX_TIMEOUT) the command is killed and the exit code is 124.'''
+    timeout = timeout or SANDBOX_TIMEOUT
+    def start(c):
+        cmd = ["timeout", "-k", "5", str(timeout), "sh", "-c", command]
+        exec_id = c.client.api.exec_create(c.id, cmd, workdir=workdir)["Id"]
+        return c, exec_id, c.client.api.exec_start(exec_id, stream=True, demux=True)
+    c, exec_id, chunks = _with_container(start)
+    kept, frames = HeadTail(max_output), queue.Queue()
+    def pump():
+        try:
+            for frame in chunks:
+                frames.put(frame)
+        finally:
+            frames.put(None)
+    threading.Thread(target=pump, daemon=True).start()
+    deadline = time.monotonic() + timeout + 10  # `timeout` in the container fires first
+    while True:
+        try:
+            frame = frames.get(timeout=max(deadline - time.monotonic(), 0))
+        except queue.Empty:
+            return 124, (kept.text() + f"\nTimeoutError: command ran longer than {timeout}s").strip()
+        if frame is None:
+            break
+        stdout, stderr = frame
+        text = (stdout or b'').decode('utf-8', errors='ignore') + (stderr or b'').decode('utf-8', errors='ignore')
+        kept.write(text)
+        if on_output and text:
+            on_output(text)
+    return c.client.api.exec_inspect(exec_id)["ExitCode"], kept.text().strip()
 
 def run_python_script_in_sandbox(script_path: str) -> Tuple[int, str]:
     if not os.path.exists(script_path):
@@ -33,3 +195,125 @@ def run_python_script_in_sandbox(script_path: str) -> Tuple[int, str]:
     script_filename = os.path.basename(script_path)
     command = f"python {script_filename}"
     return run_in_sandbox(command)
+
+class WorkerDied(ConnectionError):
+    pass
+
+class _Worker:
+    '''One warm interpreter in the container, talked to over its exec socket.'''
+    _ids = itertools.count()
+
+    def __init__(self, container, preload: str, start_timeout: float = 60):
+        self.container, self.api = container, container.client.api
+        exec_id = self.api.exec_create(container.id, ["python", "-u", "-c", _WORKER], stdin=True,
+                                       workdir=WORKSPACE_DIR, environment={"SANDBOX_PRELOAD": preload})["Id"]
+        self._io = self.api.exec_start(exec_id, socket=True)
+        self.sock = getattr(self._io, "_sock", self._io)
+        self.buf, self.err = b"", b""
+        self.pid = self._recv(time.monotonic() + start_timeout)["pid"]
+
+    def _read(self, n: int, deadline: float) -> bytes:
+        data = b""
+        while len(data) < n:
+            left = deadline - time.monotonic()
+            if left <= 0 or not select.select([self.sock], [], [], left)[0]:
+                raise TimeoutError
+            chunk = self.sock.recv(n - len(data))
+            if not chunk:
+                raise WorkerDied("sandbox worker exited" + (f": {self.err.decode(errors='ignore')[-500:]}" if self.err else ""))
+            data += chunk
+        return data
+
+    def _recv(self, deadline: float) -> dict:
+        # exec output is multiplexed: 8-byte header (stream, size) per frame; stream 2 is the worker's stderr
+        while b"\n" not in self.buf:
+            stream, size = struct.unpack(">BxxxL", self._read(8, deadline))
+            data = self._read(size, deadline)
+            if stream == 2:
+                self.err = (self.err + data)[-4096:]
+            else:
+                self.buf += data
+        line, self.buf = self.buf.split(b"\n", 1)
+        return json.loads(line)
+
+    def run(self, code: str, timeout: float, cap: int,
+            on_output: Optional[Callable[[str], None]] = None) -> Tuple[int, str]:
+        rid = next(self._ids)
+        req = {"id": rid, "code": code, "timeout": timeout, "cap": cap, "stream": on_output is not None}
+        self.sock.sendall((json.dumps(req) + "\n").encode())
+        deadline = time.monotonic() + timeout + 5  # the worker's own alarm fires first
+        while True:
+            msg = self._recv(deadline)
+            if "exit" in msg:
+                return msg["exit"], msg["out"].rstrip()
+            on_output(msg["chunk"])
+
+    def kill(self):
+        try:
+            self.container.exec_run(["python", "-c", f"import os, signal; os.kill({self.pid}, signal.SIGKILL)"])
+        except Exception:
+            pass
+        self.close()
+
+    def close(self):
+        try:
+            self._io.close()
+        except Exception:
+            pass
+
+class SandboxPool:
+    '''Warm Python workers in the sandbox container.
+
+    run(code) sends the block to an idle worker over its exec socket (no files in the
+    wormhole, no interpreter start-up), with a per-block timeout and head + tail output cap; up to
+    `size` blocks run at once. A worker that dies or hangs past its timeout is killed
+    and replaced on the next call.'''
+
+    def __init__(self, size: int = SANDBOX_WORKERS, timeout: float = SANDBOX_TIMEOUT,
+                 max_output: int = SANDBOX_MAX_OUTPUT, preload: str = SANDBOX_PRELOAD):
+        self.size, self.timeout, self.max_output, self.preload = size, timeout, max_output, preload
+        self.idle: "queue.Queue[_Worker]" = queue.Queue()
+        self.slots = threading.BoundedSemaphore(size)
+
+    def _take(self) -> _Worker:
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            return _with_container(lambda c: _Worker(c, self.preload))
+
+    def run(self, code: str, timeout: Optional[float] = None,
+            on_output: Optional[Callable[[str], None]] = None) -> Tuple[int, str]:
+        '''(exit code, output); with on_output, output chunks are also streamed as they arrive.'''
+        timeout = timeout or self.timeout
+        with self.slots:
+            worker = self._take()
+            try:
+                exit_code, out = worker.run(code, timeout, self.max_output, on_output)
+            except TimeoutError:
+                worker.kill()
+                return 124, f"TimeoutError: block ran longer than {timeout}s and its worker was killed"
+            except (OSError, ValueError) as e:
+                worker.kill()
+                return 1, f"{type(e).__name__}: {e}"
+            self.idle.put(worker)
+            return exit_code, out
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().kill()
+            except queue.Empty:
+                return
+
+def get_pool() -> SandboxPool:
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = SandboxPool()
+            atexit.register(_pool.close)
+        return _pool
+
+def run_python(code: str, timeout: Optional[float] = None,
+               on_output: Optional[Callable[[str], None]] = None) -> Tuple[int, str]:
+    '''Run a Python block on the shared warm pool.'''
+    return get_pool().run(code, timeout, on_output)
@@ -0,0 +1,117 @@
+import os, time
+from importlib.util import find_spec
+from typing import Callable, Dict, List, Sequence
+
+try:
+    from IPython.display import display, Markdown
+    _HAS_IPY = True
+except Exception:
+    _HAS_IPY = False
+
+# ipywidgets costs ~100ms to import; only side-by-side views load it
+_HAS_WIDGETS = find_spec("ipywidgets") is not None
+
+RENDER_HZ = float(os.environ.get("RENDER_HZ", "10"))  # live-message redraws per second; 0 = every token
+
+class Transcript:
+    '''Per-message Markdown, rendered once and cached; parts(msgs) re-renders only
+    messages that are new or changed since the last call.'''
+    def __init__(self, render: Callable[[Dict], str]):
+        self.render = render
+        self._keys: List[tuple] = []
+        self._parts: List[str] = []
+
+    def parts(self, msgs: Sequence[Dict]) -> List[str]:
+        keys = [tuple(m.items()) for m in msgs]
+        n = 0
+        while n < min(len(keys), len(self._keys)) and keys[n] == self._keys[n]:
+            n += 1
+        self._parts[n:] = [self.render(m) for m in msgs[n:]]
+        self._keys = keys
+        return self._parts
+
+class MarkdownStream:
+    '''Shows one streaming message under an already-rendered transcript.
+
+    The transcript goes out once as its own output (none if empty) and is never touched
+    again; update() redraws only the live message, at most `hz` times a second, so a token
+    costs the same on turn 2 as on turn 200. `footer` closes the message, e.g. a code fence.
+    Without IPython nothing is drawn until close() prints it all.'''
+    def __init__(self, history_md: str, header: str, hz: float = RENDER_HZ, cursor: str = " ▌", footer: str = ""):
+        self.history_md, self.header, self.cursor, self.footer = history_md, header, cursor, footer
+        self.interval = 1.0 / hz if hz > 0 else 0.0
+        self.frames = 0
+        self._last = 0.0
+        self._handle = None
+        if _HAS_IPY:
+            if history_md:
+                display(Markdown(history_md))
+            self._handle = display(Markdown(header + cursor.lstrip() + footer), display_id=True)
+
+    def _draw(self, md: str):
+        self._handle.update(Markdown(md))
+        self._last = time.monotonic()
+        self.frames += 1
+
+    def update(self, text: str):
+        # tokens that land inside the frame interval are coalesced into the next redraw
+        if self._handle is not None and time.monotonic() - self._last >= self.interval:
+            self._draw(self.header + text + self.cursor + self.footer)
+
+    def close(self, text: str):
+        if self._handle is not None:
+            self._draw(self.header + text + self.footer)
+        else:
+            print("\n\n".join(filter(None, [self.history_md.rstrip(), self.header + text + self.footer])))
+
+class MarkdownColumns:
+    '''Several messages streaming at once, side by side under one transcript.
+
+    Columns are ipywidgets Output areas in an HBox (stacked display handles without
+    ipywidgets) and share one frame clock, so N streams still redraw at most `hz` times a
+    second. update()/close() must come from one thread, e.g. the event loop driving them.'''
+    def __init__(self, history_md: str, headers: Sequence[str], hz: float = RENDER_HZ, cursor: str = " ▌"):
+        self.history_md, self.headers, self.cursor = history_md, list(headers), cursor
+        self.interval = 1.0 / hz if hz > 0 else 0.0
+        self.texts = [""] * len(self.headers)
+        self.frames = 0
+        self._dirty, self._closed = set(), set()
+        self._last = 0.0
+        self._cols = self._handles = None
+        if not _HAS_IPY:
+            return
+        display(Markdown(history_md))
+        if _HAS_WIDGETS:
+            import ipywidgets as w
+            self._cols = [w.Output(layout=w.Layout(flex="1 1 0", min_width="0", padding="0 0.5em")) for _ in headers]
+            display(w.HBox(self._cols))
+            for i, h in enumerate(self.headers):
+                self._draw(i, h + cursor.lstrip())
+        else:
+            self._handles = [display(Markdown(h + cursor.lstrip()), display_id=True) for h in self.headers]
+
+    def _draw(self, i: int, md: str):
+        if self._cols is not None:
+            # set the outputs trait directly: `with out:` capture is not safe off the main thread
+            self._cols[i].outputs = ({"output_type": "display_data", "metadata": {},
+                                      "data": {"text/markdown": md, "text/plain": md}},)
+        elif self._handles is not None:
+            self._handles[i].update(Markdown(md))
+
+    def update(self, i: int, text: str):
+        self.texts[i] = text
+        self._dirty.add(i)
+        if _HAS_IPY and time.monotonic() - self._last >= self.interval:
+            for j in self._dirty - self._closed:
+                self._draw(j, self.headers[j] + self.texts[j] + self.cursor)
+            self._dirty.clear()
+            self._last = time.monotonic()
+            self.frames += 1
+
+    def close(self, i: int, text: str):
+        self.texts[i] = text
+        self._closed.add(i)
+        if _HAS_IPY:
+            self._draw(i, self.headers[i] + text)
+        elif len(self._closed) == len(self.headers):
+            print("\n\n".join([self.history_md.rstrip(), *(h + t for h, t in zip(self.headers, self.texts))]))
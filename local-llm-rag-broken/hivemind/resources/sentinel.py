@@ -0,0 +1,136 @@
+import os, threading, time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from hivemind.resources.scout import walk_files, wanted
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+    _HAS_WATCHDOG = True
+except Exception:
+    FileSystemEventHandler = object
+    _HAS_WATCHDOG = False
+
+Files = List[Tuple[str, os.stat_result]]
+
+class ChangeSet:
+    '''Coalesces filesystem events per path (last event wins) and releases a path once it
+    has been quiet for `debounce` seconds, or has kept changing for `max_wait`.'''
+
+    def __init__(self, debounce: float = 2.0, max_wait: float = 30.0):
+        self.debounce, self.max_wait = debounce, max_wait
+        self.cond = threading.Condition()
+        self.pending: Dict[str, list] = {}  # path -> [kind, first_seen, last_seen]
+        self.closed = False
+
+    def add(self, path: str, kind: str):
+        now = time.monotonic()
+        with self.cond:
+            e = self.pending.get(path)
+            if e:
+                e[0], e[2] = kind, now
+            else:
+                self.pending[path] = [kind, now, now]
+            self.cond.notify()
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+
+    def take(self) -> Optional[Dict[str, str]]:
+        '''Block until some paths are due and return {path: "upsert"|"delete"}; None once closed.'''
+        with self.cond:
+            while not self.closed:
+                now = time.monotonic()
+                due = {p: e[0] for p, e in self.pending.items()
+                       if now - e[2] >= self.debounce or now - e[1] >= self.max_wait}
+                if due:
+                    for p in due:
+                        del self.pending[p]
+                    return due
+                # sleep exactly until the next path could be due; with nothing pending, until notified
+                wake = min((min(e[2] + self.debounce, e[1] + self.max_wait) for e in self.pending.values()),
+                           default=None)
+                self.cond.wait(None if wake is None else max(wake - now, 0.01))
+            return None
+
+class _Handler(FileSystemEventHandler):
+    def __init__(self, changes: ChangeSet, accept: Callable[[str, bool], bool]):
+        self.changes, self.accept = changes, accept
+
+    def _put(self, path, kind: str, is_dir: bool):
+        path = os.fsdecode(path)
+        if self.accept(path, is_dir):
+            self.changes.add(path, kind)
+
+    def on_any_event(self, ev):
+        kind = ev.event_type
+        if kind == "moved":
+            self._put(ev.src_path, "delete", ev.is_directory)
+            self._put(ev.dest_path, "upsert", ev.is_directory)
+        elif kind == "deleted":
+            self._put(ev.src_path, "delete", ev.is_directory)
+        elif kind == "created" or (kind in ("modified", "closed") and not ev.is_directory):
+            self._put(ev.src_path, "upsert", ev.is_directory)
+
+def _poll(root: str, changes: ChangeSet, stop: threading.Event, interval: float, walk_kw: Dict):
+    snap = {p: (st.st_size, st.st_mtime_ns) for p, st in walk_files(root, **walk_kw)}
+    while not stop.wait(interval):
+        cur = {p: (st.st_size, st.st_mtime_ns) for p, st in walk_files(root, **walk_kw)}
+        for p, sig in cur.items():
+            if snap.get(p) != sig:
+                changes.add(p, "upsert")
+        for p in snap.keys() - cur.keys():
+            changes.add(p, "delete")
+        snap = cur
+
+def watch(root: str, on_batch: Callable[[Files, List[str]], None], debounce: float = 2.0,
+          poll: Optional[float] = None, include: Sequence[str] = (), exclude: Sequence[str] = (),
+          max_size: Optional[int] = None):
+    '''Call on_batch(changed_files, deleted_paths) for each debounced burst of changes under root
+    until Ctrl-C. Uses inotify/FSEvents through watchdog when it is installed (or `poll`
+    seconds of rescanning otherwise). Deleted paths may be directories; created or
+    moved-in directories are expanded into their files here.'''
+    root = os.path.abspath(root)
+    walk_kw = dict(include=include, exclude=exclude, max_size=max_size)
+    changes, stop = ChangeSet(debounce), threading.Event()
+    observer = None
+    if _HAS_WATCHDOG and not poll:
+        accept = lambda path, is_dir: wanted(root, path, include, exclude, is_dir=is_dir)
+        observer = Observer()
+        observer.schedule(_Handler(changes, accept), root, recursive=True)
+        observer.start()
+        print(f"Watching {root} ({type(observer).__name__})")
+    else:
+        poll = poll or 30.0
+        threading.Thread(target=_poll, args=(root, changes, stop, poll, walk_kw), daemon=True).start()
+        print(f"Watching {root} (polling every {poll:g}s; install watchdog for inotify)")
+
+    try:
+        while True:
+            due = changes.take()
+            if due is None:
+                return
+            files, deleted = {}, []
+            for path, kind in sorted(due.items()):
+                if kind == "upsert" and os.path.isdir(path):
+                    files.update((p, st) for p, st in walk_files(path, max_size=max_size)
+                                 if wanted(root, p, include, exclude))
+                    continue
+                try:
+                    st = os.stat(path) if kind == "upsert" else None
+                except OSError:
+                    st = None
+                if st is None:
+                    deleted.append(path)
+                elif max_size is None or st.st_size <= max_size:
+                    files[path] = st
+            if files or deleted:
+                on_batch(sorted(files.items()), deleted)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        changes.close()
+        if observer:
+            observer.stop(); observer.join()
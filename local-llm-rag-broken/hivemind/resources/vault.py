@@ -0,0 +1,528 @@
+import json, math, os, pathlib, re, sqlite3, threading, uuid
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# numpy is imported by LocalStore only; the Weaviate path stays as light as before
+VECTOR_BACKEND = os.environ.get("VECTOR_BACKEND", "weaviate")  # weaviate | local (embedded, no server)
+VECTOR_DIR = os.environ.get("VECTOR_DIR", os.path.expanduser("~/.cache/local-llm-rag/vectors"))
+VECTOR_DTYPE = os.environ.get("VECTOR_DTYPE", "float16")  # float16 | int8 (with a per-row scale); new indexes only
+IVF_MIN = int(os.environ.get("VECTOR_IVF_MIN", "10000"))  # live rows before search switches to IVF; 0 = never
+IVF_PROBE = int(os.environ.get("VECTOR_IVF_PROBE", "8"))  # IVF lists scanned per query
+# Weaviate collections created by ensure_collection(); existing ones keep their settings
+HNSW_EF = int(os.environ.get("HNSW_EF", "-1"))  # query-time candidate list; -1 = dynamic
+HNSW_EF_CONSTRUCTION = int(os.environ.get("HNSW_EF_CONSTRUCTION", "128"))
+HNSW_MAX_CONNECTIONS = int(os.environ.get("HNSW_MAX_CONNECTIONS", "32"))
+VECTOR_COMPRESSION = os.environ.get("VECTOR_COMPRESSION", "")  # "" | pq | bq: compressed vectors in RAM
+# stub objects (binary files, exact duplicates) that searches leave out unless asked for
+SKIP_SECTIONS = [s for s in os.environ.get("SEARCH_SKIP_SECTIONS", "binary,duplicate").split(",") if s]
+
+BLOCK = 16384  # rows converted to float32 at a time while scanning
+
+Obj = Tuple[Optional[str], Dict, Optional[Sequence[float]]]  # (uuid or None, properties, vector or None)
+
+def file_props(path: str, st: Optional[os.stat_result] = None) -> Dict:
+    '''Filterable metadata every object of a file carries: its folders, extension and mtime.'''
+    if st is None:
+        try:
+            st = os.stat(path)
+        except OSError:
+            pass
+    p = pathlib.PurePath(path)
+    return {"dirs": [str(d) for d in p.parents if str(d) not in (".", p.anchor)],
+            "ext": p.suffix.lower(), "mtime": int(st.st_mtime) if st else None}
+
+def scope(under: Optional[str] = None, ext: Sequence[str] = (), section: Sequence[str] = (),
+          skip: Sequence[str] = SKIP_SECTIONS, since: Optional[float] = None) -> Dict:
+    '''A backend-neutral search filter: files under a folder (or that file), with one of the
+    extensions, in one of the sections, not in a skipped section, modified since (epoch).
+    Empty parts are left out, so scope(skip=()) searches everything.'''
+    where: Dict = {}
+    if under and under.rstrip("/"):
+        where["under"] = under.rstrip("/")
+    if ext:
+        where["ext"] = ["." + e.lower().lstrip(".") for e in ext]
+    if section:
+        where["section"] = list(section)
+    skip = [s for s in skip if s not in section]
+    if skip:
+        where["skip"] = skip
+    if since:
+        where["since"] = int(since)
+    return where
+
+def weaviate_properties():
+    '''Typed schema: only `text` is vectorized and BM25-indexed; the rest are exact-match
+    (field-tokenized) or range-indexed filters.'''
+    from weaviate.classes.config import Property, DataType, Tokenization
+    field = lambda name, dt=DataType.TEXT: Property(name=name, data_type=dt, tokenization=Tokenization.FIELD,
+                                                    index_searchable=False, skip_vectorization=True)
+    number = lambda name, ranged=False: Property(name=name, data_type=DataType.INT, skip_vectorization=True,
+                                                 index_range_filters=ranged or None)
+    return [Property(name="text", data_type=DataType.TEXT, vectorize_property_name=False),
+            field("source"), field("dirs", DataType.TEXT_ARRAY), field("ext"), field("section"),
+            number("mtime", True), number("chunk", True), number("page"), field("hash"), field("dup_cluster"),
+            Property(name="cells", data_type=DataType.INT_ARRAY, skip_vectorization=True)]  # notebook cell range
+
+def weaviate_vector_index():
+    from weaviate.classes.config import Configure
+    quantizer = {"pq": Configure.VectorIndex.Quantizer.pq, "bq": Configure.VectorIndex.Quantizer.bq}.get(VECTOR_COMPRESSION)
+    if VECTOR_COMPRESSION and quantizer is None:
+        raise ValueError(f"unknown VECTOR_COMPRESSION {VECTOR_COMPRESSION!r} (pq or bq)")
+    return Configure.VectorIndex.hnsw(ef=HNSW_EF, ef_construction=HNSW_EF_CONSTRUCTION,
+                                      max_connections=HNSW_MAX_CONNECTIONS, quantizer=quantizer and quantizer())
+
+def weaviate_filter(where: Optional[Dict]):
+    from weaviate.classes.query import Filter
+    w, parts = where or {}, []
+    if w.get("under"):
+        parts.append(Filter.by_property("source").equal(w["under"]) | Filter.by_property("dirs").contains_any([w["under"]]))
+    if w.get("ext"):
+        parts.append(Filter.by_property("ext").contains_any(w["ext"]))
+    if w.get("section"):
+        parts.append(Filter.by_property("section").contains_any(w["section"]))
+    if w.get("skip"):
+        # not contains_none: that needs a newer client than the one pinned in uv.lock
+        parts.append(Filter.all_of([Filter.by_property("section").not_equal(x) for x in w["skip"]]))
+    if w.get("since"):
+        parts.append(Filter.by_property("mtime").greater_or_equal(w["since"]))
+    return Filter.all_of(parts) if parts else None
+
+class VectorStore:
+    '''What ingest and retrieval need from a backend.
+
+    Properties are the chunk dicts ingest builds ("text", "source", "section", "chunk", ...);
+    hits come back as those dicts plus "_score" and "_rank". Backends that cannot vectorize
+    on their own set needs_vectors, and ingest then embeds on the client.'''
+    needs_vectors = False
+
+    def upsert(self, objs: Sequence[Obj]) -> Dict[int, str]:
+        '''Insert or replace objects; returns {index in objs: error} for the ones that failed.'''
+        raise NotImplementedError
+
+    def update(self, uid: str, props: Dict):
+        raise NotImplementedError
+
+    def delete_source(self, source: str, subtree: bool = False):
+        '''Drop every object of `source` (and, with subtree, of the files under it).'''
+        raise NotImplementedError
+
+    def fetch_source(self, source: str, limit: int) -> List[Dict]:
+        '''The first `limit` chunks of `source`, in chunk order.'''
+        raise NotImplementedError
+
+    def hybrid(self, query: str, vector: Optional[Sequence[float]], limit: int, alpha: float = 0.5,
+               where: Optional[Dict] = None) -> List[Dict]:
+        '''BM25 + vector search fused by relative score; alpha 0 = BM25 only, 1 = vector only.
+        `where` (see scope()) is applied before ranking, not to the top hits.'''
+        raise NotImplementedError
+
+    def flush(self):
+        '''End of a write batch: a chance for housekeeping.'''
+
+class WeaviateStore(VectorStore):
+    '''A Weaviate collection; objects without a vector go through its vectorizer.'''
+
+    def __init__(self, coll):
+        self.coll = coll
+
+    def upsert(self, objs: Sequence[Obj]) -> Dict[int, str]:
+        from weaviate.classes.data import DataObject
+        res = self.coll.data.insert_many([DataObject(properties=p, uuid=u, vector=v) for u, p, v in objs])
+        return {i: e.message for i, e in res.errors.items()}
+
+    def update(self, uid: str, props: Dict):
+        self.coll.data.update(uuid=uid, properties=props)
+
+    def delete_source(self, source: str, subtree: bool = False):
+        from weaviate.classes.query import Filter
+        self.coll.data.delete_many(where=Filter.by_property("source").equal(source))
+        if subtree:
+            self.coll.data.delete_many(where=Filter.by_property("source").like(f"{source}/*"))
+
+    def fetch_source(self, source: str, limit: int) -> List[Dict]:
+        from weaviate.classes.query import Filter
+        objs = self.coll.query.fetch_objects(
+            filters=Filter.by_property("source").equal(source) & Filter.by_property("chunk").less_than(limit),
+            limit=limit).objects
+        return sorted((o.properties for o in objs), key=lambda p: p.get("chunk") or 0)
+
+    def hybrid(self, query: str, vector: Optional[Sequence[float]], limit: int, alpha: float = 0.5,
+               where: Optional[Dict] = None) -> List[Dict]:
+        from weaviate.classes.query import MetadataQuery
+        res = self.coll.query.hybrid(query=query, vector=vector, alpha=alpha, limit=limit,
+                                     filters=weaviate_filter(where), return_metadata=MetadataQuery(score=True))
+        return [dict(o.properties, _score=o.metadata.score, _rank=i) for i, o in enumerate(res.objects)]
+
+class LocalStore(VectorStore):
+    '''Embedded index in one directory, for corpora that fit on one machine; no server.
+
+    Vectors are L2-normalized and appended to a memory-mapped file as float16, or int8 with
+    a float32 scale per row; properties live in SQLite next to it, with an FTS5 index for
+    the BM25 half of hybrid search. A replaced or deleted object leaves a dead row behind,
+    so readers never see a row change under them; flush() compacts once most rows are dead.
+
+    Search scans the live rows in float32 blocks. Past IVF_MIN live rows flush() trains an
+    IVF index (sqrt(n) k-means lists); a query then scans IVF_PROBE lists plus the rows added
+    since training, which is retrained once those reach a fifth of it. One writer process
+    and any number of reader threads/processes; readers pick up writes on their next search.'''
+    needs_vectors = True
+
+    def __init__(self, path: str, dtype: str = VECTOR_DTYPE):
+        import numpy
+        self.np, self.path = numpy, path
+        os.makedirs(path, exist_ok=True)
+        self.lock = threading.RLock()
+        self.con = sqlite3.connect(os.path.join(path, "meta.db"), timeout=30, check_same_thread=False,
+                                   isolation_level=None)
+        self.con.execute("PRAGMA journal_mode=WAL")
+        self.con.execute("PRAGMA synchronous=NORMAL")
+        self.con.executescript('''
+            CREATE TABLE IF NOT EXISTS meta (k TEXT PRIMARY KEY, v TEXT);
+            CREATE TABLE IF NOT EXISTS obj (
+                slot INTEGER PRIMARY KEY, uuid TEXT UNIQUE, source TEXT, chunk INTEGER, text TEXT, props TEXT,
+                section TEXT, ext TEXT, mtime INTEGER);
+            CREATE INDEX IF NOT EXISTS obj_source ON obj(source, chunk);
+            CREATE VIRTUAL TABLE IF NOT EXISTS obj_fts USING fts5(text, content='obj', content_rowid='slot');
+            CREATE TRIGGER IF NOT EXISTS obj_ai AFTER INSERT ON obj BEGIN
+                INSERT INTO obj_fts (rowid, text) VALUES (new.slot, new.text); END;
+            CREATE TRIGGER IF NOT EXISTS obj_ad AFTER DELETE ON obj BEGIN
+                INSERT INTO obj_fts (obj_fts, rowid, text) VALUES ('delete', old.slot, old.text); END;
+            CREATE TRIGGER IF NOT EXISTS obj_au AFTER UPDATE OF slot, text ON obj BEGIN
+                INSERT INTO obj_fts (obj_fts, rowid, text) VALUES ('delete', old.slot, old.text);
+                INSERT INTO obj_fts (rowid, text) VALUES (new.slot, new.text); END;
+        ''')
+        cols = {r[1] for r in self.con.execute("PRAGMA table_info(obj)")}
+        for col in ("section", "ext", "mtime"):  # indexes written before these were columns
+            if col not in cols:
+                self.con.execute(f"ALTER TABLE obj ADD COLUMN {col}")
+                self.con.execute(f"UPDATE obj SET {col} = json_extract(props, '$.{col}')")
+        self.con.execute("INSERT OR IGNORE INTO meta VALUES ('dtype', ?)", (dtype,))
+        self.dtype = self._meta("dtype")
+        if self.dtype not in ("float16", "int8"):
+            raise ValueError(f"{path}: unsupported vector dtype {self.dtype!r} (float16 or int8)")
+        self._gen = None
+        self._snap = (0, None, None, numpy.zeros(0, bool), None)  # rows, vectors, scales, alive, ivf
+        self._scopes: Dict[str, object] = {}  # where-clause -> matching slots, for this generation
+
+    def _meta(self, k: str, default=None):
+        row = self.con.execute("SELECT v FROM meta WHERE k=?", (k,)).fetchone()
+        return row[0] if row else default
+
+    def _set(self, k: str, v):
+        self.con.execute("INSERT INTO meta VALUES (?,?) ON CONFLICT(k) DO UPDATE SET v=excluded.v", (k, str(v)))
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _load(self):
+        '''Re-map the files if anything was written since the last look (any process).'''
+        np = self.np
+        with self.lock:
+            gen = self._meta("generation", "0")
+            if gen == self._gen:
+                return self._snap
+            rows, dim = int(self._meta("rows", "0")), int(self._meta("dim", "0"))
+            vecs = scales = ivf = None
+            if rows:
+                vecs = np.memmap(self._file("vectors"), self.dtype, "r", shape=(rows, dim))
+                if self.dtype == "int8":
+                    scales = np.memmap(self._file("scales"), np.float32, "r", shape=(rows,))
+            alive = np.zeros(rows, bool)
+            alive[np.fromiter((s for (s,) in self.con.execute("SELECT slot FROM obj")), np.int64)] = True
+            if os.path.exists(self._file("ivf.npz")):
+                with np.load(self._file("ivf.npz")) as z:
+                    if int(z["rows"]) <= rows:
+                        ivf = {k: z[k] for k in z.files}
+            self._snap, self._gen, self._scopes = (rows, vecs, scales, alive, ivf), gen, {}
+            return self._snap
+
+    def _encode(self, vectors: List[Sequence[float]]):
+        np = self.np
+        v = np.asarray(vectors, np.float32)
+        v /= np.maximum(np.linalg.norm(v, axis=1, keepdims=True), 1e-12)
+        if self.dtype == "float16":
+            return v.astype(np.float16), None
+        scale = np.maximum(np.abs(v).max(axis=1), 1e-12) / 127
+        return np.round(v / scale[:, None]).astype(np.int8), scale.astype(np.float32)
+
+    def _rows(self, snap, idx):
+        '''Rows `idx` (slice or sorted slots) as float32, scale applied.'''
+        _, vecs, scales, _, _ = snap
+        block = vecs[idx].astype(self.np.float32)
+        return block * scales[idx][:, None] if scales is not None else block
+
+    def upsert(self, objs: Sequence[Obj]) -> Dict[int, str]:
+        errors = {i: "no vector: the local backend needs client-side embeddings"
+                  for i, (_, _, v) in enumerate(objs) if v is None}
+        good = [(i, o) for i, o in enumerate(objs) if i not in errors]
+        if not good:
+            return errors
+        vecs, scales = self._encode([v for _, (_, _, v) in good])
+        with self.lock:
+            self.con.execute("BEGIN IMMEDIATE")
+            try:
+                dim = int(self._meta("dim", "0")) or vecs.shape[1]
+                if vecs.shape[1] != dim:
+                    raise ValueError(f"{self.path}: vectors have {vecs.shape[1]} dims, the index has {dim}")
+                rows = int(self._meta("rows", "0"))
+                # new rows go past the end; the SQLite commit below is what makes them visible
+                with open(self._file("vectors"), "ab+") as f:
+                    f.truncate(rows * dim * vecs.itemsize)
+                    f.write(vecs.tobytes())
+                if scales is not None:
+                    with open(self._file("scales"), "ab+") as f:
+                        f.truncate(rows * 4)
+                        f.write(scales.tobytes())
+                for slot, (_, (uid, props, _)) in enumerate(good, rows):
+                    props = dict(props)
+                    text = props.pop("text", "") or ""
+                    self.con.execute("DELETE FROM obj WHERE uuid=?", (uid,))
+                    self.con.execute("INSERT INTO obj (slot, uuid, source, chunk, text, props, section, ext, mtime) "
+                                     "VALUES (?,?,?,?,?,?,?,?,?)",
+                                     (slot, uid or str(uuid.uuid4()), props.get("source"), props.get("chunk"), text,
+                                      json.dumps(props), props.get("section"), props.get("ext"), props.get("mtime")))
+                self._set("dim", dim)
+                self._set("rows", rows + len(good))
+                self._bump()
+                self.con.execute("COMMIT")
+            except BaseException:
+                self.con.execute("ROLLBACK")
+                raise
+        return errors
+
+    def _bump(self):
+        self.con.execute("INSERT INTO meta VALUES ('generation', '1') "
+                         "ON CONFLICT(k) DO UPDATE SET v = CAST(v AS INTEGER) + 1")
+
+    def update(self, uid: str, props: Dict):
+        with self.lock:
+            row = self.con.execute("SELECT text, props FROM obj WHERE uuid=?", (uid,)).fetchone()
+            if row is None:
+                raise KeyError(uid)
+            merged = dict(json.loads(row[1]), **props)
+            text = merged.pop("text", row[0])
+            with self.con:
+                self.con.execute("BEGIN IMMEDIATE")
+                self.con.execute("UPDATE obj SET text=?, props=?, source=?, chunk=?, section=?, ext=?, mtime=? WHERE uuid=?",
+                                 (text, json.dumps(merged), merged.get("source"), merged.get("chunk"),
+                                  merged.get("section"), merged.get("ext"), merged.get("mtime"), uid))
+                self._bump()
+
+    def delete_source(self, source: str, subtree: bool = False):
+        with self.lock, self.con:
+            self.con.execute("BEGIN IMMEDIATE")
+            self.con.execute("DELETE FROM obj WHERE source=?", (source,))
+            if subtree:  # "a/" <= s < "a0": everything under a/
+                self.con.execute("DELETE FROM obj WHERE source >= ? AND source < ?", (source + "/", source + "0"))
+            self._bump()
+
+    def fetch_source(self, source: str, limit: int) -> List[Dict]:
+        with self.lock:
+            rows = self.con.execute("SELECT text, props FROM obj WHERE source=? AND chunk < ? ORDER BY chunk LIMIT ?",
+                                    (source, limit, limit)).fetchall()
+        return [dict(json.loads(p), text=t) for t, p in rows]
+
+    def count(self) -> int:
+        with self.lock:
+            return self.con.execute("SELECT COUNT(*) FROM obj").fetchone()[0]
+
+    def _where(self, where: Optional[Dict]) -> Tuple[str, List]:
+        w, conds, args = where or {}, [], []
+        if w.get("under"):  # the file itself or anything below the folder
+            conds.append("(source = ? OR (source >= ? AND source < ?))")
+            args += [w["under"], w["under"] + "/", w["under"] + "0"]
+        for col in ("ext", "section"):
+            if w.get(col):
+                conds.append(f"{col} IN ({','.join('?' * len(w[col]))})")
+                args += w[col]
+        if w.get("skip"):
+            conds.append(f"(section IS NULL OR section NOT IN ({','.join('?' * len(w['skip']))}))")
+            args += w["skip"]
+        if w.get("since"):
+            conds.append("mtime >= ?")
+            args.append(w["since"])
+        return " AND ".join(conds), args
+
+    def _allowed(self, cond: str, args: List):
+        '''Slots matching a where-clause, cached until the next write.'''
+        key = json.dumps([cond, args])
+        with self.lock:
+            if key not in self._scopes:
+                self._scopes[key] = self.np.fromiter(
+                    (s for (s,) in self.con.execute(f"SELECT slot FROM obj WHERE {cond}", args)), self.np.int64)
+            return self._scopes[key]
+
+    def _vector_hits(self, snap, vector: Sequence[float], k: int, allowed=None) -> List[Tuple[int, float]]:
+        np = self.np
+        rows, vecs, _, alive, ivf = snap
+        q = np.asarray(vector, np.float32)
+        if q.shape[0] != vecs.shape[1]:
+            raise ValueError(f"{self.path}: query vector has {q.shape[0]} dims, the index has {vecs.shape[1]}")
+        q /= max(float(np.linalg.norm(q)), 1e-12)
+        if allowed is not None:
+            allowed = allowed[allowed < rows]  # written after this snapshot
+        if allowed is not None and (ivf is None or len(allowed) <= BLOCK):
+            slots = np.sort(allowed)  # a narrow scope is scanned exactly
+        elif ivf is None:
+            slots = None
+        else:
+            if allowed is not None:
+                alive = np.zeros(rows, bool)
+                alive[allowed] = True
+            cs = ivf["centroids"] @ q
+            probe = np.argpartition(-cs, min(IVF_PROBE, len(cs)) - 1)[:IVF_PROBE]
+            off, order = ivf["offsets"], ivf["order"]
+            slots = np.concatenate([order[off[l]:off[l + 1]] for l in probe] + [np.arange(int(ivf["rows"]), rows)])
+            slots = np.sort(slots[alive[slots]])  # ascending: the memmap is read front to back
+        if slots is None:
+            slots = np.arange(rows)
+            scores = np.concatenate([self._rows(snap, slice(i, i + BLOCK)) @ q for i in range(0, rows, BLOCK)])
+            scores[~alive] = -np.inf
+        else:
+            scores = np.concatenate([self._rows(snap, slots[i:i + BLOCK]) @ q for i in range(0, len(slots), BLOCK)]
+                                    or [np.zeros(0, np.float32)])
+        if len(scores) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+        return [(int(slots[j]), float(scores[j])) for j in top if np.isfinite(scores[j])]
+
+    def _bm25_hits(self, query: str, k: int, cond: str = "", args: Sequence = ()) -> List[Tuple[int, float]]:
+        terms = re.findall(r"\w+", query.lower())
+        if not terms:
+            return []
+        match = " OR ".join(f'"{t}"' for t in dict.fromkeys(terms))
+        # a join, not `rowid IN (subquery)`: FTS5 would score each match against the whole list
+        scoped = f"JOIN obj ON obj.slot = f.rowid WHERE obj_fts MATCH ? AND {cond}" if cond else "WHERE obj_fts MATCH ?"
+        with self.lock:
+            rows = self.con.execute(f"SELECT f.rowid, f.rank FROM obj_fts f {scoped} ORDER BY f.rank LIMIT ?",
+                                    (match, *args, k)).fetchall()
+        return [(slot, -rank) for slot, rank in rows]  # FTS5 rank is bm25 negated
+
+    def hybrid(self, query: str, vector: Optional[Sequence[float]], limit: int, alpha: float = 0.5,
+               where: Optional[Dict] = None) -> List[Dict]:
+        # vector hits are slots of the snapshot, BM25 and properties come from the live table:
+        # a compact() in between (any thread or process) renumbers slots, so search again
+        for _ in range(3):
+            with self.lock:
+                layout = self._meta("layout", "0")
+            hits = self._hybrid(query, vector, limit, alpha, where)
+            with self.lock:
+                if self._meta("layout", "0") == layout:
+                    return hits
+        raise RuntimeError(f"{self.path}: compacted during every search attempt")
+
+    def _hybrid(self, query: str, vector: Optional[Sequence[float]], limit: int, alpha: float,
+                where: Optional[Dict]) -> List[Dict]:
+        snap = self._load()
+        cond, args = self._where(where)
+        allowed = self._allowed(cond, args) if cond else None
+        if allowed is not None and not len(allowed):
+            return []
+        vec = self._vector_hits(snap, vector, limit, allowed) if alpha > 0 and vector is not None and snap[0] else []
+        kw = self._bm25_hits(query, limit, cond, args) if alpha < 1 else []
+        fused: Dict[int, float] = {}
+        for hits, w in ((vec, alpha), (kw, 1 - alpha)):
+            if hits:  # relative score fusion: each list scaled to [0, 1], then weighted
+                lo, hi = min(s for _, s in hits), max(s for _, s in hits)
+                for slot, s in hits:
+                    fused[slot] = fused.get(slot, 0.0) + w * ((s - lo) / (hi - lo) if hi > lo else 1.0)
+        top = sorted(fused.items(), key=lambda x: -x[1])[:limit]
+        if not top:
+            return []
+        with self.lock:
+            props = {s: dict(json.loads(p), text=t) for s, t, p in self.con.execute(
+                f"SELECT slot, text, props FROM obj WHERE slot IN ({','.join('?' * len(top))})", [s for s, _ in top])}
+        top = [(s, score) for s, score in top if s in props]  # deleted since the search
+        return [dict(props[s], _score=score, _rank=i) for i, (s, score) in enumerate(top)]
+
+    def flush(self):
+        rows, _, _, alive, ivf = self._load()
+        live = int(alive.sum())
+        if rows - live > max(live, BLOCK):
+            self.compact()
+        elif IVF_MIN and live >= IVF_MIN and (ivf is None or rows - int(ivf["rows"]) > int(ivf["rows"]) // 5):
+            self.train()
+
+    def compact(self):
+        '''Rewrite the files without dead rows (renumbers slots; drops the IVF index).'''
+        np = self.np
+        with self.lock:
+            self.con.execute("BEGIN IMMEDIATE")
+            try:
+                self._gen = None
+                snap = self._load()
+                live = np.flatnonzero(snap[3])
+                for name, arr in (("vectors", snap[1]), ("scales", snap[2])):
+                    if arr is not None:
+                        with open(self._file(name + ".tmp"), "wb") as f:
+                            for i in range(0, len(live), BLOCK):
+                                f.write(np.ascontiguousarray(arr[live[i:i + BLOCK]]).tobytes())
+                # two passes so no new slot collides with an old one still in place
+                self.con.executemany("UPDATE obj SET slot=? WHERE slot=?", [(-1 - n, int(s)) for n, s in enumerate(live)])
+                self.con.execute("UPDATE obj SET slot = -1 - slot")
+                for name in ("vectors", "scales"):
+                    if os.path.exists(self._file(name + ".tmp")):
+                        os.replace(self._file(name + ".tmp"), self._file(name))
+                if os.path.exists(self._file("ivf.npz")):
+                    os.remove(self._file("ivf.npz"))
+                self._set("rows", len(live))
+                self._set("layout", int(self._meta("layout", "0")) + 1)  # slot numbers changed
+                self._bump()
+                self.con.execute("COMMIT")
+            except BaseException:
+                self.con.execute("ROLLBACK")
+                raise
+
+    def train(self, iters: int = 10):
+        '''(Re)build the IVF index over the current rows: spherical k-means on a sample.'''
+        np = self.np
+        snap = self._load()
+        rows, alive = snap[0], snap[3]
+        live = np.flatnonzero(alive)
+        nlist = max(1, int(math.sqrt(len(live))))
+        rng = np.random.default_rng(0)
+        x = self._rows(snap, np.sort(rng.choice(live, min(len(live), nlist * 40), replace=False)))
+        c = x[rng.choice(len(x), nlist, replace=False)]
+        for _ in range(iters):
+            a = np.argmax(x @ c.T, axis=1)
+            onehot = np.zeros((nlist, len(x)), np.float32)
+            onehot[a, np.arange(len(x))] = 1
+            sums = onehot @ x
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            c = np.where(norms > 0, sums / np.maximum(norms, 1e-12), c)  # an empty list keeps its centroid
+        assign = np.concatenate([np.argmax(self._rows(snap, slice(i, i + BLOCK)) @ c.T, axis=1)
+                                 for i in range(0, rows, BLOCK)])
+        order = np.argsort(assign, kind="stable").astype(np.int64)
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=nlist))])
+        tmp = self._file("ivf.tmp.npz")
+        np.savez(tmp, centroids=c.astype(np.float32), order=order, offsets=offsets, rows=rows)
+        with self.lock:
+            os.replace(tmp, self._file("ivf.npz"))
+            with self.con:
+                self.con.execute("BEGIN IMMEDIATE")
+                self._bump()
+
+    def close(self):
+        with self.lock:
+            self.con.close()
+
+_stores: Dict[str, LocalStore] = {}
+_stores_lock = threading.Lock()
+
+def open_store(collection: str, backend: str = VECTOR_BACKEND, coll=None, host: Optional[str] = None) -> VectorStore:
+    '''The retrieval backend for `collection`. "local" opens (once per process) the embedded
+    index VECTOR_DIR/<collection>; "weaviate" wraps `coll`, by default the pooled client's
+    handle for the collection on `host`.'''
+    if backend == "local":
+        path = os.path.join(VECTOR_DIR, collection)
+        with _stores_lock:
+            if path not in _stores:
+                _stores[path] = LocalStore(path)
+            return _stores[path]
+    if backend != "weaviate":
+        raise ValueError(f"unknown VECTOR_BACKEND {backend!r} (weaviate or local)")
+    if coll is None:
+        from hivemind.resources import uplink as wv_client
+        coll = wv_client.collection(collection, host)
+    return WeaviateStore(coll)
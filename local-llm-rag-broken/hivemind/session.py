@@ -1,189 +1,349 @@
-    from __future__ import annotations
-    import os, json, uuid, pathlib, re
-    from typing import List, Dict
-    from dataclasses import dataclass, field
-    import ollama
-    import weaviate
-    from weaviate.classes.config import Configure
-    from hivemind.resources import lab
+from __future__ import annotations
+import os, json, uuid, pathlib, re, asyncio, hashlib, zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional
+from dataclasses import dataclass, field
+import ollama
+from hivemind.resources import lab, recall, sift, loom, uplink, pulse, engram, vault
 
+OLLAMA_ENDPOINT = os.environ.get("OLLAMA_ENDPOINT", "http://localhost:11434")
+EMBED_MODEL = os.environ.get("EMBED_MODEL", "bge-m3")
+QUERY_CACHE = os.environ.get("QUERY_CACHE", "")  # default: ~/.cache/local-llm-rag/<collection>.query.db
+QUERY_CACHE_TTL = float(os.environ.get("QUERY_CACHE_TTL", "600"))
+NUM_CTX = int(os.environ.get("NUM_CTX", "8192"))
+ANSWER_TOKENS = int(os.environ.get("ANSWER_TOKENS", "1024"))
+CONTEXT_TOKENIZER = os.environ.get("CONTEXT_TOKENIZER", "")
+SUMMARY_MODEL = os.environ.get("SUMMARY_MODEL", "qwen3:14b")  # folds old turns into the rolling summary
+KEEP_ALIVE = os.environ.get("OLLAMA_KEEP_ALIVE", "30m")  # an unloaded model loses its KV cache
+# fan-out requests in flight per model; drones on different models always run side by side
+MODEL_PARALLEL = int(os.environ.get("MODEL_PARALLEL", os.environ.get("OLLAMA_NUM_PARALLEL", "1")))
+BRAIN_CONTEXTS = int(os.environ.get("BRAIN_CONTEXTS", "32"))  # recent brainscan contexts kept for hive.context(ref)
+
+MODERATOR_PROMPT = ("The Host asked:\n{prompt}\n\nThe Drones replied:\n\n{replies}\n\n"
+                    "As moderator, merge these replies: where they agree, where they differ and why, "
+                    "and one combined answer for the Host.")
+
+def _run(coro):
+    # Jupyter already runs an event loop on this thread; give the fan-out its own
     try:
-        from IPython.display import display, Markdown
-        _HAS_IPY = True
-    except Exception:
-        _HAS_IPY = False
-
-    @dataclass
-    class Drone:
-        name: str
-        model: str
-        persona: str = "You are a helpful assistant."
-        options: Dict = field(default_factory=dict)
-
-    class HiveMind:
-        def __init__(self, execute: bool = False, mode: str = "moderated"):
-            self.id = str(uuid.uuid4())
-            self.drones: Dict[str, Drone] = {}
-            self.history: List[Dict[str, str]] = []
-            self.execute = execute
-            self.mode = mode
-            self.workspace_dir = "the_wormhole"
-            self.weaviate_collection = "TheBrain"
-            pathlib.Path(self.workspace_dir).mkdir(exist_ok=True)
-            self._weaviate_client = None
-
-        def _get_weaviate_client(self):
-            if self._weaviate_client is None:
-                try:
-                    self._weaviate_client = weaviate.connect_to_local(grpc_port=50051, http_host="localhost", http_port=8080)
-                except Exception as e:
-                    raise ConnectionError("Failed to connect to Weaviate. Is it running? (`make awaken_hive`)") from e
-            return self._weaviate_client
-
-        def add_drone(self, name: str, model: str, persona: str, options: Dict = {}):
-            if name in self.drones:
-                raise ValueError(f"Drone with name '{name}' already exists in the swarm.")
-            if "Host" in name or "Brain" in name:
-                raise ValueError("Drone name 'Host' or 'Brain' is reserved.")
-            self.drones[name] = Drone(name=name, model=model, persona=persona, options=options)
-
-        def list_drones(self):
-            if not self.drones:
-                print("No Drones in this swarm.")
-                return
-            print("Drones in the Swarm:")
-            for name, d in self.drones.items():
-                print(f"- {name} (Model: {d.model})")
-
-        def _execute_code_blocks(self, prompt: str) -> str:
-            fenced_block_pattern = re.compile(r"```(python|sh)\n(.*?)```", re.DOTALL)
-            matches = list(fenced_block_pattern.finditer(prompt))
-            if not matches:
-                return ""
-            results = []
-            for match in matches:
-                lang, code = match.groups()
-                header = f"--- EXECUTING {lang.upper()} ---"
-                try:
-                    if lang == "python":
-                        fname = f"script_{uuid.uuid4().hex[:8]}.py"
-                        fpath = os.path.join(self.workspace_dir, fname)
-                        with open(fpath, "w") as f:
-                            f.write(code.strip())
-                        exit_code, out = lab.run_python_script_in_sandbox(fpath)
-                        os.remove(fpath)
-                    else:
-                        exit_code, out = lab.run_in_sandbox(code.strip())
-                    body = f"EXIT CODE: {exit_code}\n\nOUTPUT:\n{out}"
-                except Exception as e:
-                    body = f"EXECUTION FAILED:\n{e}"
-                results.append(f"{header}\n{body}\n--- END ---")
-            return "\n\n" + "\n".join(results)
-
-        def to_markdown(self) -> str:
-            lines = [f"# HiveMind Session\n"]
-            for msg in self.history:
-                name, content = msg["name"], msg["content"].rstrip()
-                if name == "Host":
-                    lines.append(f"**Host:**\n\n{content}\n")
-                else:
-                    lines.append(f"**{name}:**\n\n{content}\n")
-            return "\n".join(lines).strip() + "\n"
-
-        def _display_markdown(self, md_text: str, display_handle=None):
-            if not _HAS_IPY:
-                print(md_text)
-                return None
-            if display_handle is None:
-                return display(Markdown(md_text), display_id=True)
-            display_handle.update(Markdown(md_text))
-            return display_handle
-
-        def save_json(self, path: str):
-            data = {
-                "id": self.id,
-                "drones": {name: d.__dict__ for name, d in self.drones.items()},
-                "history": self.history,
-                "mode": self.mode,
-                "execute": self.execute
-            }
-            pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
-            with open(path, "w") as f:
-                json.dump(data, f, indent=2)
-
-        @classmethod
-        def load_json(cls, path: str) -> "HiveMind":
-            data = json.load(open(path))
-            hive = cls(execute=data.get("execute", False), mode=data.get("mode", "moderated"))
-            hive.id = data.get("id", str(uuid.uuid4()))
-            hive.history = data.get("history", [])
-            drones_data = data.get("drones", {})
-            for name, d_data in drones_data.items():
-                hive.drones[name] = Drone(**d_data)
-            return hive
-
-        def ask(self, prompt: str, stream: bool = True):
-            target_match = re.search(r"@(\w+)", prompt)
-            if not target_match:
-                print("Host, please direct your message to a Drone using '@name'.")
-                return
-            target_name = target_match.group(1)
-            if target_name not in self.drones:
-                print(f"Drone '{target_name}' not found in the swarm.")
-                return
-            target_drone = self.drones[target_name]
-            exec_out = self._execute_code_blocks(prompt) if self.execute else ""
-            full_prompt = prompt + exec_out if exec_out else prompt
-            self.history.append({"name": "Host", "content": full_prompt})
-            messages = [{"role": "system", "content": target_drone.persona}]
-            for msg in self.history:
-                content_with_speaker = f"[{msg['name']}]: {msg['content']}"
-                if msg['name'] == 'Host' or msg['name'] != target_name:
-                    messages.append({"role": "user", "content": content_with_speaker})
-                else:
-                    messages.append({"role": "assistant", "content": msg['content']})
-            self._stream_and_display(target_name, target_drone.model, messages, stream, target_drone.options)
-
-        def brainscan(self, drone_name: str, query: str, top_k: int = 5, stream: bool = True):
-            if drone_name not in self.drones:
-                print(f"Drone '{drone_name}' not found in the swarm.")
-                return
-            target_drone = self.drones[drone_name]
-            client = self._get_weaviate_client()
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1) as ex:
+        return ex.submit(asyncio.run, coro).result()
+
+@dataclass
+class Drone:
+    name: str
+    model: str
+    persona: str = "You are a helpful assistant."
+    options: Dict = field(default_factory=dict)
+
+class HiveMind:
+    def __init__(self, execute: bool = False, mode: str = "moderated", moderator: Optional[str] = None,
+                 parallel_blocks: bool = False):
+        self.id = str(uuid.uuid4())
+        self.drones: Dict[str, Drone] = {}
+        self.history: List[Dict[str, str]] = []
+        self.execute = execute
+        self.parallel_blocks = parallel_blocks  # run consecutive python blocks concurrently; only for independent ones
+        self.mode = mode  # "moderated": a fan-out ends with the moderator merging the replies
+        self.moderator = moderator  # drone that moderates; default the first one addressed
+        self.workspace_dir = "the_wormhole"
+        self.weaviate_collection = "TheBrain"
+        self.backend = vault.VECTOR_BACKEND  # "local": the embedded index, no Weaviate needed
+        pathlib.Path(self.workspace_dir).mkdir(exist_ok=True)
+        self._query_cache = None
+        self.retrieval_stats: Dict = {}
+        self._transcript = pulse.Transcript(self._msg_md)
+        self.contexts: "OrderedDict[str, bytes]" = OrderedDict()  # ref -> zlib'd context, newest last
+        self._views: Dict[str, List[Dict]] = {}
+        self._shared: List[Dict] = []  # history entries as user messages, shared by every view
+        self._views_of = self.history
+        self.window = engram.ChatWindow(self._summarize, loom.token_counter(CONTEXT_TOKENIZER),
+                                        text=lambda m: f"[{m['name']}]: {m['content']}",
+                                        turn=lambda m: m["name"] == "Host")
+
+    def _get_weaviate_client(self):
+        # process-wide pooled client (WEAVIATE_HOST), health-checked and closed at exit
+        try:
+            return uplink.get_client()
+        except Exception as e:
+            raise ConnectionError("Failed to connect to Weaviate. Is it running? (`make awaken_hive`)") from e
+
+    def _store(self) -> vault.VectorStore:
+        if self.backend == "local":
+            return vault.open_store(self.weaviate_collection, "local")
+        coll = self._get_weaviate_client().collections.get(self.weaviate_collection)
+        return vault.open_store(self.weaviate_collection, self.backend, coll)
+
+    def _recall(self, query: str, top_k: int, where: Dict) -> List[Dict]:
+        # hybrid over-fetch + rerank; repeated and templated queries skip all of it via the cache
+        if self._query_cache is None:
+            ol = ollama.Client(host=OLLAMA_ENDPOINT)
+            path = QUERY_CACHE or os.path.expanduser(f"~/.cache/local-llm-rag/{self.weaviate_collection}.query.db")
+            self._query_cache = recall.QueryCache(
+                path, EMBED_MODEL,
+                lambda t: ol.embed(model=EMBED_MODEL, input=t)["embeddings"][0], ttl=QUERY_CACHE_TTL)
+        cache, stats = self._query_cache, {"cached": True}
+        def fetch():
+            hits, st = sift.retrieve(query, cache.embed, self._store, top_k, where=where)
+            stats.update(st, cached=False)
+            return hits
+        rr = sift.RERANK_MODEL if sift._HAS_CE else None
+        key = (self.weaviate_collection, self.backend, "hybrid", query, top_k, sift.FETCH_K, sift.HYBRID_ALPHA, rr, where)
+        hits = cache.hits(key, fetch)
+        self.retrieval_stats = stats
+        return hits
+
+    def add_drone(self, name: str, model: str, persona: str, options: Dict = {}):
+        if name in self.drones:
+            raise ValueError(f"Drone with name '{name}' already exists in the swarm.")
+        if "Host" in name or "Brain" in name or name in ("Moderator", "all"):
+            raise ValueError("Drone names 'Host', 'Brain', 'Moderator' and 'all' are reserved.")
+        self.drones[name] = Drone(name=name, model=model, persona=persona, options=options)
+
+    def list_drones(self):
+        if not self.drones:
+            print("No Drones in this swarm.")
+            return
+        print("Drones in the Swarm:")
+        for name, d in self.drones.items():
+            print(f"- {name} (Model: {d.model})")
+
+    def _execute_code_blocks(self, prompt: str) -> str:
+        fenced_block_pattern = re.compile(r"```(python|sh)\n(.*?)```", re.DOTALL)
+        blocks = [m.groups() for m in fenced_block_pattern.finditer(prompt)]
+        if not blocks:
+            return ""
+
+        def run(i: int) -> str:
+            (lang, code), view = blocks[i], views[i]
+            shown = lab.HeadTail(lab.SANDBOX_MAX_OUTPUT)  # the live view is capped like the result
+
+            def on_output(chunk: str):
+                shown.write(chunk)
+                view.update(shown.text())
+            header = f"--- EXECUTING {lang.upper()} ---"
             try:
-                docs = client.collections.get(self.weaviate_collection)
-                hits = docs.query.near_text(query=query, limit=top_k).objects
-                context = "\n\n---\n\n".join([h.properties.get("text", "") for h in hits])
+                if lang == "python":
+                    # warm worker, code sent over the exec socket
+                    exit_code, out = lab.run_python(code.strip(), on_output=on_output)
+                else:
+                    exit_code, out = lab.run_in_sandbox(code.strip(), on_output=on_output)
+                body = f"EXIT CODE: {exit_code}\n\nOUTPUT:\n{out}"
+                view.close(f"{out}\n[exit code {exit_code}]")
             except Exception as e:
-                print(f"Error querying TheBrain: {e}. Did you run `make ingest`?")
-                return
-
-            host_prompt = f"Host: Using the following knowledge from TheBrain, answer this query: "{query}""
-            self.history.append({"name": "Host", "content": host_prompt})
-            self.history.append({"name": "TheBrain", "content": f"CONTEXT:\n{context}"})
-
-            messages = [
-                {"role": "system", "content": target_drone.persona},
-                {"role": "user", "content": f"Using the following knowledge from TheBrain, answer this query: "{query}"
-
-CONTEXT:
-{context}"}
-            ]
-            self._stream_and_display(drone_name, target_drone.model, messages, stream, target_drone.options)
-
-        def _stream_and_display(self, name: str, model: str, messages: List, stream: bool, options: Dict):
-            handle = self._display_markdown(self.to_markdown())
-            full_reply = ""
-            if stream:
-                stream_buffer = ollama.chat(model=model, messages=messages, stream=True, options=options)
-                for part in stream_buffer:
-                    delta = part.get("message", {}).get("content", "")
-                    full_reply += delta
-                    if _HAS_IPY:
-                        temp_md = self.to_markdown() + f"**{name}:**\n\n{full_reply + ' ▌'}\n"
-                        self._display_markdown(temp_md, display_handle=handle)
-            else:
-                res = ollama.chat(model=model, messages=messages, options=options)
-                full_reply = res["message"]["content"]
-            self.history.append({"name": name, "content": full_reply})
-            self._display_markdown(self.to_markdown(), display_handle=handle)
+                body = f"EXECUTION FAILED:\n{e}"
+                view.close(body)
+            return f"{header}\n{body}\n--- END ---"
+
+        # output streams into one live view per block, in prompt order
+        views = [pulse.MarkdownStream("", f"**{lang} block {i + 1}:**\n\n```\n", footer="\n```")
+                 for i, (lang, _) in enumerate(blocks)]
+        # in order by default: a block may read what the one before wrote. With parallel_blocks,
+        # consecutive python blocks run concurrently and a shell block waits for them and runs alone
+        if not self.parallel_blocks:
+            return "\n\n" + "\n".join(run(i) for i in range(len(blocks)))
+        results, batch = [], []
+        with ThreadPoolExecutor(max_workers=lab.SANDBOX_WORKERS) as ex:
+            for i in range(len(blocks) + 1):
+                if i < len(blocks) and blocks[i][0] == "python":
+                    batch.append(i)
+                    continue
+                results += ex.map(run, batch)
+                batch = []
+                if i < len(blocks):
+                    results.append(run(i))
+        return "\n\n" + "\n".join(results)
+
+    def to_markdown(self) -> str:
+        parts = self._transcript.parts(self.history)
+        return "\n".join(["# HiveMind Session\n", *parts]).strip() + "\n"
+
+    @staticmethod
+    def _msg_md(msg: Dict[str, str]) -> str:
+        return f"**{msg['name']}:**\n\n{msg['content'].rstrip()}\n"
+
+    def save_json(self, path: str):
+        data = {
+            "id": self.id,
+            "drones": {name: d.__dict__ for name, d in self.drones.items()},
+            "history": self.history,
+            "window": self.window.state(),
+            "mode": self.mode,
+            "moderator": self.moderator,
+            "execute": self.execute
+        }
+        pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(data, f, indent=2)
+
+    @classmethod
+    def load_json(cls, path: str) -> "HiveMind":
+        data = json.load(open(path))
+        hive = cls(execute=data.get("execute", False), mode=data.get("mode", "moderated"),
+                   moderator=data.get("moderator"))
+        hive.id = data.get("id", str(uuid.uuid4()))
+        hive.history = data.get("history", [])
+        hive.window.restore(data.get("window"))
+        drones_data = data.get("drones", {})
+        for name, d_data in drones_data.items():
+            hive.drones[name] = Drone(**d_data)
+        return hive
+
+    def ask(self, prompt: str, stream: bool = True):
+        '''Send prompt to the drones it @mentions. Several mentions (or @all) fan out: the
+        drones answer concurrently, side by side, and in "moderated" mode the moderator
+        then merges their replies.'''
+        names = list(dict.fromkeys(re.findall(r"@(\w+)", prompt)))
+        if not names:
+            print("Host, please direct your message to a Drone using '@name'.")
+            return
+        if "all" in names:
+            names = list(self.drones)
+        missing = [n for n in names if n not in self.drones]
+        if missing or not names:
+            print(f"Drone '{missing[0] if missing else 'all'}' not found in the swarm.")
+            return
+        exec_out = self._execute_code_blocks(prompt) if self.execute else ""
+        full_prompt = prompt + exec_out if exec_out else prompt
+        self.history.append({"name": "Host", "content": full_prompt})
+        if len(names) == 1:
+            messages, options = self._messages_for(names[0])
+            self._stream_and_display(names[0], self.drones[names[0]].model, messages, stream, options)
+            return
+        replies = self._fan_out(names, stream)
+        if self.mode == "moderated" and replies:
+            mod = self.drones.get(self.moderator) or self.drones[names[0]]
+            text = "\n\n".join(f"[{n}]:\n{r}" for n, r in replies.items())
+            messages = [{"role": "system", "content": mod.persona},
+                        {"role": "user", "content": MODERATOR_PROMPT.format(prompt=full_prompt, replies=text)}]
+            self._stream_and_display("Moderator", mod.model, messages, stream, {"num_ctx": NUM_CTX, **mod.options})
+
+    def _view(self, name: str) -> List[Dict]:
+        '''History as drone `name` sees it, one message per entry: its own turns as assistant,
+        everyone else's as "[speaker]: ..." user turns. Views are extended in place as
+        history grows (entries are formatted once and shared between drones) and rebuilt
+        only if history is replaced or shrinks.'''
+        if self._views_of is not self.history or len(self._shared) > len(self.history):
+            self._views, self._shared, self._views_of = {}, [], self.history
+        for msg in self.history[len(self._shared):]:
+            self._shared.append({"role": "user", "content": f"[{msg['name']}]: {msg['content']}"})
+        view = self._views.setdefault(name, [])
+        for i in range(len(view), len(self.history)):
+            msg = self.history[i]
+            view.append({"role": "assistant", "content": msg["content"]} if msg["name"] == name else self._shared[i])
+        return view
+
+    def _messages_for(self, name: str):
+        drone = self.drones[name]
+        options = {"num_ctx": NUM_CTX, **drone.options}
+        budget = options["num_ctx"] - ANSWER_TOKENS - self.window.count_text(drone.persona)
+        summary, _ = self.window.window(self.history, budget)
+        persona = drone.persona
+        if summary:
+            persona += f"\n\nSummary of the earlier conversation:\n{summary}"
+        return [{"role": "system", "content": persona}, *self._view(name)[self.window.folded:]], options
+
+    def _fan_out(self, names: List[str], stream: bool) -> Dict[str, str]:
+        '''Run the drones concurrently on one AsyncClient, at most MODEL_PARALLEL per model.
+        Every drone sees the history up to the Host's prompt; replies are appended in
+        mention order once all are done. Failed drones are shown but not recorded.'''
+        jobs = {n: self._messages_for(n) for n in names}
+        view = pulse.MarkdownColumns(self.to_markdown(), [f"**{n}:**\n\n" for n in names])
+
+        async def run():
+            client = ollama.AsyncClient(host=OLLAMA_ENDPOINT)
+            limits = {m: asyncio.Semaphore(MODEL_PARALLEL) for m in {self.drones[n].model for n in names}}
+
+            async def one(i: int, name: str) -> str:
+                model, (messages, options) = self.drones[name].model, jobs[name]
+                reply = ""
+                async with limits[model]:
+                    if stream:
+                        async for part in await client.chat(model=model, messages=messages, stream=True,
+                                                            options=options, keep_alive=KEEP_ALIVE):
+                            reply += part.get("message", {}).get("content", "")
+                            view.update(i, reply)
+                    else:
+                        res = await client.chat(model=model, messages=messages, options=options, keep_alive=KEEP_ALIVE)
+                        reply = res["message"]["content"]
+                view.close(i, reply)
+                return reply
+
+            async def guarded(i: int, name: str):
+                try:
+                    return await one(i, name)
+                except Exception as e:
+                    view.close(i, f"*{type(e).__name__}: {e}*")
+                    return e
+            return await asyncio.gather(*(guarded(i, n) for i, n in enumerate(names)))
+
+        replies = {n: r for n, r in zip(names, _run(run())) if isinstance(r, str)}
+        self.history.extend({"name": n, "content": r} for n, r in replies.items())
+        return replies
+
+    def _summarize(self, prompt: str) -> str:
+        res = ollama.chat(model=SUMMARY_MODEL, messages=[{"role": "user", "content": prompt}], keep_alive=KEEP_ALIVE,
+                          options={"temperature": 0.2, "num_ctx": NUM_CTX, "num_predict": engram.SUMMARY_TOKENS})
+        return res["message"]["content"]
+
+    def brainscan(self, drone_name: str, query: str, top_k: int = 5, stream: bool = True, **scope):
+        '''scope narrows the search, e.g. under="~/notes", ext=["md"], since=<epoch>; see vault.scope.'''
+        if drone_name not in self.drones:
+            print(f"Drone '{drone_name}' not found in the swarm.")
+            return
+        target_drone = self.drones[drone_name]
+        try:
+            if scope.get("under"):
+                scope["under"] = os.path.abspath(os.path.expanduser(scope["under"]))
+            hits = self._recall(query, top_k, vault.scope(**scope))
+        except Exception as e:
+            print(f"Error querying TheBrain: {e}. Did you run `make ingest`?")
+            return
+
+        ask = f'Using the following knowledge from TheBrain, answer this query: "{query}"'
+        options = {"num_ctx": NUM_CTX, **target_drone.options}
+        count = loom.token_counter(CONTEXT_TOKENIZER)
+        budget = loom.context_budget(options["num_ctx"], target_drone.persona + ask, ANSWER_TOKENS, count)
+        context, packed = loom.pack(hits, budget, count)
+        self.retrieval_stats.update(context_tokens=packed["tokens"], budget=budget, kept=packed["kept"])
+        self.history.append({"name": "Host", "content": f"Host: {ask}"})
+        self.history.append({"name": "TheBrain", "content": self._store_context(context, packed)})
+
+        messages = [
+            {"role": "system", "content": target_drone.persona},
+            {"role": "user", "content": f"{ask}\n\nCONTEXT:\n{context}"}
+        ]
+        self._stream_and_display(drone_name, target_drone.model, messages, stream, options)
+
+    def _store_context(self, context: str, packed: Dict) -> str:
+        # history keeps a one-line reference; the drone gets the full text once, in this request
+        ref = hashlib.sha1(context.encode()).hexdigest()[:12]
+        self.contexts[ref] = zlib.compress(context.encode())
+        self.contexts.move_to_end(ref)
+        while len(self.contexts) > BRAIN_CONTEXTS:
+            self.contexts.popitem(last=False)
+        srcs = packed.get("sources") or []
+        more = f" and {len(srcs) - 3} more" if len(srcs) > 3 else ""
+        return (f"CONTEXT ref:{ref} ({packed['kept']} passages, {packed['tokens']} tokens "
+                f"from {', '.join(srcs[:3]) or 'TheBrain'}{more})")
+
+    def context(self, ref: str) -> str:
+        '''Full text of a recent brainscan context, by the ref shown in history.'''
+        return zlib.decompress(self.contexts[ref]).decode()
+
+    def _stream_and_display(self, name: str, model: str, messages: List, stream: bool, options: Dict):
+        view = pulse.MarkdownStream(self.to_markdown(), f"**{name}:**\n\n")
+        full_reply = ""
+        if stream:
+            for part in ollama.chat(model=model, messages=messages, stream=True, options=options, keep_alive=KEEP_ALIVE):
+                full_reply += part.get("message", {}).get("content", "")
+                view.update(full_reply)
+        else:
+            res = ollama.chat(model=model, messages=messages, options=options, keep_alive=KEEP_ALIVE)
+            full_reply = res["message"]["content"]
+        self.history.append({"name": name, "content": full_reply})
+        view.close(full_reply)
@@ -1,32 +1,113 @@
-import os, sys, textwrap, weaviate, ollama
+import os, sys, time, textwrap, urllib.error
+from datetime import datetime
+from hivemind.resources.recall import QueryCache
+from hivemind.resources import sift, loom, relay, vault
 
 COLLECTION = os.environ.get("WEAVIATE_COLLECTION","TheBrain")
 GEN_MODEL = os.environ.get("GEN_MODEL","qwen3:14b")
 TOPK = int(os.environ.get("TOPK","8"))
+OLLAMA_ENDPOINT = os.environ.get("OLLAMA_ENDPOINT","http://localhost:11434")
+EMBED_MODEL = os.environ.get("EMBED_MODEL","bge-m3")
+QUERY_CACHE = os.environ.get("QUERY_CACHE", os.path.expanduser(f"~/.cache/local-llm-rag/{COLLECTION}.query.db"))
+QUERY_CACHE_TTL = float(os.environ.get("QUERY_CACHE_TTL","600"))
+NUM_CTX = int(os.environ.get("NUM_CTX","8192"))
+ANSWER_TOKENS = int(os.environ.get("ANSWER_TOKENS","1024"))
+CONTEXT_TOKENIZER = os.environ.get("CONTEXT_TOKENIZER","")
+KEEP_ALIVE = os.environ.get("OLLAMA_KEEP_ALIVE","30m")
+BRAIN_SERVER = os.environ.get("BRAIN_SERVER","http://127.0.0.1:8765")  # `make serve`; empty = always local
+# search scope; SEARCH_EXT / SEARCH_SECTION are comma-separated, SEARCH_SINCE is YYYY-MM-DD
+SEARCH_UNDER = os.environ.get("SEARCH_UNDER","")
+SEARCH_EXT = [e for e in os.environ.get("SEARCH_EXT","").split(",") if e]
+SEARCH_SECTION = [s for s in os.environ.get("SEARCH_SECTION","").split(",") if s]
+SEARCH_SINCE = os.environ.get("SEARCH_SINCE","")
 
-def main():
-    q = os.environ.get("QUERY") or (sys.argv[1] if len(sys.argv)>1 else f"Summarize the contents of {COLLECTION}.")
-    client = weaviate.connect_to_local(grpc_port=50051, http_host="localhost", http_port=8080)
-    try:
-        docs = client.collections.get(COLLECTION)
-        hits = docs.query.near_text(query=q, limit=TOPK).objects
-        if not hits:
-            print(f"No results in collection '{COLLECTION}'. Did you run `make ingest`?")
-            return
-        context = "\n\n---\n\n".join([h.properties.get("text","") for h in hits])
-        prompt = f"""You are an assistant answering questions based on knowledge from TheBrain.
+PROMPT = """You are an assistant answering questions based on knowledge from TheBrain.
 Use the provided context to answer the user query.
 
 # Query
 {q}
 
-# Context from TheBrain (top {TOPK} chunks)
+# Context from TheBrain (top {k} chunks)
 {context}
 """
-        resp = ollama.chat(model=GEN_MODEL, messages=[{"role":"user","content":prompt}], options={"temperature":0.2})
-        print(textwrap.fill(resp["message"]["content"], width=100))
+
+def open_cache(keep_alive=None) -> QueryCache:
+    # embeds the query here (same model as the collection's vectorizer) so it can be cached
+    import ollama
+    ol = ollama.Client(host=OLLAMA_ENDPOINT)
+    embed = lambda t: ol.embed(model=EMBED_MODEL, input=t, keep_alive=keep_alive)["embeddings"][0]
+    return QueryCache(QUERY_CACHE, EMBED_MODEL, embed, ttl=QUERY_CACHE_TTL)
+
+def retrieve(q: str, k: int = TOPK, cache: QueryCache = None, where=None):
+    # `where` is a vault.scope(); None means the default one, which skips stub objects
+    where = vault.scope() if where is None else where
+    own = cache is None
+    cache = cache or open_cache()
+    stats = {"cached": True}
+    def fetch():
+        hits, st = sift.retrieve(q, cache.embed, lambda: vault.open_store(COLLECTION), k, where=where)
+        stats.update(st, cached=False)
+        return hits
+    try:
+        rr = sift.RERANK_MODEL if sift._HAS_CE else None
+        key = (COLLECTION, vault.VECTOR_BACKEND, "hybrid", q, k, sift.FETCH_K, sift.HYBRID_ALPHA, rr, where)
+        return cache.hits(key, fetch), stats
     finally:
-        client.close()
+        if own:
+            cache.close()
+
+def build_prompt(q: str, hits, stats) -> str:
+    # a fixed token budget keeps prefill predictable and stops Ollama truncating the prompt
+    count = loom.token_counter(CONTEXT_TOKENIZER)
+    budget = loom.context_budget(NUM_CTX, PROMPT.format(q=q, k=TOPK, context=""), ANSWER_TOKENS, count)
+    context, packed = loom.pack(hits, budget, count)
+    stats.update(context_tokens=packed["tokens"], budget=budget, kept=packed["kept"],
+                 dropped_dup=packed["dropped_dup"], merged=packed["merged"])
+    return PROMPT.format(q=q, k=TOPK, context=context)
+
+def no_results() -> str:
+    return f"No results in collection '{COLLECTION}'. Did you run `make ingest`?"
+
+def env_scope():
+    return vault.scope(SEARCH_UNDER and os.path.abspath(os.path.expanduser(SEARCH_UNDER)), SEARCH_EXT, SEARCH_SECTION,
+                       since=SEARCH_SINCE and datetime.fromisoformat(SEARCH_SINCE).timestamp())
+
+def ask_server(q: str, where=None) -> bool:
+    # stream from a running tools/serve.py; False if none is listening
+    stats = {}
+    try:
+        for event, data in relay.stream_remote(BRAIN_SERVER, {"query": q, "top_k": TOPK, "where": where}):
+            if event == "message":
+                sys.stdout.write(data["t"]); sys.stdout.flush()
+            elif event == "error":
+                print(data["error"])
+                return True
+            else:
+                stats.update(data)
+    except (urllib.error.URLError, ConnectionError):
+        if stats:
+            raise
+        return False
+    print()
+    sift.report(stats)
+    return True
+
+def main():
+    q = os.environ.get("QUERY") or (sys.argv[1] if len(sys.argv)>1 else f"Summarize the contents of {COLLECTION}.")
+    where = env_scope()
+    if BRAIN_SERVER and "--local" not in sys.argv and ask_server(q, where):
+        return
+    hits, stats = retrieve(q, where=where)
+    if not hits:
+        print(no_results())
+        return
+    prompt = build_prompt(q, hits, stats)
+    import ollama  # not needed when the server answered
+    t = time.perf_counter()
+    resp = ollama.chat(model=GEN_MODEL, messages=[{"role":"user","content":prompt}], options={"temperature":0.2, "num_ctx":NUM_CTX})
+    print(textwrap.fill(resp["message"]["content"], width=100))
+    stats["generate_ms"] = (time.perf_counter() - t) * 1000
+    sift.report(stats)
 
 if __name__ == "__main__":
     main()
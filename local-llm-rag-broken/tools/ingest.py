@@ -1,20 +1,22 @@
-import os, hashlib, pathlib
+import os, time, hashlib, pathlib, argparse, uuid
 from typing import Iterable, Dict, Any
-import weaviate
-from weaviate.classes.config import Configure
-from unstructured.partition.auto import partition
-from unstructured.chunking.title import chunk_by_title
-from tqdm import tqdm
-import ollama
-from hivemind.resources.codex import extract_ipynb_text, try_export_mathematica_nb_to_md
+from hivemind.resources.scout import walk_files, with_progress, parse_size
+from hivemind.resources.sentinel import watch
+from hivemind.resources.recall import bump_generation
+from hivemind.resources import uplink, vault
 
 OLLAMA_ENDPOINT = os.environ.get("OLLAMA_ENDPOINT", "http://localhost:11434")
 COLLECTION = os.environ.get("WEAVIATE_COLLECTION", "TheBrain")
 EMBED_MODEL = os.environ.get("EMBED_MODEL", "bge-m3")
 SUMMARY_MODEL = os.environ.get("SUMMARY_MODEL", "qwen3:14b")
+INCLUDE = [g for g in os.environ.get("INGEST_INCLUDE", "").split(",") if g]
+EXCLUDE = [g for g in os.environ.get("INGEST_EXCLUDE", "").split(",") if g]
+MAX_SIZE = os.environ.get("INGEST_MAX_SIZE", "")
+QUERY_CACHE = os.environ.get("QUERY_CACHE", os.path.expanduser(f"~/.cache/local-llm-rag/{COLLECTION}.query.db"))
+VECTOR_BACKEND = vault.VECTOR_BACKEND  # weaviate | local
 
 def _connect():
-    return weaviate.connect_to_local(grpc_port=50051, http_host="localhost", http_port=8080)
+    return uplink.get_client()
 
 def sha256_file(path: str) -> str:
     h = hashlib.sha256()
@@ -23,22 +25,27 @@ def sha256_file(path: str) -> str:
             h.update(chunk)
     return h.hexdigest()
 
+def object_uuid(o: Dict[str, Any]) -> str:
+    # same file, part and content -> same id, so uploading again overwrites instead of adding a copy
+    part = o["section"] if o.get("chunk") is None else o["chunk"]
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{o['source']}|{part}|{o.get('hash') or ''}"))
+
 def summarize_text(text: str, fname: str) -> str:
     prompt = (f"Summarize this file for an index. Include title guess, topics, "
               f"notable functions/classes if code, and 1-2 tags.\n\n"
               f"FILE: {fname}\n\nCONTENT:\n{text[:8000]}")
+    import ollama
     r = ollama.chat(model=SUMMARY_MODEL, messages=[{"role":"user","content":prompt}], options={"temperature":0.2})
     return r["message"]["content"].strip()
 
 def chunks_from_path(p: pathlib.Path) -> Iterable[Dict[str, Any]]:
     if p.suffix.lower() == ".ipynb":
-        ipy = extract_ipynb_text(str(p))
-        CH = 1200; OL = 150
-        blocks = [ipy[i:i+CH] for i in range(0, len(ipy), CH-OL)]
-        for b in blocks:
-            yield {"text": b, "source": str(p), "section": "notebook", "page": None}
+        from hivemind.resources.codex import notebook_chunks
+        for ch in notebook_chunks(str(p), max_chars=1200, overlap=150):
+            yield dict(ch, source=str(p), section="notebook", page=None)
         return
     if p.suffix.lower() == ".nb":
+        from hivemind.resources.codex import try_export_mathematica_nb_to_md
         md = try_export_mathematica_nb_to_md(str(p))
         if md and os.path.exists(md):
             for c in chunks_from_path(pathlib.Path(md)):
@@ -46,6 +53,9 @@ def chunks_from_path(p: pathlib.Path) -> Iterable[Dict[str, Any]]:
             try: os.remove(md)
             except: pass
             return
+    # Unstructured takes seconds to import; a watch run with nothing to parse never loads it
+    from unstructured.partition.auto import partition
+    from unstructured.chunking.title import chunk_by_title
     try:
         elements = partition(filename=str(p), strategy="auto")
         chunks = chunk_by_title(elements, max_characters=1200, new_after_n_chars=900, overlap=150)
@@ -60,45 +70,129 @@ def chunks_from_path(p: pathlib.Path) -> Iterable[Dict[str, Any]]:
     yield {"text": desc, "source": str(p), "section": "binary", "page": None}
 
 def ensure_collection(client):
-    try:
+    '''Create the collection with an explicit schema on first use: only `text` is vectorized
+    and searchable, the rest are filterable keywords/ints (see vault.weaviate_properties).'''
+    from weaviate.classes.config import Configure
+    if client.collections.exists(COLLECTION):
         return client.collections.get(COLLECTION)
-    except Exception:
-        return client.collections.create(
-            name=COLLECTION,
-            vectorizer_config=Configure.Vectorizer.text2vec_ollama(api_endpoint=OLLAMA_ENDPOINT, model=EMBED_MODEL),
-            generative_config=Configure.Generative.ollama(api_endpoint=OLLAMA_ENDPOINT, model="llama3.1:8b"),
-        )
+    return client.collections.create(
+        name=COLLECTION,
+        properties=vault.weaviate_properties(),
+        vector_index_config=vault.weaviate_vector_index(),
+        vectorizer_config=Configure.Vectorizer.text2vec_ollama(api_endpoint=OLLAMA_ENDPOINT, model=EMBED_MODEL,
+                                                               vectorize_collection_name=False),
+        generative_config=Configure.Generative.ollama(api_endpoint=OLLAMA_ENDPOINT, model="llama3.1:8b"),
+    )
+
+
+def open_backend(backend: str = VECTOR_BACKEND) -> vault.VectorStore:
+    if backend == "local":
+        return vault.open_store(COLLECTION, "local")
+    return vault.open_store(COLLECTION, backend, ensure_collection(_connect()))
+
+def upload(store: vault.VectorStore, to_insert: list):
+    # the local backend has no vectorizer: embed with the collection's model here
+    if not to_insert:
+        return
+    vecs = [None] * len(to_insert)
+    if store.needs_vectors:
+        import ollama
+        ol = ollama.Client(host=OLLAMA_ENDPOINT)
+        vecs = ol.embed(model=EMBED_MODEL, input=[o["text"] for o in to_insert])["embeddings"]
+    errors = store.upsert([(object_uuid(o), o, v) for o, v in zip(to_insert, vecs)])
+    to_insert.clear()
+    if errors:
+        print(f"upload: {len(errors)} objects failed: {next(iter(errors.values()))}")
 
-def ingest_dir(root: str):
-    client = _connect()
-    coll = ensure_collection(client)
+def ingest_file(store: vault.VectorStore, p: pathlib.Path, seen: Dict[str, str], to_insert: list,
+                resume: bool = False):
+    # resume: skip a file an earlier run already uploaded unchanged, replace it if it changed
+    try: filehash = sha256_file(str(p))
+    except Exception: return
+    if filehash in seen:
+        to_insert.append({"text": f"[DUPLICATE of {seen[filehash]}] {p.name}", "source": str(p), "section": "duplicate", "page": None, "hash": filehash,
+                          **vault.file_props(str(p))})
+        if len(to_insert) >= 256: upload(store, to_insert)
+        return
+    seen[filehash] = str(p)
+    if resume:
+        if [o.get("hash") for o in store.fetch_source(str(p), 1)] == [filehash]:
+            return
+        forget(store, str(p))
+    fprops = vault.file_props(str(p))
+    all_text = []
+    for i, ch in enumerate(chunks_from_path(p)):
+        all_text.append(ch["text"])
+        ch.update(fprops, chunk=i, hash=filehash)
+        to_insert.append(ch)
+        if len(to_insert) >= 256: upload(store, to_insert)
+    if all_text:
+        try:
+            meta = summarize_text("\n\n".join(all_text[:8]), str(p))
+            to_insert.append({"text": meta, "source": str(p), "section": "summary", "page": None, "hash": filehash, **fprops})
+        except Exception:
+            pass
+    if len(to_insert) >= 256: upload(store, to_insert)
+
+def ingest_dir(root: str, include=INCLUDE, exclude=EXCLUDE, max_size: str = MAX_SIZE, backend: str = VECTOR_BACKEND):
+    store = open_backend(backend)
     to_insert, seen = [], {}
-    files = list(pathlib.Path(root).rglob("*"))
-    for p in tqdm(files, desc=f"Uploading knowledge to {COLLECTION}"):
-        if not p.is_file(): continue
-        try: filehash = sha256_file(str(p))
-        except Exception: continue
-        if filehash in seen:
-            to_insert.append({"text": f"[DUPLICATE of {seen[filehash]}] {p.name}", "source": str(p), "section": "duplicate", "page": None, "hash": filehash})
-            if len(to_insert) >= 256: coll.data.insert_many(to_insert); to_insert.clear()
-            continue
-        seen[filehash] = str(p)
-        all_text = []
-        for ch in chunks_from_path(p):
-            all_text.append(ch["text"])
-            to_insert.append(ch)
-            if len(to_insert) >= 256: coll.data.insert_many(to_insert); to_insert.clear()
-        if all_text:
-            try:
-                meta = summarize_text("\n\n".join(all_text[:8]), str(p))
-                to_insert.append({"text": meta, "source": str(p), "section": "summary", "page": None, "hash": filehash})
-            except Exception:
-                pass
-        if len(to_insert) >= 256: coll.data.insert_many(to_insert); to_insert.clear()
-    if to_insert: coll.data.insert_many(to_insert)
-    client.close()
+    files = walk_files(root, include, exclude, parse_size(max_size))
+    for path, _ in with_progress(files, f"Uploading knowledge to {COLLECTION}"):
+        ingest_file(store, pathlib.Path(path), seen, to_insert, resume=True)
+    upload(store, to_insert)
+    store.flush()
+    bump_generation(QUERY_CACHE)  # cached brainscan hits are stale now
+
+def forget(store: vault.VectorStore, path: str):
+    # a deleted path may have been a folder: drop everything filed under it too
+    store.delete_source(path, subtree=True)
+
+def watch_dir(root: str, include=INCLUDE, exclude=EXCLUDE, max_size: str = MAX_SIZE,
+              debounce: float = 2.0, poll: float = 0, backend: str = VECTOR_BACKEND):
+    '''Keep COLLECTION in step with root: changed files are re-uploaded, deleted ones forgotten.
+    `--watch` runs ingest_dir first to catch up; root must be absolute so the sources line up.'''
+    def on_batch(files, deleted):
+        to_insert = []
+        try:
+            store = open_backend(backend)  # re-checked and reconnected by the pool as needed
+            for path in deleted:
+                forget(store, path)
+            for path, _ in files:
+                forget(store, path)
+                ingest_file(store, pathlib.Path(path), {}, to_insert)
+            upload(store, to_insert)
+            store.flush()
+        except Exception as e:
+            print(f"batch failed: {type(e).__name__}: {e}")
+            return
+        finally:
+            bump_generation(QUERY_CACHE)
+        print(f"{time.strftime('%H:%M:%S')} updated={len(files)} deleted={len(deleted)}")
+    watch(root, on_batch, debounce=debounce, poll=poll or None,
+          include=include, exclude=exclude, max_size=parse_size(max_size))
 
 if __name__ == "__main__":
-    root = os.environ.get("INGEST_DIR", ".")
+    ap = argparse.ArgumentParser(description=f"Upload a folder into {COLLECTION}.")
+    ap.add_argument("root", nargs="?", default=os.environ.get("INGEST_DIR", "."))
+    ap.add_argument("--backend", choices=["weaviate", "local"], default=VECTOR_BACKEND,
+                    help="local: embedded index under VECTOR_DIR, no Weaviate needed (env VECTOR_BACKEND)")
+    ap.add_argument("--include", action="append", default=None, metavar="GLOB",
+                    help="only ingest matching files (env INGEST_INCLUDE, comma-separated)")
+    ap.add_argument("--exclude", action="append", default=None, metavar="GLOB",
+                    help="skip matching files and directories (env INGEST_EXCLUDE, comma-separated)")
+    ap.add_argument("--max-size", default=MAX_SIZE, help="skip files larger than this, e.g. 200M (env INGEST_MAX_SIZE)")
+    ap.add_argument("--watch", action="store_true",
+                    help="after the upload, keep running and re-upload files as they change")
+    ap.add_argument("--debounce", type=float, default=2.0, help="--watch: seconds a file must be quiet")
+    ap.add_argument("--poll", type=float, default=0,
+                    help="--watch: rescan every N seconds instead of using filesystem events")
+    args = ap.parse_args()
+    # flags replace the env globs; a list default would be appended to (and mutate the global)
+    args.include = INCLUDE if args.include is None else args.include
+    args.exclude = EXCLUDE if args.exclude is None else args.exclude
+    root = os.path.abspath(args.root) if args.watch else args.root
     print(f"Ingesting: {root}")
-    ingest_dir(root)
+    ingest_dir(root, args.include, args.exclude, args.max_size, args.backend)
+    if args.watch:
+        watch_dir(root, args.include, args.exclude, args.max_size, args.debounce, args.poll, args.backend)
@@ -0,0 +1,44 @@
+import os, argparse, threading
+from urllib.parse import urlparse
+import ollama
+import brainscan as bs
+from hivemind.resources import sift, vault
+from hivemind.resources.relay import AnswerServer
+
+_url = urlparse(bs.BRAIN_SERVER or "http://127.0.0.1:8765")
+SERVE_HOST = os.environ.get("SERVE_HOST", _url.hostname or "127.0.0.1")
+SERVE_PORT = int(os.environ.get("SERVE_PORT", str(_url.port or 8765)))
+SERVE_WORKERS = int(os.environ.get("SERVE_WORKERS", "4"))
+SERVE_PARALLEL = int(os.environ.get("SERVE_PARALLEL", os.environ.get("OLLAMA_NUM_PARALLEL", "1")))
+
+_local = threading.local()
+
+def _cache():
+    # SQLite handles are per thread; each retrieval worker keeps its own warm LRU
+    if getattr(_local, "cache", None) is None:
+        _local.cache = bs.open_cache(bs.KEEP_ALIVE)
+    return _local.cache
+
+def prepare(payload):
+    q = payload["query"]
+    hits, stats = bs.retrieve(q, int(payload.get("top_k") or bs.TOPK), cache=_cache(), where=payload.get("where"))
+    if not hits:
+        raise LookupError(bs.no_results())
+    return [{"role": "user", "content": bs.build_prompt(q, hits, stats)}], stats
+
+def _warm_embed():
+    ollama.Client(host=bs.OLLAMA_ENDPOINT).embed(model=bs.EMBED_MODEL, input="", keep_alive=bs.KEEP_ALIVE)
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=f"Keep {bs.COLLECTION} and {bs.GEN_MODEL} warm and answer over HTTP (SSE).")
+    ap.add_argument("--host", default=SERVE_HOST)
+    ap.add_argument("--port", type=int, default=SERVE_PORT)
+    ap.add_argument("--workers", type=int, default=SERVE_WORKERS, help="retrievals run concurrently")
+    ap.add_argument("--parallel", type=int, default=SERVE_PARALLEL,
+                    help="answers generated concurrently; match OLLAMA_NUM_PARALLEL")
+    args = ap.parse_args()
+    warm = [_warm_embed, lambda: vault.open_store(bs.COLLECTION)]
+    if sift._HAS_CE:
+        warm.append(sift._cross_encoder)
+    AnswerServer(prepare, bs.GEN_MODEL, bs.OLLAMA_ENDPOINT, {"temperature": 0.2, "num_ctx": bs.NUM_CTX},
+                 bs.KEEP_ALIVE, args.workers, args.parallel, warm).run(args.host, args.port)